@@ -6,6 +6,8 @@ Summary:
 Keeps track of player score, inventory, and returns valid moves for that specific player.
 '''
 
+from blockus.board import PIECE_IDS, ZOBRIST_PIECE_KEYS
+
 # Stores structure of all playable pieces
 # key: piece name
 # val: number of points associated with piece
@@ -27,6 +29,20 @@ class AI:
         self.player_score = 0
         self.player_color = color
         self.current_pieces = list(GAME_PIECE_VALUES.keys())  # Gives all piece names to player when game starts
+        self.is_stuck = False  # Set once the player has no valid move left, which can never change again
+        self.zobrist_hash = 0  # XOR of ZOBRIST_PIECE_KEYS over the pieces this player has played
+
+    def copy(self):
+        ''' Returns an independent copy of the player's score, inventory and stuck flag.
+            The cached all_valid_moves from check_moves is left out, so copies stay cheap late in the game.
+        '''
+        player = self.__class__.__new__(self.__class__)
+        player.player_score = self.player_score
+        player.player_color = self.player_color
+        player.current_pieces = list(self.current_pieces)
+        player.is_stuck = self.is_stuck
+        player.zobrist_hash = self.zobrist_hash
+        return player
 
     def collect_moves(self, board, round_count):
         ''' Collects all valid moves for this player from the current state of the board
@@ -41,10 +57,19 @@ class AI:
             return False
         return True
 
+    def has_moves(self, board, round_count):
+        ''' Checks whether player has at least one valid move, stopping at the first one found.
+            A player without any valid move can never get one back, so that result is remembered.
+        '''
+        if not self.is_stuck:
+            self.is_stuck = not board.any_valid_move(round_count, self.player_color, self.current_pieces)
+        return not self.is_stuck
+
     def update_player(self, piece_type):
         ''' Keeps track of player's inventory and score as piece type has been played
         '''
         self.current_pieces.remove(piece_type)  # Remove played piece from player's inventory
+        self.zobrist_hash ^= ZOBRIST_PIECE_KEYS[self.player_color][PIECE_IDS[piece_type]]
 
         if len(self.current_pieces) == 0 and piece_type == "monomino1":  # Additional 20 points if last piece played is a monomino
             self.player_score += 20
@@ -52,3 +77,18 @@ class AI:
             self.player_score += 15
 
         self.player_score += GAME_PIECE_VALUES[piece_type]  # Continue assignment of corresponding points for played piece regardless of the additional points cases
+
+    def undo_update_player(self, piece_type, piece_position, player_score):
+        ''' Puts a played piece back at its old position in the inventory and restores the score from before it was played.
+        '''
+        self.current_pieces.insert(piece_position, piece_type)
+        self.zobrist_hash ^= ZOBRIST_PIECE_KEYS[self.player_color][PIECE_IDS[piece_type]]
+        self.player_score = player_score
+
+    def rebuild_zobrist_hash(self):
+        ''' Recomputes zobrist_hash from scratch out of current_pieces, for inventories that were filled in directly.
+        '''
+        self.zobrist_hash = 0
+        for piece_type, piece_id in PIECE_IDS.items():
+            if piece_type not in self.current_pieces:
+                self.zobrist_hash ^= ZOBRIST_PIECE_KEYS[self.player_color][piece_id]
@@ -0,0 +1,193 @@
+'''
+Summary:
+Dihedral data augmentation of training samples on the 20 by 20 board.
+- The 8 symmetries of the square board (4 rotations, 4 reflections) map legal positions to legal positions,
+  so every (observation, policy) sample can be turned into 8 equally valid ones.
+- Every transform has a precomputed permutation of the board cells and of the whole action space
+  (PASS_ACTION_ID included), so augmenting a batch is a few np.take calls without any action strings.
+- Transforms act on observation boards and player-perspective action ids alike, since both use the same grid.
+'''
+
+from typing import Dict, Tuple, Union
+
+import numpy as np
+from blockus.board import BOARD_SIZE, NUM_ACTIONS
+from blockus.game_state import transform_action_ids
+
+# Integer (x, y) transform of every symmetry, applied around the board center.
+# Rotations come first, so transforms 0 to 3 match BOARD_TO_PLAYER_OBSERVATION_ROTATION_MATRICES.
+DIHEDRAL_MATRICES = np.array([
+    [[1, 0], [0, 1]],    # identity
+    [[0, -1], [1, 0]],   # rotate 90 degrees
+    [[-1, 0], [0, -1]],  # rotate 180 degrees
+    [[0, 1], [-1, 0]],   # rotate 270 degrees
+    [[-1, 0], [0, 1]],   # mirror x
+    [[1, 0], [0, -1]],   # mirror y
+    [[0, 1], [1, 0]],    # transpose
+    [[0, -1], [-1, 0]],  # anti-transpose
+], dtype=np.int64)
+DIHEDRAL_NAMES = ["identity", "rotate90", "rotate180", "rotate270", "mirror_x", "mirror_y", "transpose",
+                  "anti_transpose"]
+NUM_TRANSFORMS = len(DIHEDRAL_MATRICES)
+
+
+def build_inverse_transforms():
+    ''' Returns the transform id undoing every transform.
+    '''
+    products = np.einsum("aij,bjk->abik", DIHEDRAL_MATRICES, DIHEDRAL_MATRICES)
+    return (products == np.eye(2, dtype=np.int64)).all(axis=(2, 3)).argmax(axis=1)
+
+
+def build_cell_transforms():
+    ''' Returns the (transforms, 400) table of the flat cell y * 20 + x every cell is moved to.
+    '''
+    ys, xs = np.divmod(np.arange(BOARD_SIZE * BOARD_SIZE), BOARD_SIZE)
+    doubled_cells = np.stack((2 * xs - (BOARD_SIZE - 1), 2 * ys - (BOARD_SIZE - 1)))  # Doubled coords around the center
+    new_cells = (DIHEDRAL_MATRICES @ doubled_cells + (BOARD_SIZE - 1)) // 2
+    return new_cells[:, 1] * BOARD_SIZE + new_cells[:, 0]
+
+
+def build_action_transforms():
+    ''' Returns the (transforms, NUM_ACTIONS + 1) int32 table of the action id every action id is moved to.
+    '''
+    action_ids = np.arange(NUM_ACTIONS + 1, dtype=np.int64)
+    return np.stack([transform_action_ids(action_ids, matrix) for matrix in DIHEDRAL_MATRICES]).astype(np.int32)
+
+
+INVERSE_TRANSFORMS = build_inverse_transforms()
+CELL_TRANSFORMS = build_cell_transforms()
+ACTION_TRANSFORMS = build_action_transforms()
+
+
+def transform_boards(boards: np.ndarray, transform: int, out: Union[np.ndarray, None] = None) -> np.ndarray:
+    """Apply one symmetry to boards.
+
+    Parameters
+    ----------
+    boards : np.ndarray
+        Boards of shape (..., 20, 20), such as observation boards or stacked feature planes.
+    transform : int
+        Index into DIHEDRAL_MATRICES.
+    out : np.ndarray (optional)
+        Array of the same shape to write the transformed boards into.
+
+    Returns
+    -------
+    transformed_boards : np.ndarray
+    """
+    flat_boards = boards.reshape(boards.shape[:-2] + (BOARD_SIZE * BOARD_SIZE,))
+    # Every new cell is read from the cell the inverse transform moves it to
+    source_cells = CELL_TRANSFORMS[INVERSE_TRANSFORMS[transform]]
+    flat_out = None if out is None else out.reshape(flat_boards.shape)
+    transformed = np.take(flat_boards, source_cells, axis=-1, out=flat_out)
+
+    return transformed.reshape(boards.shape)
+
+
+def transform_policies(policies: np.ndarray, transform: int, out: Union[np.ndarray, None] = None) -> np.ndarray:
+    """Apply one symmetry to policies or valid action masks over the whole action space.
+
+    Parameters
+    ----------
+    policies : np.ndarray
+        Arrays of shape (..., NUM_ACTIONS + 1) indexed by action id, of any dtype.
+    transform : int
+        Index into DIHEDRAL_MATRICES.
+    out : np.ndarray (optional)
+        Array of the same shape to write the transformed policies into.
+
+    Returns
+    -------
+    transformed_policies : np.ndarray
+    """
+    return np.take(policies, ACTION_TRANSFORMS[INVERSE_TRANSFORMS[transform]], axis=-1, out=out)
+
+
+def transform_actions(action_ids: np.ndarray, transform: int) -> np.ndarray:
+    """Apply one symmetry to action ids, PASS_ACTION_ID stays PASS_ACTION_ID.
+
+    Parameters
+    ----------
+    action_ids : np.ndarray
+        Action ids of any shape.
+    transform : int
+        Index into DIHEDRAL_MATRICES.
+
+    Returns
+    -------
+    transformed_action_ids : np.ndarray
+        int64 array of the same shape.
+    """
+    return ACTION_TRANSFORMS[transform][action_ids].astype(np.int64)
+
+
+def augment_batch(boards: np.ndarray, policies: Union[np.ndarray, None] = None,
+                  action_ids: Union[np.ndarray, None] = None) -> Tuple[np.ndarray, ...]:
+    """Emit all 8 symmetric copies of a batch of samples.
+
+    Parameters
+    ----------
+    boards : np.ndarray
+        (N, ..., 20, 20) boards of the samples.
+    policies : np.ndarray (optional)
+        (N, NUM_ACTIONS + 1) policies or valid action masks of the samples.
+    action_ids : np.ndarray (optional)
+        (N, ...) action ids of the samples, e.g. the action taken.
+
+    Returns
+    -------
+    augmented : Tuple[np.ndarray, ...]
+        The boards, followed by the policies and action ids if given, each with a new leading axis of
+        NUM_TRANSFORMS ordered like DIHEDRAL_MATRICES. Reshape with .reshape(-1, *shape[2:]) for a flat batch.
+    """
+    augmented_boards = np.empty((NUM_TRANSFORMS,) + boards.shape, dtype=boards.dtype)
+    augmented = [augmented_boards]
+    if policies is not None:
+        augmented_policies = np.empty((NUM_TRANSFORMS,) + policies.shape, dtype=policies.dtype)
+        augmented.append(augmented_policies)
+    if action_ids is not None:
+        augmented_action_ids = np.empty((NUM_TRANSFORMS,) + np.shape(action_ids), dtype=np.int64)
+        augmented.append(augmented_action_ids)
+
+    for transform in range(NUM_TRANSFORMS):
+        transform_boards(boards, transform, out=augmented_boards[transform])
+        if policies is not None:
+            transform_policies(policies, transform, out=augmented_policies[transform])
+        if action_ids is not None:
+            augmented_action_ids[transform] = transform_actions(action_ids, transform)
+
+    return tuple(augmented)
+
+
+def augment_observations(observations: Dict[str, np.ndarray], policies: Union[np.ndarray, None] = None) \
+        -> Tuple[Dict[str, np.ndarray], Union[np.ndarray, None]]:
+    """Emit all 8 symmetric copies of a batch of observations, as made by batched state_to_observation calls.
+
+    Parameters
+    ----------
+    observations : Dict[str, np.ndarray]
+        Batched observation arrays with a leading axis of N. "board" (N, 20, 20) is transformed,
+        the other entries ("pieces", "score", "player") do not depend on the board layout and are repeated.
+    policies : np.ndarray (optional)
+        (N, NUM_ACTIONS + 1) player-perspective policies or valid action masks of the observations.
+
+    Returns
+    -------
+    augmented_observations : Dict[str, np.ndarray]
+        Every entry with shape (NUM_TRANSFORMS * N, ...), all transforms of sample 0 first in
+        DIHEDRAL_MATRICES order, then of sample 1, and so on.
+    augmented_policies : np.ndarray
+        (NUM_TRANSFORMS * N, NUM_ACTIONS + 1) in the same order, None if no policies were given.
+    """
+    boards = observations["board"]
+    num_samples = boards.shape[0]
+    augmented = augment_batch(boards, policies)
+
+    augmented_observations = {name: np.repeat(values, NUM_TRANSFORMS, axis=0) for name, values in observations.items()
+                              if name != "board"}
+    augmented_observations["board"] = augmented[0].swapaxes(0, 1).reshape((NUM_TRANSFORMS * num_samples,) + boards.shape[1:])
+    augmented_policies = None
+    if policies is not None:
+        augmented_policies = augmented[1].swapaxes(0, 1).reshape((NUM_TRANSFORMS * num_samples,) + policies.shape[1:])
+
+    return augmented_observations, augmented_policies
@@ -0,0 +1,242 @@
+'''
+Summary:
+Reproducible benchmarks of the engine hot paths, so speedups and regressions can be measured.
+- Positions are sampled with fixed seeds from random games in the opening, midgame and endgame.
+- Move generation is checked against the golden move counts stored in benchmark_golden.json
+  before anything is timed, so a fast but wrong generator fails the run.
+- Times Board.get_all_valid_moves, BlockusEnv.next_state, state_to_observation,
+  serialize_state and full random games, and writes the results as JSON.
+- Measures the cold start of a fresh process: importing blockus.board (loading or compiling the numba kernels)
+  and running blockus.board.warmup.
+- Run it with: python -m blockus.benchmark --output bench.json
+  (--update-golden rewrites the golden file after an intended rules change)
+'''
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Union
+
+import numpy as np
+from blockus.blockus_env import BlockusEnv
+from blockus.game_state import GameState
+from blockus.selfplay import play_game
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_golden.json")
+
+POSITION_SEEDS = [0, 1, 2]
+# Number of turns played from the start of the game to reach each phase
+GAME_PHASES = {"opening": 8, "midgame": 32, "endgame": 56}
+
+
+def sample_position(seed: int, turns: int) -> GameState:
+    """Play turns random turns with the given seed and return the position reached.
+    Stops early if the game ends first.
+
+    Parameters
+    ----------
+    seed : int
+        Seed of the random number generator choosing the moves.
+    turns : int
+        Number of turns to play.
+
+    Returns
+    -------
+    state : GameState
+        The position. Its board's player_to_move is the player whose turn it is.
+    """
+    env = BlockusEnv(move_cache_size=0)
+    rng = np.random.default_rng(seed)
+    state, players = env.new_state()
+
+    for _ in range(turns):
+        action_ids = env.valid_actions(state, players[0], as_action_ids=True)
+        next_state, next_players, _, terminal, _ = env.next_state(state, players, [int(action_ids[rng.integers(len(action_ids))])])
+        if terminal:
+            break
+        state, players = next_state, next_players
+
+    return state
+
+
+def sample_positions() -> List[Dict]:
+    """Every benchmark position: one per seed in POSITION_SEEDS and phase in GAME_PHASES."""
+    return [{"seed": seed, "phase": phase, "state": sample_position(seed, turns)}
+            for seed in POSITION_SEEDS for phase, turns in GAME_PHASES.items()]
+
+
+def count_moves(state: GameState) -> Dict:
+    """Count the valid moves and distinct placements of the player to move in a position."""
+    board, round_count, players = state
+    player = players[board.player_to_move]
+    all_valid_moves = board.get_all_valid_moves(round_count, player.player_color, player.current_pieces)
+
+    return {"player": board.player_to_move,
+            "valid_moves": sum(len(orientations) for index_orientations in all_valid_moves.values()
+                               for orientations in index_orientations.values()),
+            "unique_moves": len(board.get_unique_valid_moves(round_count, player.player_color, player.current_pieces))}
+
+
+def load_golden(path: str = GOLDEN_PATH) -> List[Dict]:
+    with open(path) as golden_file:
+        return json.load(golden_file)
+
+
+def check_golden(positions: List[Dict], golden: List[Dict]) -> List[str]:
+    """Compare the move counts of every position with the golden counts.
+
+    Returns
+    -------
+    mismatches : List[str]
+        One message per differing position, empty if everything matches.
+    """
+    golden = {(entry["seed"], entry["phase"]): entry for entry in golden}
+    mismatches = []
+    for position in positions:
+        expected = golden.get((position["seed"], position["phase"]))
+        counts = count_moves(position["state"])
+        if expected is None or any(counts[key] != expected[key] for key in counts):
+            mismatches.append("seed {} {}: got {}, golden {}".format(position["seed"], position["phase"], counts, expected))
+
+    return mismatches
+
+
+def time_call(function: Callable, repeat: int) -> Dict:
+    """Call function repeat times and return the fastest and median call time in microseconds."""
+    function()  # Warm up caches and jit compilation
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    return {"min_us": min(times) * 1e6, "median_us": statistics.median(times) * 1e6, "repeat": repeat}
+
+
+COLD_START_SCRIPT = """
+import time
+start = time.perf_counter()
+import blockus.board
+imported = time.perf_counter()
+blockus.board.warmup()
+print(imported - start, time.perf_counter() - imported)
+"""
+
+
+def measure_cold_start(runs: int = 3) -> Dict:
+    """Time importing blockus.board and warming it up in fresh python processes.
+    The first run also fills the numba cache if it is empty, so its time is reported separately.
+
+    Parameters
+    ----------
+    runs : int (optional)
+        Number of fresh processes to start.
+
+    Returns
+    -------
+    cold_start : Dict
+        "first_import_seconds", "import_seconds" (median of the other runs) and "warmup_seconds".
+    """
+    times = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", COLD_START_SCRIPT], check=True, stdout=subprocess.PIPE,
+                                universal_newlines=True).stdout
+        times.append([float(seconds) for seconds in output.split()])
+
+    later_times = times[1:] or times
+    return {"first_import_seconds": times[0][0],
+            "import_seconds": statistics.median(import_seconds for import_seconds, _ in later_times),
+            "warmup_seconds": statistics.median(warmup_seconds for _, warmup_seconds in later_times),
+            "runs": runs}
+
+
+def run_benchmarks(repeat: int = 20, num_games: int = 5, cold_start_runs: int = 3) -> Dict:
+    """Check the golden move counts and time every benchmark.
+
+    Parameters
+    ----------
+    repeat : int (optional)
+        Number of timed calls per benchmark and position.
+    num_games : int (optional)
+        Number of full random games to time.
+    cold_start_runs : int (optional)
+        Number of fresh processes started to time the cold start, 0 skips it.
+
+    Returns
+    -------
+    results : Dict
+        "golden_ok", "golden_mismatches", per-position "positions" timings, "games" throughput and "cold_start".
+    """
+    env = BlockusEnv(move_cache_size=0)
+    positions = sample_positions()
+    mismatches = check_golden(positions, load_golden())
+
+    position_results = []
+    for position in positions:
+        board, round_count, players = state = position["state"]
+        player_num = board.player_to_move
+        player = players[player_num]
+        action = env.valid_actions(state, player_num, as_action_ids=True)[0]
+        timings = {}
+
+        timings["get_all_valid_moves"] = time_call(
+            lambda: board.get_all_valid_moves(round_count, player.player_color, player.current_pieces), repeat)
+        timings["next_state"] = time_call(lambda: env.next_state(state, [player_num], [int(action)]), repeat)
+        timings["state_to_observation"] = time_call(lambda: env.state_to_observation(state, player_num), repeat)
+        timings["serialize_state"] = time_call(lambda: env.serialize_state(state), repeat)
+
+        position_results.append({"seed": position["seed"], "phase": position["phase"], "round": round_count,
+                                 **count_moves(state), "timings": timings})
+
+    games = [play_game(game_num, game_num) for game_num in range(num_games)]
+    seconds = sum(game["seconds"] for game in games)
+    game_results = {"games": num_games, "seconds": seconds, "games_per_sec": num_games / seconds,
+                    "moves_per_sec": sum(game["moves"] for game in games) / seconds}
+
+    return {"golden_ok": not mismatches, "golden_mismatches": mismatches,
+            "positions": position_results, "games": game_results,
+            "cold_start": measure_cold_start(cold_start_runs) if cold_start_runs > 0 else None}
+
+
+def update_golden(path: str = GOLDEN_PATH):
+    """Rewrite the golden file with the move counts of the current move generator."""
+    golden = [{"seed": position["seed"], "phase": position["phase"], **count_moves(position["state"])}
+              for position in sample_positions()]
+    with open(path, "w") as golden_file:
+        json.dump(golden, golden_file, indent=2)
+        golden_file.write("\n")
+
+
+def main(argv: Union[List[str], None] = None):
+    parser = argparse.ArgumentParser(description="Benchmark Blockus move generation, stepping and observations.")
+    parser.add_argument("--repeat", type=int, default=20, help="timed calls per benchmark and position")
+    parser.add_argument("--games", type=int, default=5, help="full random games to time")
+    parser.add_argument("--cold-start-runs", type=int, default=3, help="fresh processes started to time the cold start")
+    parser.add_argument("--output", default=None, help="JSON results file (printed to stdout if not given)")
+    parser.add_argument("--update-golden", action="store_true", help="rewrite the golden move counts and exit")
+    args = parser.parse_args(argv)
+
+    if args.update_golden:
+        update_golden()
+        return 0
+
+    results = run_benchmarks(args.repeat, args.games, args.cold_start_runs)
+    if args.output is None:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+    for mismatch in results["golden_mismatches"]:
+        print("Golden move count mismatch:", mismatch, file=sys.stderr)
+
+    return 0 if results["golden_ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -48,6 +48,10 @@ class BlockusClientEnv(ClientEnv):
     #
     #     return string_action
 
+    def random_valid_action(self, rng=None) -> str:
+        """ A uniformly random valid action for this player, without generating every valid action."""
+        return self._server_environment.random_valid_action(state=self.full_state, player=self._player.number, rng=rng)
+
     def valid_actions_dict(self) -> Dict[str, Dict[Tuple[int], List[str]]]:
         """ Valid actions for a specific state in the dictionary form {piece_type: {index: [orientation]}}"""
         return self._server_environment.valid_actions_dict(state=self.full_state, player=self._player.number)
\ No newline at end of file
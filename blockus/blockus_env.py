@@ -1,11 +1,18 @@
-from copy import deepcopy
-from typing import Tuple, List, Union, Dict
+from typing import Tuple, List, Union, Dict, FrozenSet
 
-import dill
 import numpy as np
 from blockus import gui
 from blockus.ai import AI
-from blockus.board import Board, PIECE_TYPES, ORIENTATIONS, BOARD_TO_PLAYER_OBSERVATION_ROTATION_MATRICES, PLAYER_OBSERVATION_TO_BOARD_ROTATION_MATRICES
+from blockus.game_state import (GameState, action_to_string, action_to_action_id, parse_action,
+                                next_turn_round, real_to_player_perspective_action_ids, state_hash, action_id_to_string,
+                                string_to_action_id, player_perspective_to_real_action_ids)
+from blockus.observation import state_observation
+from blockus.serialization import encode_state, decode_state
+from blockus.move_cache import MoveCache
+from blockus.board import Board, NUM_ACTIONS, PASS_ACTION_ID, PIECE_TYPES, ORIENTATIONS
+from blockus.board import (PIECE_NAMES, VALID_MOVE_ORIENTATION_NAMES, VARIANTS, valid_move_array_to_dict,
+                           valid_move_array_to_action_ids, valid_move_array_to_unique_dict, unique_valid_move_array,
+                           fill_action_mask)
 from spacetimerl.base_environment import BaseEnvironment
 
 PLAYER_TO_COLOR = {
@@ -25,85 +32,11 @@ COLOR_TO_PLAYER = {
 
 PIECE_NAME_TO_INDEX = {piece_name: i for i, piece_name in enumerate(PIECE_TYPES.keys())}
 
-State = object
-
-
-def _rotate_board_for_player_perspective(board, player):
-    return np.rot90(board, k=-player)
-
-
-def _separate_offset_from_orientation(orientation_string):
-    orientation = []
-    offset = []
-
-    for c in orientation_string:
-        if c.isdigit():
-            offset.append(c)
-        else:
-            orientation.append(c)
-
-    return ''.join(orientation), ''.join(offset)
-
-
-def _relative_player_id(current_player: int, absolute_player_num) -> int:
-    if absolute_player_num < 0:
-        return absolute_player_num
-
-    return (absolute_player_num - current_player) % 4
-
-
-def action_to_string(piece_type: str, index: Tuple[int, int], orientation: str) -> str:
-    """Convert a piece_type, index, and orientation into a formatted action string.
-
-    Parameters
-    ----------
-    piece_type : str
-        The type of blockus piece to be placed in the action.
-    index : Tuple[int, int]
-        The location where the piece will be placed in the action.
-    orientation : str
-        The orientation in which the piece will be placed in the action.
-
-    Returns
-    -------
-    action_string : str
-
-    See Also
-    --------
-    blockus.blockus_env.BlockusEnv.all_piece_types
-        Get list of all possible piece types
-    blockus.blockus_env.BlockusEnv.all_orientations
-         Get list of all possible orientations
-    blockus.blockus_env.BlockusEnv.is_valid_action
-        Check if action string is valid
-    """
-    return "{};{};{}".format(piece_type, index, orientation)
-
-
-def string_to_action(action_str: str) -> Union[Tuple[str, Tuple[int, int], str], None]:
-    """Convert a formatted action string into piece_type, index, and orientation.
-
-    Parameters
-    ----------
-    action_str : str
-        The action in string format
-
-    Returns
-    -------
-    piece_type : str
-        The type of blockus piece to be placed in the action.
-    index : Tuple[int, int]
-        The location where the piece will be placed in the action.
-    orientation : str
-        The orientation in which the piece will be placed in the action.
-    """
+# Variant played by new_state for each number of players when no variant is given
+NUM_PLAYERS_TO_VARIANT = {variant["num_players"]: name for name, variant in VARIANTS.items()}
 
-    if action_str == '':
-        return None
+State = object
 
-    piece_type, index, orientation = action_str.split(";")
-    index = tuple(map(int, index.replace('(', '').replace(')', '').split(',')))
-    return piece_type, index, orientation
 
 def start_gui():
     """Initialize graphical interface in order to render board.
@@ -189,29 +122,66 @@ def print_board(state: object):
 class BlockusEnv(BaseEnvironment):
     r"""
     Full Blockus environment class with access to the actual game state.
+
+    Parameters
+    ----------
+    variant : str (optional)
+        Any key of :py:data:`blockus.board.VARIANTS`. Sets the shapes in :py:attr:`observation_shape` and the rules
+        :py:meth:`new_state` uses when it is given neither num_players nor a variant.
+    move_cache_size : int (optional)
+        Number of valid move generation results kept in :py:attr:`move_cache`, keyed by (position hash, player).
+        0 disables the cache.
     """
 
+    def __init__(self, *args, variant: str = "classic", move_cache_size: int = 1024, **kwargs):
+        if variant not in VARIANTS:
+            raise ValueError("Unknown variant {}, expected one of {}".format(variant, list(VARIANTS)))
+        self.variant = variant
+        self.move_cache = MoveCache(move_cache_size)
+        self.rng = np.random.default_rng()  # Used by random_valid_action when no rng is given
+        super().__init__(*args, **kwargs)
+
+    def _move_cache_key(self, state: object, player: int, round_count: int) -> Tuple[int, int, object, int, int]:
+        board, _, players = state
+        # Valid moves only depend on the cells, the player's own pieces, the board size and in the first round
+        # the start corner, so the key leaves out the other players' pieces and the player to move to share more entries.
+        start_corner = tuple(board.start_corners[player]) if round_count == 0 else None
+        return board.zobrist_hash, players[player].zobrist_hash, start_corner, player, board.board_size
+
+    def _cached_valid_move_array(self, state: object, player: int) -> np.ndarray:
+        board, round_count, players = state
+
+        def generate_valid_moves():
+            valid_moves = board.get_valid_move_array(round_count, PLAYER_TO_COLOR[player], players[player].current_pieces)
+            valid_moves.flags.writeable = False  # Shared by every later call for the same position
+            return valid_moves
+
+        return self.move_cache.get_or_compute(self._move_cache_key(state, player, round_count), generate_valid_moves)
+
     @property
     def min_players(self) -> int:
         r""" Property holding the number of players present required to play the game.
 
-        (Always 4 for Blokus)
+        (2 for Blokus Duo)
         """
-        return 4
+        return min(NUM_PLAYERS_TO_VARIANT)
 
     @property
     def max_players(self) -> int:
         r""" Property holding the max number of players present for a game.
 
-        (Always 4 for Blokus)
+        (4 for classic Blokus)
         """
-        return 4
+        return max(NUM_PLAYERS_TO_VARIANT)
 
     @property
     def observation_shape(self) -> Dict[str, Tuple[int, ...]]:
-        """ Property holding the numpy array shapes for each value in an observation dictionary."""
+        """ Property holding the numpy array shapes for each value in an observation dictionary of the env's variant."""
+        board_size = VARIANTS[self.variant]["board_size"]
+        num_players = VARIANTS[self.variant]["num_players"]
 
-        return {"board": (20, 20), "pieces": (4, 21), "score": (4,), "player": (1,)}
+        return {"board": (board_size, board_size), "pieces": (num_players, len(PIECE_TYPES)), "score": (num_players,),
+                "player": (1,)}
 
     @staticmethod
     def observation_names():
@@ -236,6 +206,19 @@ class BlockusEnv(BaseEnvironment):
 
         return PIECE_TYPES.keys()
 
+    @staticmethod
+    def action_space_size() -> int:
+        """ Get the number of integer action ids in a game of Blockus.
+
+        Action ids are placement_id * 400 + y * 20 + x for every (piece, orientation, shift) placement,
+        and the last id, PASS_ACTION_ID, is the no-op.
+
+        Returns
+        -------
+        action_space_size : int
+        """
+        return NUM_ACTIONS + 1
+
     @staticmethod
     def all_orientations() -> List[str]:
         """ Get the names every possible piece orientation in a game of Blockus.
@@ -246,10 +229,19 @@ class BlockusEnv(BaseEnvironment):
         """
         return ORIENTATIONS
 
-    def new_state(self, num_players: int = 4) -> State:
+    def new_state(self, num_players: Union[int, None] = None, variant: Union[str, None] = None) -> State:
         r"""new_state(self) -> object
         Create a fresh Blokus board state for a new game.
 
+        Parameters
+        ----------
+        num_players : int (optional)
+            Number of players in the game: 4 plays classic Blokus, 3 the three player game on the classic board
+            and 2 Blokus Duo on a 14 by 14 board. Defaults to the players of variant.
+        variant : str (optional)
+            Any key of :py:data:`blockus.board.VARIANTS`, which sets the board size, number of players and
+            start corners. Chosen from num_players if only that is given, otherwise the env's variant.
+
         Returns
         -------
         new_state : object
@@ -276,18 +268,21 @@ class BlockusEnv(BaseEnvironment):
         and :py:func:`blockus.blockus_env.BlockusEnv.state_to_observation` can be used to convert states into observations.
 
         """
-        if num_players is None:
-            num_players = 4
-
-        assert num_players == 4
-
-        board = Board()
-        red = AI(board, 1)
-        blue = AI(board, 2)
-        green = AI(board, 3)
-        yellow = AI(board, 4)
-
-        return (board, 0, [red, blue, green, yellow]), [0]
+        if variant is None and num_players is None:
+            variant = self.variant
+        elif variant is None:
+            if num_players not in NUM_PLAYERS_TO_VARIANT:
+                raise ValueError("Blockus is played by {} players, got {}".format(sorted(NUM_PLAYERS_TO_VARIANT), num_players))
+            variant = NUM_PLAYERS_TO_VARIANT[num_players]
+        elif num_players is not None and num_players != VARIANTS[variant]["num_players"]:
+            raise ValueError("The {} variant is played by {} players, got {}".format(
+                variant, VARIANTS[variant]["num_players"], num_players))
+
+        rules = VARIANTS[variant]
+        board = Board(board_size=rules["board_size"], start_corners=rules["start_corners"])
+        players = tuple(AI(board, PLAYER_TO_COLOR[player_num]) for player_num in range(rules["num_players"]))
+
+        return GameState(board, 0, players), [0]
 
     # Serialization Methods
     @staticmethod
@@ -306,6 +301,7 @@ class BlockusEnv(BaseEnvironment):
     @staticmethod
     def serialize_state(state: object) -> bytearray:
         """ Serialize a game state and convert it to a bytearray to be saved or sent over a network.
+        Uses the fixed-size binary layout of :py:mod:`blockus.serialization`.
 
         Parameters
         ----------
@@ -318,7 +314,7 @@ class BlockusEnv(BaseEnvironment):
             serialized state
 
         """
-        return dill.dumps(state)
+        return encode_state(state)
 
     @staticmethod
     def deserialize_state(serialized_state: bytearray) -> State:
@@ -335,7 +331,27 @@ class BlockusEnv(BaseEnvironment):
             deserialized state
 
         """
-        return dill.loads(serialized_state)
+        return decode_state(serialized_state)
+
+    @staticmethod
+    def state_hash(state: object) -> int:
+        """ 64-bit Zobrist hash of a game state, for transposition tables and caches.
+        Covers the cell colors, the pieces every player has left and the player to move, and costs a few XORs
+        since the board and players keep their part of the hash up to date as moves are played.
+
+        Parameters
+        ----------
+        state : object
+            state to be hashed
+
+        Returns
+        -------
+        state_hash : int
+            Equal for states that reach the same position through a different move order
+
+        """
+        board, round_count, players = state
+        return state_hash(board, players)
 
     def current_rewards(self, state: object) -> List[float]:
         """Returns current reward for each player (in absolute order, not reltive to any specific player
@@ -355,7 +371,7 @@ class BlockusEnv(BaseEnvironment):
 
         return [p.player_score for p in players]
 
-    def next_state(self, state: object, players: int, actions: str) \
+    def next_state(self, state: object, players: int, actions: List[Union[str, int]]) \
             -> Tuple[State, List[int], List[float], bool, Union[List[int], None]]:
         """ Perform a game step from a given state.
 
@@ -367,8 +383,8 @@ class BlockusEnv(BaseEnvironment):
         players : List[int]
             The players who's turn it is and are executing actions.
             For Blockus, only one player should ever be passed in this list at a time.
-        actions : List[str],
-            The actions to be executed by the players who's turn it is.
+        actions : List[Union[str, int]],
+            The actions to be executed by the players who's turn it is, as action strings or action ids.
             For Blockus, only one action should ever be passed in this list at a time.
 
         Returns
@@ -410,20 +426,45 @@ class BlockusEnv(BaseEnvironment):
 
         board, round_count, players = state
 
-        players = deepcopy(players)
+        # Copy-on-write: the board is copied, but players are only copied once they change.
+        # Every other player object is shared with the previous state.
+        players = list(players)
         new_board = Board(board)
 
         color = PLAYER_TO_COLOR[player_num]
 
-        current_player = players[player_num]
-
-        if len(action) > 0:
-            piece_type, index, orientation = string_to_action(action)
+        action = parse_action(action)
+        if action is not None:
+            piece_type, index, orientation = action
             new_board.update_board(color, piece_type, index, orientation, round_count, True)
-            current_player.update_player(piece_type)
+            players[player_num] = players[player_num].copy()
+            players[player_num].update_player(piece_type)
 
-        if not any(p.check_moves(board, round_count) for p in players):
-            terminal = True
+        current_player = players[player_num]
+
+        new_round_count = round_count + 1 if player_num == len(players) - 1 else round_count
+        new_player_num = (player_num + 1) % len(players)
+        new_board.player_to_move = new_player_num
+
+        stepped_state = GameState(new_board, new_round_count, players)
+        terminal = True
+        for p_num, p in enumerate(players):
+            if p.is_stuck:
+                continue
+            p_round_count = next_turn_round(new_round_count, new_player_num, p_num)
+            # Only a probe: a miss here is answered by any_valid_move, not by generating and storing the moves
+            cached_moves = self.move_cache.peek(self._move_cache_key(stepped_state, p_num, p_round_count))
+            if cached_moves is not None:
+                has_moves = len(cached_moves) > 0
+            else:
+                has_moves = new_board.any_valid_move(p_round_count, p.player_color, p.current_pieces)
+            if has_moves:
+                terminal = False
+                break
+            players[p_num] = p.copy()  # A player without moves stays stuck, remember it without touching the previous state
+            players[p_num].is_stuck = True
+
+        if terminal:
             max_score = 0
             scores = []
             winners = []
@@ -442,16 +483,11 @@ class BlockusEnv(BaseEnvironment):
         else:
             winners = None
             reward = 0
-            terminal = False
-
-        if player_num == 3:
-            round_count += 1
 
-        new_player_num = (player_num + 1) % 4
+        return GameState(new_board, new_round_count, tuple(players)), [new_player_num], [reward], terminal, winners
 
-        return (new_board, round_count, players), [new_player_num], [reward], terminal, winners
-
-    def valid_actions(self, state: object, player: int) -> List[str]:
+    def valid_actions(self, state: object, player: int, unique: bool = False,
+                      as_action_ids: bool = False) -> Union[List[str], np.ndarray]:
         """ Valid actions for a specific state and player.
         If there are no valid actions, empty string is given to represent a no-op
 
@@ -461,11 +497,17 @@ class BlockusEnv(BaseEnvironment):
             The current state to execute a game step from.
         player : int
             The player for which valid actions will be returned.
+        unique : bool (optional)
+            If True, only one action is returned for every distinct set of cells a piece can cover.
+            Symmetric orientations and different corner indexes often place a piece on the same cells.
+        as_action_ids : bool (optional)
+            If True, an int64 array of action ids is returned instead of action strings,
+            holding only PASS_ACTION_ID if there are no valid actions.
 
         Returns
         -------
-        valid_actions : list[int]
-            A list of valid action strings which the player may execute.
+        valid_actions : Union[list[str], np.ndarray]
+            A list of valid action strings (or an array of action ids) which the player may execute.
 
 
         See Also
@@ -473,6 +515,7 @@ class BlockusEnv(BaseEnvironment):
         blockus.blockus_env.action_to_string
         blockus.blockus_env.string_to_action
         blockus.blockus_env.is_valid_action
+        blockus.blockus_env.BlockusEnv.unique_valid_actions_dict
         blockus.blockus_env.BlockusEnv.next_state
             If an action is valid, you can pass it to this method.
 
@@ -487,20 +530,23 @@ class BlockusEnv(BaseEnvironment):
         This method does not keep track of who's turn it is. That is up to the user.
         If the specified player can physically place a piece at a location, it will be returned as a valid action.
         """
-        actions_dict = self.valid_actions_dict(state=state, player=player)
+        if as_action_ids:
+            valid_moves = self._cached_valid_move_array(state, player)
+            action_ids = valid_move_array_to_action_ids(unique_valid_move_array(valid_moves) if unique else valid_moves)
+            return action_ids if len(action_ids) > 0 else np.array([PASS_ACTION_ID], dtype=np.int64)
 
-        valid_moves = []
-        for piece_type, index_orientation_dict in actions_dict.items():
-            for index, orientation_list in index_orientation_dict.items():
-                for orientation in orientation_list:
-                    valid_moves.append(action_to_string(piece_type=piece_type, index=index, orientation=orientation))
+        if unique:
+            valid_moves = list(self.unique_valid_actions_dict(state=state, player=player).values())
+        else:
+            valid_moves = [action_to_string(PIECE_NAMES[piece_id], (x, y), VALID_MOVE_ORIENTATION_NAMES[orientation_shift])
+                           for piece_id, x, y, orientation_shift in self._cached_valid_move_array(state, player).tolist()]
 
         if len(valid_moves) == 0:
             valid_moves.append("")
 
         return valid_moves
 
-    def player_perspective_valid_actions(self, state: object, player: int) -> List[str]:
+    def player_perspective_valid_actions(self, state: object, player: int, unique: bool = False) -> List[str]:
         """ Valid actions for a specific state and player from the player's perspective
         in coordinance with the player's rotated observation of the board.
         If there are no valid actions, empty string is given to represent a no-op
@@ -511,6 +557,8 @@ class BlockusEnv(BaseEnvironment):
             The current state to execute a game step from.
         player : int
             The player for which valid actions will be returned.
+        unique : bool (optional)
+            If True, only one action is returned for every distinct set of cells a piece can cover.
 
         Returns
         -------
@@ -533,25 +581,79 @@ class BlockusEnv(BaseEnvironment):
         it will be returned as a valid action.
         """
 
-        actions_dict = self.valid_actions_dict(state=state, player=player)
+        board, _, players = state
+        action_ids = self.valid_actions(state=state, player=player, unique=unique, as_action_ids=True)
+        player_action_ids = real_to_player_perspective_action_ids(action_ids, player, len(players), board.board_size)
+        return [action_id_to_string(action_id) for action_id in player_action_ids.tolist()]
 
-        valid_moves = []
-        for piece_type, index_orientation_dict in actions_dict.items():
-            for index, orientation_list in index_orientation_dict.items():
-                for orientation in orientation_list:
+    def valid_action_mask(self, state: object, player: int, out: Union[np.ndarray, None] = None) -> np.ndarray:
+        """ Boolean mask over the full integer action space of the valid actions for a specific state and player.
 
-                    player_action = self.convert_real_action_to_player_perspective_action(
-                        action_to_string(piece_type=piece_type, index=index, orientation=orientation), player=player
-                    )
+        Parameters
+        ----------
+        state : object
+            The current state to execute a game step from.
+        player : int
+            The player for which valid actions will be returned.
+        out : np.ndarray (optional)
+            A boolean array of length :py:func:`blockus.blockus_env.BlockusEnv.action_space_size` to fill
+            instead of allocating a new one.
 
-                    valid_moves.append(player_action)
+        Returns
+        -------
+        valid_action_mask : np.ndarray
+            True at every valid action id. Only PASS_ACTION_ID is True if there are no valid actions.
 
-        if len(valid_moves) == 0:
-            valid_moves.append("")
+        See Also
+        --------
+        blockus.blockus_env.BlockusEnv.player_perspective_valid_action_mask
+        blockus.blockus_env.BlockusEnv.valid_actions
 
-        return valid_moves
+        Notes
+        -----
+        The mask is filled straight from the (cached) action ids the move generator produces,
+        without building the {piece_type: {index: [orientation]}} dictionary or any action strings.
+        """
+        valid_action_mask = np.empty(self.action_space_size(), dtype=np.bool_) if out is None else out
+        fill_action_mask(valid_action_mask, valid_move_array_to_action_ids(self._cached_valid_move_array(state, player)))
+
+        return valid_action_mask
+
+    def player_perspective_valid_action_mask(self, state: object, player: int,
+                                             out: Union[np.ndarray, None] = None) -> np.ndarray:
+        """ Boolean mask of the valid actions for a specific state and player from the player's perspective
+        in coordinance with the player's rotated observation of the board.
+
+        Parameters
+        ----------
+        state : object
+            The current state to execute a game step from.
+        player : int
+            The player for which valid actions will be returned.
+        out : np.ndarray (optional)
+            A boolean array of length :py:func:`blockus.blockus_env.BlockusEnv.action_space_size` to fill
+            instead of allocating a new one.
+
+        Returns
+        -------
+        valid_action_mask : np.ndarray
+            True at every valid player-perspective action id. Only PASS_ACTION_ID is True if there are no valid actions.
+
+        See Also
+        --------
+        blockus.blockus_env.BlockusEnv.valid_action_mask
+        blockus.game_state.player_perspective_to_real_action_ids
+            You have to convert a player-perspective action id to a real one before passing it to the environment
+        """
+        board, _, players = state
+        valid_action_mask = np.empty(self.action_space_size(), dtype=np.bool_) if out is None else out
+        action_ids = valid_move_array_to_action_ids(self._cached_valid_move_array(state, player))
+        fill_action_mask(valid_action_mask,
+                         real_to_player_perspective_action_ids(action_ids, player, len(players), board.board_size))
+
+        return valid_action_mask
 
-    def convert_real_action_to_player_perspective_action(self, action: str, player: int) -> str:
+    def convert_real_action_to_player_perspective_action(self, action: str, player: int, variant: str = "classic") -> str:
         """ Converts a real action consumable by the actual environment to the corresponding player-perspective action
         that is in coordinance with the player's rotated observation of the board
 
@@ -562,6 +664,8 @@ class BlockusEnv(BaseEnvironment):
             The real action.
         player : int
             The player to view this action from.
+        variant : str (optional)
+            The key of :py:data:`blockus.board.VARIANTS` the game is played with.
 
         Returns
         -------
@@ -577,19 +681,13 @@ class BlockusEnv(BaseEnvironment):
         if not action:
             return ""
 
-        piece_type, index, orientation = string_to_action(action)
-
-        index = tuple((np.matmul(BOARD_TO_PLAYER_OBSERVATION_ROTATION_MATRICES[player],
-                                 (np.asarray(index) - 9.5)) + 9.5).astype(np.int32))
-
-        orientation, offset = _separate_offset_from_orientation(orientation)
-        orientation = ORIENTATIONS[(ORIENTATIONS.index(orientation) + player * 2) % len(ORIENTATIONS)]
-        orientation += offset
+        rules = VARIANTS[variant]
+        return action_id_to_string(real_to_player_perspective_action_ids(string_to_action_id(action), player,
+                                                                         rules["num_players"], rules["board_size"]))
 
-        return action_to_string(piece_type, index, orientation)
 
-
-    def convert_player_perspective_action_to_real_action(self, player_action: str, player: int) -> str:
+    def convert_player_perspective_action_to_real_action(self, player_action: str, player: int,
+                                                         variant: str = "classic") -> str:
         """ Converts a player-perspective action in coordinance with the player's rotated observation of the board
         to the corresponding real action consumable by the actual environment.
 
@@ -600,6 +698,8 @@ class BlockusEnv(BaseEnvironment):
             The player-perspective action.
         player : int
             The player to view this action from.
+        variant : str (optional)
+            The key of :py:data:`blockus.board.VARIANTS` the game is played with.
 
         Returns
         -------
@@ -617,16 +717,9 @@ class BlockusEnv(BaseEnvironment):
         if not player_action:
             return ""
 
-        piece_type, index, orientation = string_to_action(player_action)
-
-        index = tuple((np.matmul(PLAYER_OBSERVATION_TO_BOARD_ROTATION_MATRICES[player],
-                                 (np.asarray(index) - 9.5)) + 9.5).astype(np.int32))
-
-        orientation, offset = _separate_offset_from_orientation(orientation)
-        orientation = ORIENTATIONS[(ORIENTATIONS.index(orientation) - player * 2) % len(ORIENTATIONS)]
-        orientation += offset
-
-        return action_to_string(piece_type, index, orientation)
+        rules = VARIANTS[variant]
+        return action_id_to_string(player_perspective_to_real_action_ids(string_to_action_id(player_action), player,
+                                                                         rules["num_players"], rules["board_size"]))
 
     def valid_actions_dict(self, state: object, player: int) -> Dict[str, Dict[Tuple[int, int], List[str]]]:
         """ Valid actions for a specific state and player in the dictionary form {piece_type: {index: [orientation,]}}
@@ -658,14 +751,84 @@ class BlockusEnv(BaseEnvironment):
         This method does not keep track of who's turn it is. That is up to the user.
         If the specified player can physically place a piece at a location, it will be returned as a valid action.
 
+        """
+        return valid_move_array_to_dict(self._cached_valid_move_array(state, player))
+
+    def unique_valid_actions_dict(self, state: object, player: int) -> Dict[FrozenSet[Tuple[int, int]], str]:
+        """ Canonical valid moves for a specific state and player, one per distinct placement.
+
+        Parameters
+        ----------
+        state : object
+            The current state to execute a game step from.
+        player : int
+            The player for which valid actions will be returned.
+
+        Returns
+        -------
+        unique_valid_actions_dict : Dict[FrozenSet[Tuple[int, int]], str]
+            A dictionary keyed by the set of (x, y) cells a placement occupies.
+            Each value is a valid action string that places the piece on exactly those cells.
+
+        See Also
+        --------
+        blockus.blockus_env.BlockusEnv.valid_actions
+        blockus.blockus_env.BlockusEnv.valid_actions_dict
+        blockus.blockus_env.BlockusEnv.next_state
+            Any action string in this dictionary can be passed to this method.
+
+        Notes
+        -----
+        Symmetric pieces cover the same cells under several orientations, and the same cells can also be
+        reached from several corner indexes through different shift ids. All of those actions
+        collapse into a single entry here.
+        """
+        unique_moves = valid_move_array_to_unique_dict(self._cached_valid_move_array(state, player))
+
+        return {cells: action_to_string(piece_type=piece_type, index=index, orientation=orientation)
+                for cells, (piece_type, index, orientation) in unique_moves.items()}
+
+    def random_valid_action(self, state: object, player: int, rng: Union[np.random.Generator, None] = None,
+                            as_action_id: bool = False) -> Union[str, int]:
+        """ A uniformly random valid action for a specific state and player, without generating every valid action.
+
+        Parameters
+        ----------
+        state : object
+            The current state to execute a game step from.
+        player : int
+            The player for which a valid action will be returned.
+        rng : np.random.Generator (optional)
+            Random number generator to sample with, the env's own rng if not given.
+        as_action_id : bool (optional)
+            If True, an action id is returned instead of an action string.
+
+        Returns
+        -------
+        random_valid_action : Union[str, int]
+            An action that :py:func:`blockus.blockus_env.BlockusEnv.valid_actions` would return,
+            each of them with the same probability. An empty string (or PASS_ACTION_ID) if there is none.
+
+        See Also
+        --------
+        blockus.blockus_env.BlockusEnv.valid_actions
+        blockus.board.Board.random_valid_move
+
+        Notes
+        -----
+        Placements are drawn from precomputed per-index tables of the placements that fit on the board
+        and rejected until a legal one comes up, which usually takes a few checks. Only if many draws in a row
+        are rejected are all valid actions generated to pick from.
         """
         board, round_count, players = state
-        current_player_object = players[player]
-        return board.get_all_valid_moves(round_count=round_count,
-                                         player_color=PLAYER_TO_COLOR[player],
-                                         player_pieces=current_player_object.current_pieces)
+        move = board.random_valid_move(round_count, PLAYER_TO_COLOR[player], players[player].current_pieces,
+                                       self.rng if rng is None else rng)
+
+        if as_action_id:
+            return PASS_ACTION_ID if move is None else action_to_action_id(*move)
+        return "" if move is None else action_to_string(*move)
 
-    def is_valid_action(self, state: object, player: int, action: str) -> bool:
+    def is_valid_action(self, state: object, player: int, action: Union[str, int]) -> bool:
         """ Returns True if an action is valid for a specific player and state.
 
         (Does not validate rotated player-perspective actions)
@@ -676,8 +839,8 @@ class BlockusEnv(BaseEnvironment):
             The current state to execute a game step from.
         player : int
             The player that would be executing the action.
-        action : str
-            The action in question
+        action : Union[str, int]
+            The action string or action id in question
 
         Returns
         -------
@@ -699,27 +862,27 @@ class BlockusEnv(BaseEnvironment):
         This method does not keep track of who's turn it is. That is up to the user.
         If a piece may be physically placed at the location suggest by the action,
         this method returns true, regardless of who just executed their turn or who should be going now.
+
+        The check only looks at the cells the piece would cover, so it takes constant time
+        and agrees with :py:func:`blockus.blockus_env.BlockusEnv.valid_actions`.
         """
 
-        if len(action) == 0:
+        try:
+            action = parse_action(action)
+        except ValueError:  # Action ids outside of the action space
+            return False
+        if action is None:
             return False
 
         board, round_count, players = state
-        piece_type, index, orientation = string_to_action(action)
-        current_player = players[player]
-        all_valid_moves = current_player.collect_moves(board, round_count)
-
-        is_valid_move = False
-        try:
-            # print(all_valid_moves[piece_type][index])
-            if orientation in all_valid_moves[piece_type][index]:
-                is_valid_move = True
-        except KeyError:
-            pass
+        piece_type, index, orientation = action
 
-        return is_valid_move
+        # Only the cells of this placement are checked, no moves are generated
+        return board.is_valid_move(round_count, PLAYER_TO_COLOR[player], players[player].current_pieces,
+                                   piece_type, index, orientation)
 
-    def state_to_observation(self, state: object, player: int) -> Dict[str, np.ndarray]:
+    def state_to_observation(self, state: object, player: int,
+                             out: Union[Dict[str, np.ndarray], None] = None) -> Dict[str, np.ndarray]:
         """ Convert the raw game state to a consumable observation for a specific player agent.
 
         Parameters
@@ -728,6 +891,9 @@ class BlockusEnv(BaseEnvironment):
             The state to create an observation for
         player : int
             The player who is intended to view the observation
+        out : Dict[str, np.ndarray] (optional)
+            Preallocated "board" (board_size, board_size) int64, "pieces" (players, 21) uint8, "score" (players,) int64
+            and "player" (1,) int64 arrays to write the observation into instead of allocating new ones.
 
         Returns
         -------
@@ -748,22 +914,10 @@ class BlockusEnv(BaseEnvironment):
         Every observation is presented as if the player intended to receive it were actually player 0.
         This is done so that an RL agent only has to learn to perform moves that make player 0 win
         and other players lose.
+
+        Every player's view is rotated by a number of quarter turns spread over the players of the game
+        (see :py:func:`blockus.board.perspective_quarter_turns`), so the two Duo players see the board half a turn apart.
         """
 
-        pieces = np.zeros((4, 21), dtype=np.uint8)
         board, round_count, players = state
-        board = [[_relative_player_id(player, COLOR_TO_PLAYER[pos]) for pos in row] for row in board.board_contents]
-        rotated_board = _rotate_board_for_player_perspective(board=np.asarray(board), player=player)
-
-        for p in players:
-
-            color = p.player_color
-            rel_player_id = _relative_player_id(current_player=player,
-                                                absolute_player_num=COLOR_TO_PLAYER[color])
-
-            for piece in p.current_pieces:
-                pieces[rel_player_id, PIECE_NAME_TO_INDEX[piece]] = 1
-
-        score = np.roll(np.array([p.player_score for p in players]), -player)
-
-        return {'board': rotated_board, 'pieces': pieces, 'score': score, 'player': np.array([player])}
+        return state_observation(board.board_contents, players, player, out=out)
@@ -3,7 +3,6 @@ from blockus.blockus_client_env import BlockusClientEnv
 from spacetimerl.rl_logging import init_logging
 from spacetimerl.client_environment import RLApp
 import numpy as np
-from random import choice
 
 
 @RLApp("localhost", 7777, client_environment=BlockusClientEnv, server_environment=BlockusEnv, time_out=5)
@@ -18,8 +17,7 @@ def main(ce: BlockusClientEnv):
     while True:
         # ce.render(ce.full_state, player_num, winners)
 
-        valid_actions = ce.valid_actions()
-        action = choice(valid_actions)
+        action = ce.random_valid_action()
 
         new_obs, reward, terminal, winners = ce.step(str(action))
 
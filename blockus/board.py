@@ -14,10 +14,9 @@ COLOR ENCODINGS
 '''
 
 from collections import defaultdict
-from copy import deepcopy
+import time
 import numpy as np
 from blockus import computation as comp
-from numba import jit
 
 # Stores structure of all playable pieces
 # key: piece name:
@@ -47,9 +46,40 @@ PIECE_TYPES = {"monomino1": np.array([(0, 0)]),
 # All possible piece orientations, listed in clockwise order
 ORIENTATIONS = ["north", "northeast", "east", "southeast", "south", "southwest", "west", "northwest"]
 
+# key: piece name / orientation name
+# val: position of the piece / orientation in PIECE_TYPES / ORIENTATIONS
+PIECE_IDS = {piece_type: piece_id for piece_id, piece_type in enumerate(PIECE_TYPES.keys())}
+PIECE_NAMES = list(PIECE_TYPES.keys())
+ORIENTATION_IDS = {orientation: orientation_id for orientation_id, orientation in enumerate(ORIENTATIONS)}
+
+# Integer (x, y) transform applied to the default piece offsets for each orientation in ORIENTATIONS
+ORIENTATION_MATRICES = np.array([
+    [[0, 1], [-1, 0]],   # north: rotate 270 degrees
+    [[1, 0], [0, -1]],   # northeast: flip y
+    [[1, 0], [0, 1]],    # east: default orientation
+    [[0, 1], [1, 0]],    # southeast: rotate 90 degrees, flip x
+    [[0, -1], [1, 0]],   # south: rotate 90 degrees
+    [[-1, 0], [0, 1]],   # southwest: rotate 180 degrees, flip y
+    [[-1, 0], [0, -1]],  # west: rotate 180 degrees
+    [[0, -1], [-1, 0]],  # northwest: rotate 270 degrees, flip x
+], dtype=np.int64)
+
+# Most cells in any piece, which is also the number of possible shift ids
+MAX_PIECE_SIZE = max(len(offsets) for offsets in PIECE_TYPES.values())
+
 # Default starting corners for each player (0 to 3)
 PLAYER_DEFAULT_CORNERS = [(0, 0), (19, 0), (0, 19), (19, 19)]
 
+# Side length of the classic board. Smaller boards use the same action ids, whose cells stay on a 20 wide grid.
+BOARD_SIZE = 20
+
+# Supported rule sets
+# key: variant name that can be passed to BlockusEnv.new_state
+# val: board side length, number of players and the cell each player's first piece has to cover
+VARIANTS = {"classic": {"board_size": 20, "num_players": 4, "start_corners": PLAYER_DEFAULT_CORNERS},
+            "three_player": {"board_size": 20, "num_players": 3, "start_corners": PLAYER_DEFAULT_CORNERS[:3]},
+            "duo": {"board_size": 14, "num_players": 2, "start_corners": [(4, 4), (9, 9)]}}
+
 BOARD_TO_PLAYER_OBSERVATION_ROTATION_MATRICES = np.array([
     [[1, 0],
      [0, 1]],
@@ -73,17 +103,243 @@ PLAYER_OBSERVATION_TO_BOARD_ROTATION_MATRICES = np.array([
      [1, 0]]
 ], dtype=np.int32)
 
-class Board:
-    def __init__(self, copy_from_board=None):
-        self.reset_board(copy_from_board)
 
-    def reset_board(self, copy_from_board=None):
-        ''' Creates empty 2-dimensional 20 by 20 numpy zeros array that represents a clean board
+def perspective_quarter_turns(player, num_players):
+    ''' Returns how many quarter turns a player's observation of the board is rotated by, the index into
+        BOARD_TO_PLAYER_OBSERVATION_ROTATION_MATRICES. The turns are spread over the players, so both Duo
+        players see the board half a turn apart. Works on arrays of players too.
+    '''
+    return player * 4 // num_players
+
+
+def build_placement_table():
+    ''' Rotates and shifts the offsets of every piece type for every orientation and shift id once.
+        Returns a contiguous int8 array of (x, y) cell offsets and an int32 index of shape
+        (pieces, orientations, MAX_PIECE_SIZE, 2) holding the (start, stop) rows of every placement.
+        Shift ids past the size of a piece have start == stop.
+    '''
+    placement_offsets = []
+    placement_index = np.zeros((len(PIECE_TYPES), len(ORIENTATIONS), MAX_PIECE_SIZE, 2), dtype=np.int32)
+
+    for piece_id, offsets in enumerate(PIECE_TYPES.values()):
+        for orientation_id, orientation_matrix in enumerate(ORIENTATION_MATRICES):
+            rotated_offsets = np.ascontiguousarray(offsets.dot(orientation_matrix.T), dtype=np.int64)
+            for shifted_id in range(len(offsets)):
+                start = len(placement_offsets)
+                placement_offsets.extend(comp.shift_offsets(rotated_offsets, shifted_id).tolist())
+                placement_index[piece_id, orientation_id, shifted_id] = (start, len(placement_offsets))
+            placement_index[piece_id, orientation_id, len(offsets):] = len(placement_offsets)
+
+    return np.array(placement_offsets, dtype=np.int8), placement_index
+
+
+# Every (piece, orientation, shift_id) cell offset array, rows looked up through PLACEMENT_INDEX
+PLACEMENT_OFFSETS, PLACEMENT_INDEX = build_placement_table()
+
+
+def build_placement_ids():
+    ''' Numbers every existing (piece, orientation, shift_id) combination in PLACEMENT_INDEX order.
+        Returns the (pieces, orientations, MAX_PIECE_SIZE) id lookup (-1 where a piece has no such shift id)
+        and the piece id, orientation id and shift id of every placement id.
+    '''
+    placement_ids = np.full(PLACEMENT_INDEX.shape[:3], -1, dtype=np.int64)
+    exists = PLACEMENT_INDEX[..., 0] != PLACEMENT_INDEX[..., 1]
+    placement_ids[exists] = np.arange(np.count_nonzero(exists))
+    placement_pieces, placement_orientations, placement_shifts = np.nonzero(exists)
+
+    return placement_ids, placement_pieces, placement_orientations, placement_shifts
+
+
+# Board cells, and the ids of every (piece, orientation, shift_id) placement
+NUM_CELLS = 20 * 20
+PLACEMENT_IDS, PLACEMENT_PIECES, PLACEMENT_ORIENTATIONS, PLACEMENT_SHIFTS = build_placement_ids()
+NUM_PLACEMENTS = len(PLACEMENT_PIECES)
+
+# (start, stop) rows into PLACEMENT_OFFSETS of every placement id
+PLACEMENT_BOUNDS = np.ascontiguousarray(PLACEMENT_INDEX[PLACEMENT_PIECES, PLACEMENT_ORIENTATIONS, PLACEMENT_SHIFTS])
+# First and last + 1 placement id of every piece id, placement ids of a piece are consecutive
+PIECE_PLACEMENT_RANGES = np.stack((np.searchsorted(PLACEMENT_PIECES, np.arange(len(PIECE_TYPES))),
+                                   np.searchsorted(PLACEMENT_PIECES, np.arange(len(PIECE_TYPES)), side="right")), axis=1)
+# Number of placement ids of every piece id, as python ints
+PIECE_NUM_PLACEMENTS = (PIECE_PLACEMENT_RANGES[:, 1] - PIECE_PLACEMENT_RANGES[:, 0]).tolist()
+# Empty order and random draws that make comp.scan_placements walk its candidates in the fixed order
+NO_SCAN_ORDER = np.zeros(0, dtype=np.int64)
+NO_RANDOM_DRAWS = np.zeros(0)
+
+
+def build_anchor_placements():
+    ''' Returns, for every board cell and piece, the placement ids of that piece that stay on the board when
+        anchored at the cell, as rows of a compressed table: the ids of row cell * pieces + piece id are
+        anchor_placement_ids[anchor_starts[row]:anchor_starts[row + 1]].
+    '''
+    placement_cells = [PLACEMENT_OFFSETS[start:stop] for start, stop in PLACEMENT_BOUNDS.tolist()]
+    lowest = np.array([offsets.min(axis=0) for offsets in placement_cells])
+    highest = np.array([offsets.max(axis=0) for offsets in placement_cells])
+
+    ys, xs = np.divmod(np.arange(20 * 20), 20)
+    anchors = np.stack((xs, ys), axis=1)[:, np.newaxis, :]
+    fits = ((anchors + lowest >= 0) & (anchors + highest < 20)).all(axis=2)  # (cells, placements)
+
+    # Placement ids are ordered by piece, so sorting the fitting (cell, placement) pairs by cell groups them by row
+    cell_ids, placement_ids = np.nonzero(fits)
+    rows = cell_ids * len(PIECE_TYPES) + PLACEMENT_PIECES[placement_ids]
+    anchor_starts = np.searchsorted(rows, np.arange(20 * 20 * len(PIECE_TYPES) + 1))
+
+    return anchor_starts.astype(np.int64), placement_ids.astype(np.int32)
+
+
+ANCHOR_STARTS, ANCHOR_PLACEMENT_IDS = build_anchor_placements()
+# Orientation string (orientation name + shift id) of every placement id
+PLACEMENT_ORIENTATION_NAMES = [ORIENTATIONS[orientation_id] + str(shifted_id)
+                               for orientation_id, shifted_id in zip(PLACEMENT_ORIENTATIONS.tolist(), PLACEMENT_SHIFTS.tolist())]
+# Cells of every placement id relative to its index, padded to MAX_PIECE_SIZE cells by repeating the first one
+PLACEMENT_CELLS = np.stack([np.concatenate((PLACEMENT_OFFSETS[start:stop],
+                                            np.repeat(PLACEMENT_OFFSETS[start:start + 1], MAX_PIECE_SIZE - (stop - start), axis=0)))
+                            for start, stop in PLACEMENT_BOUNDS.tolist()]).astype(np.int64)
+
+# Action ids are placement_id * NUM_CELLS + y * 20 + x. The id right after the last action means pass.
+NUM_ACTIONS = NUM_PLACEMENTS * NUM_CELLS
+PASS_ACTION_ID = NUM_ACTIONS
+
+# Valid move arrays hold rows of (piece_id, x, y, orientation_id * 8 + shift_id)
+VALID_MOVE_ORIENTATION_NAMES = [orientation + str(shifted_id) for orientation in ORIENTATIONS for shifted_id in range(8)]
+
+
+ZOBRIST_SEED = 20190315
+
+
+def build_zobrist_keys():
+    ''' Returns the random 64-bit keys of Zobrist hashing as python int lists, drawn from a fixed seed so
+        hashes are the same in every process:
+        cell keys indexed [y][x][color], piece keys indexed [color][piece id] and player to move keys indexed [player].
+        Keys of color 0 are 0, so empty cells and the unused color do not change a hash.
+    '''
+    rng = np.random.default_rng(ZOBRIST_SEED)
+    cell_keys = rng.integers(0, 2 ** 64, size=(20, 20, 5), dtype=np.uint64)
+    cell_keys[:, :, 0] = 0
+    piece_keys = rng.integers(0, 2 ** 64, size=(5, len(PIECE_TYPES)), dtype=np.uint64)
+    piece_keys[0] = 0
+    player_to_move_keys = rng.integers(0, 2 ** 64, size=4, dtype=np.uint64)
+
+    return cell_keys.tolist(), piece_keys.tolist(), player_to_move_keys.tolist()
+
+
+# A state hash XORs the cell key of every occupied cell, the piece key of every piece played and
+# the key of the player to move. Board and AI keep their part up to date on every update.
+ZOBRIST_CELL_KEYS, ZOBRIST_PIECE_KEYS, ZOBRIST_PLAYER_TO_MOVE_KEYS = build_zobrist_keys()
+
+
+def placement_offsets(piece_type, orientation):
+    ''' Returns the cell offsets from the index for an orientation string that ends with its shift id.
+    '''
+    start, stop = PLACEMENT_INDEX[PIECE_IDS[piece_type], ORIENTATION_IDS[orientation[:-1]], int(orientation[-1])]
+    return PLACEMENT_OFFSETS[start:stop]
+
+
+def inventory_mask(player_pieces):
+    ''' Returns an int with bit piece_id set for every piece type in player_pieces.
+    '''
+    mask = 0
+    for piece_type in player_pieces:
+        mask |= 1 << PIECE_IDS[piece_type]
+    return mask
+
+
+def valid_move_array_to_dict(valid_moves):
+    ''' Builds the {piece_type: {index: [orientation,]}} dict of get_all_valid_moves out of a valid move array.
+    '''
+    all_valid_moves = {}
+    for piece_id, x, y, orientation_shift in valid_moves.tolist():
+        piece_type = PIECE_NAMES[piece_id]
+        if piece_type not in all_valid_moves:
+            all_valid_moves[piece_type] = defaultdict(list)
+        all_valid_moves[piece_type][(x, y)].append(VALID_MOVE_ORIENTATION_NAMES[orientation_shift])
+
+    return all_valid_moves
+
+
+def valid_move_array_to_placement_ids(valid_moves):
+    ''' Converts the rows of a valid move array into an int64 array of placement ids.
+    '''
+    return PLACEMENT_IDS[valid_moves[:, 0], valid_moves[:, 3] // 8, valid_moves[:, 3] % 8].astype(np.int64)
+
+
+def valid_move_array_to_action_ids(valid_moves):
+    ''' Converts the rows of a valid move array into an int64 array of action ids.
+    '''
+    return valid_move_array_to_placement_ids(valid_moves) * NUM_CELLS + valid_moves[:, 2] * 20 + valid_moves[:, 1]
+
+
+def valid_move_array_to_cells(valid_moves):
+    ''' Returns the (moves, MAX_PIECE_SIZE, 2) int64 array of the (x, y) cells every row covers.
+        Smaller pieces repeat their first cell.
+    '''
+    return PLACEMENT_CELLS[valid_move_array_to_placement_ids(valid_moves)] + valid_moves[:, np.newaxis, 1:3]
+
+
+def unique_valid_move_array(valid_moves):
+    ''' Keeps the first row of every group of rows of a valid move array that cover the same cells.
+        Symmetric orientations and different corner indexes often place a piece on the same cells.
+    '''
+    placement_ids = valid_move_array_to_placement_ids(valid_moves)
+    cells = PLACEMENT_CELLS[placement_ids] + valid_moves[:, np.newaxis, 1:3]
+    cell_ids = cells[..., 1] * 20 + cells[..., 0]
+    # The padding repeats the first cell, which depends on the shift id, so it is masked out before comparing
+    num_cells = PLACEMENT_BOUNDS[placement_ids, 1] - PLACEMENT_BOUNDS[placement_ids, 0]
+    cell_ids[np.arange(MAX_PIECE_SIZE) >= num_cells[:, np.newaxis]] = -1
+    _, first_rows = np.unique(np.sort(cell_ids, axis=1), axis=0, return_index=True)
+    return valid_moves[np.sort(first_rows)]
+
+
+def valid_move_array_to_unique_dict(valid_moves):
+    ''' Keeps one row per distinct placement as a dict keyed by the frozenset of (x, y) cells the placement occupies,
+        with the (piece_type, index, orientation) of the first row covering those cells as its value.
+    '''
+    valid_moves = unique_valid_move_array(valid_moves)
+    return {frozenset(map(tuple, cells)): (PIECE_NAMES[piece_id], (x, y), VALID_MOVE_ORIENTATION_NAMES[orientation_shift])
+            for cells, (piece_id, x, y, orientation_shift) in zip(valid_move_array_to_cells(valid_moves).tolist(),
+                                                                   valid_moves.tolist())}
+
+
+def fill_action_mask(valid_action_mask, action_ids):
+    ''' Clears valid_action_mask (a boolean array of NUM_ACTIONS + 1) and sets every action id,
+        or only PASS_ACTION_ID if action_ids is empty.
+    '''
+    valid_action_mask[:] = False
+    valid_action_mask[action_ids] = True
+    valid_action_mask[PASS_ACTION_ID] = len(action_ids) == 0
+
+
+class Board:
+    def __init__(self, copy_from_board=None, board_size=BOARD_SIZE, start_corners=None):
+        self.reset_board(copy_from_board, board_size, start_corners)
+
+    def reset_board(self, copy_from_board=None, board_size=BOARD_SIZE, start_corners=None):
+        ''' Creates empty 2-dimensional board_size by board_size numpy zeros array that represents a clean board.
+            start_corners holds the (x, y) cell the first piece of each color has to cover, the board's
+            corners in PLAYER_DEFAULT_CORNERS order by default. Both are taken from copy_from_board if it is given.
+            corner_cells[color] marks the empty cells where that color may anchor its next piece and
+            forbidden_cells[color] marks the cells edge-adjacent to that color. Both are indexed [color][y][x]
+            and kept up to date by update_board. player_to_move is the player (0 to 3) whose turn it is.
+            zobrist_hash is the XOR of ZOBRIST_CELL_KEYS over the occupied cells.
         '''
         if copy_from_board is not None:
-            self.board_contents = deepcopy(copy_from_board.board_contents)
+            self.board_size = copy_from_board.board_size
+            self.start_corners = copy_from_board.start_corners
+            self.board_contents = copy_from_board.board_contents.copy()
+            self.corner_cells = copy_from_board.corner_cells.copy()
+            self.forbidden_cells = copy_from_board.forbidden_cells.copy()
+            self.player_to_move = copy_from_board.player_to_move
+            self.zobrist_hash = copy_from_board.zobrist_hash
         else:
-            self.board_contents = np.zeros((20, 20), dtype=int)
+            self.board_size = board_size
+            self.start_corners = start_corners if start_corners is not None else [
+                (0, 0), (board_size - 1, 0), (0, board_size - 1), (board_size - 1, board_size - 1)]
+            self.board_contents = np.zeros((board_size, board_size), dtype=int)
+            self.corner_cells = np.zeros((5, board_size, board_size), dtype=np.bool_)
+            self.forbidden_cells = np.zeros((5, board_size, board_size), dtype=np.bool_)
+            self.player_to_move = 0
+            self.zobrist_hash = 0
 
     def update_board(self, player_color, piece_type, index, piece_orientation, round_count, ai_game):
         ''' Takes index point and places piece_type on board
@@ -91,18 +347,70 @@ class Board:
             index[1] = y coord
         '''
         self.player_color = player_color
-        for offset in comp.shift_offsets(PIECE_TYPES[piece_type], int(piece_orientation[-1])):  # NEW: Shifts offset orientation according to last character in piece orientation
-            if offset[0] == 0 and offset[1] == 0:
-                self.place_piece(index[0] + offset[0], index[1] + offset[1])  # Orientation doesn't matter since (0, 0) is the reference point
-            else:
-                new_x, new_y = comp.rotate_piece(index, offset[0], offset[1], piece_orientation)
-                self.place_piece(new_x, new_y)
+        placed_cells = self.placement_cells(piece_type, index, piece_orientation)
+        for x, y in placed_cells.tolist():
+            self.place_piece(x, y)
+            self.zobrist_hash ^= ZOBRIST_CELL_KEYS[y][x][player_color]
+
+        comp.update_frontier(self.board_contents, self.corner_cells, self.forbidden_cells, player_color, placed_cells)
+
+    def placement_cells(self, piece_type, index, piece_orientation):
+        ''' Returns an int64 array of the (x, y) board cells a piece covers when placed at index.
+        '''
+        return index + placement_offsets(piece_type, piece_orientation).astype(np.int64)  # Offsets are already rotated and shifted by the last character in piece orientation
+
+    def apply_update(self, player_color, piece_type, index, piece_orientation, round_count):
+        ''' Same as update_board, but returns an undo record that undo_update uses to take the piece back off.
+            Only the placed cells and the frontier of the player's color are saved, not the whole board.
+        '''
+        placed_cells = self.placement_cells(piece_type, index, piece_orientation)
+        row_nums, col_nums = placed_cells[:, 1], placed_cells[:, 0]
+        undo_record = (getattr(self, "player_color", None), player_color, row_nums, col_nums,
+                       self.corner_cells[:, row_nums, col_nums],  # Fancy indexing already copies
+                       self.corner_cells[player_color].copy(),
+                       self.forbidden_cells[player_color].copy(),
+                       self.zobrist_hash)
+        self.update_board(player_color, piece_type, index, piece_orientation, round_count, True)
+
+        return undo_record
+
+    def undo_update(self, undo_record):
+        ''' Reverts the apply_update call that returned undo_record. Updates must be undone in reverse order.
+        '''
+        previous_color, player_color, row_nums, col_nums, placed_corner_cells, corner_cells, forbidden_cells, zobrist_hash = undo_record
+        self.player_color = previous_color
+        self.zobrist_hash = zobrist_hash
+        self.board_contents[row_nums, col_nums] = 0
+        self.corner_cells[:, row_nums, col_nums] = placed_corner_cells  # Other colors only changed on the placed cells
+        self.corner_cells[player_color] = corner_cells
+        self.forbidden_cells[player_color] = forbidden_cells
 
     def place_piece(self, x, y):
         ''' Places piece on board by filling board_contents with the current player color
         '''
         self.board_contents[y][x] = self.player_color
 
+    def rebuild_frontier(self):
+        ''' Recomputes corner_cells and forbidden_cells from scratch out of board_contents with whole-board array ops.
+            Only needed when board_contents was filled in without going through update_board.
+        '''
+        empty_cells = self.board_contents == 0
+        self.corner_cells[0] = False
+        self.forbidden_cells[0] = False
+        for player_color in range(1, 5):
+            own_cells = np.pad(self.board_contents == player_color, 1)  # Padding keeps the edges of the board
+            self.forbidden_cells[player_color] = own_cells[:-2, 1:-1] | own_cells[2:, 1:-1] | own_cells[1:-1, :-2] | own_cells[1:-1, 2:]
+            diagonal_cells = own_cells[:-2, :-2] | own_cells[:-2, 2:] | own_cells[2:, :-2] | own_cells[2:, 2:]
+            self.corner_cells[player_color] = empty_cells & diagonal_cells & ~self.forbidden_cells[player_color]
+
+    def rebuild_zobrist_hash(self):
+        ''' Recomputes zobrist_hash from scratch out of board_contents.
+            Only needed when board_contents was filled in without going through update_board.
+        '''
+        self.zobrist_hash = 0
+        for y, x in zip(*np.nonzero(self.board_contents)):
+            self.zobrist_hash ^= ZOBRIST_CELL_KEYS[y][x][self.board_contents[y, x]]
+
     # def gather_empty_board_corners(self, corners_coords):
     #     ''' Checks what corners are still available to play in the first round of the game
     #     '''
@@ -115,58 +423,44 @@ class Board:
     def gather_empty_corner_indexes(self, player_color):
         ''' Returns a list of tuples with the indexes of empty corner cells that connect to the player's color.
             The corner_index is not adjecent/touching any same color tiles on its sides beside its corners.
+            Reads the incrementally tracked corner_cells instead of rescanning the board, in the same row by row order.
         '''
-        empty_corner_indexes = []
-        for row_num, row in enumerate(self.board_contents):
-            for col_num, cell in enumerate(row):
-                if cell == 0:  # Check if cell is empty
-                    if self.check_valid_corner(self.board_contents, player_color, row_num, col_num):  # If cell lines up with any adjacent piece that is the same color, its an invalid move, otherwise valid
-                        empty_corner_indexes.append((col_num, row_num))
+        row_nums, col_nums = np.nonzero(self.corner_cells[player_color])
+        return list(zip(col_nums.tolist(), row_nums.tolist()))
 
-        return empty_corner_indexes
-
-    def check_valid_corner(self, board_contents, player_color, row_num, col_num):
-        ''' Checks whether all adjacent pieces are a different color to the current player's color.
-            Checks if any corner piece is the same color as the current player.
+    def gather_candidate_indexes(self, round_count, player_color):
+        ''' Returns the indexes a piece may be anchored at: the player's start corner in the first round,
+            otherwise every empty corner cell that connects to the player's color.
         '''
-        if not comp.is_valid_adjacents(board_contents, row_num, col_num, player_color):  # Not a valid corner if adjacents are same color
-            return False
-
-        # Exclude top and right edge cases
-        if row_num != 0 and col_num != 19:
-            if board_contents[row_num - 1][col_num + 1] == player_color:
-                return True
-
-        # Exclude top and left cases
-        if row_num != 0 and col_num != 0:
-            if board_contents[row_num - 1][col_num - 1] == player_color:
-                return True
-
-        # Exclude bottom and right edge cases
-        if row_num != 19 and col_num != 19:
-            if board_contents[row_num + 1][col_num + 1] == player_color:
-                return True
-
-        # Exclude bottom and left cases
-        if row_num != 19 and col_num != 0:
-            if board_contents[row_num + 1][col_num - 1] == player_color:
-                return True
-
-        return False
+        if round_count == 0:  # If still first round of game..
+            # empty_corner_indexes = self.gather_empty_board_corners([(0, 0), (19, 0), (0, 19), (19, 19)])
+            return [self.start_corners[player_color-1]]
+        return self.gather_empty_corner_indexes(player_color)
 
-    def check_orientation_shifts(self, player_color, piece_type, index, orientation):
-        ''' DESCRIPTION: Shifts piece N times where N is how large the piece is. Each piece shift
-                         is then checked to see whether it is a valid move.
-            PARAMETERS: player_color: int indicating current player color
-                        piece_type: string mapping to set of default offsets (defined in global space)
-                        index: tuple representing index coords on board
-                        orientation: string specifying the current orientation being checked
-            RETURNS: List of all offset lists where a shift at that index and orientation is possible
+    def candidate_index_array(self, round_count, player_color):
+        ''' Same indexes as gather_candidate_indexes, as a contiguous (N, 2) int64 array of (x, y) coords.
+        '''
+        if round_count == 0:
+            return np.array([self.start_corners[player_color-1]], dtype=np.int64)
+        row_nums, col_nums = np.nonzero(self.corner_cells[player_color])
+        candidate_indexes = np.empty((len(row_nums), 2), dtype=np.int64)  # Filled column by column, cheaper than np.stack
+        candidate_indexes[:, 0] = col_nums
+        candidate_indexes[:, 1] = row_nums
+        return candidate_indexes
+
+    def get_valid_move_array(self, round_count, player_color, player_pieces, max_moves=None):
+        ''' Finds the valid moves of get_all_valid_moves, in the same order, with a single compiled kernel call.
+            Returns an int64 array of (piece_id, x, y, orientation_id * 8 + shift_id) rows,
+            holding at most max_moves rows if it is given.
         '''
-        shifted_offsets = comp.get_all_shifted_offsets(PIECE_TYPES[piece_type], orientation)
-        valid_shift_offsets = comp.check_shifted(self.board_contents, player_color, index, orientation, shifted_offsets)
+        candidate_indexes = self.candidate_index_array(round_count, player_color)
+        if max_moves is None:
+            max_moves = len(candidate_indexes) * NUM_PLACEMENTS  # Every placement at every index
+        valid_moves = np.empty((max_moves, 4), dtype=np.int64)
+        num_moves = comp.generate_valid_moves(self.board_contents, self.forbidden_cells[player_color], candidate_indexes,
+                                              inventory_mask(player_pieces), PLACEMENT_OFFSETS, PLACEMENT_INDEX, valid_moves)
 
-        return valid_shift_offsets
+        return valid_moves[:num_moves].copy()
 
     def get_all_valid_moves(self, round_count, player_color, player_pieces):
         ''' Gathers all valid moves on the board that meet the following criteria:
@@ -174,24 +468,115 @@ class Board:
             - Player piece does not fall outside of the board
             - Player piece does not overlap any of their pieces or other opponent pieces
             - May lay adjacent to another piece as long as its another color
+            The moves come from get_valid_move_array; the dict is only built here, for callers that want it.
         '''
-        if round_count == 0:  # If still first round of game..
-            # empty_corner_indexes = self.gather_empty_board_corners([(0, 0), (19, 0), (0, 19), (19, 19)])
-            empty_corner_indexes = [PLAYER_DEFAULT_CORNERS[player_color-1]]
-        else:
-            empty_corner_indexes = self.gather_empty_corner_indexes(player_color)
+        return valid_move_array_to_dict(self.get_valid_move_array(round_count, player_color, player_pieces))
+
+    def iter_valid_moves(self, round_count, player_color, player_pieces, rng=None):
+        ''' Yields the valid moves of get_all_valid_moves one at a time as (piece_type, index, orientation) tuples.
+            Candidates are checked in compiled chunks that grow while the caller keeps asking, so stopping early
+            leaves the rest of the candidates unchecked. Moves come in get_all_valid_moves order, or in a
+            uniformly random order if a numpy Generator rng is given.
+        '''
+        candidate_indexes = self.candidate_index_array(round_count, player_color)
+        piece_mask = inventory_mask(player_pieces)
+        num_candidates = len(candidate_indexes) * sum(PIECE_NUM_PLACEMENTS[PIECE_IDS[piece_type]] for piece_type in player_pieces)
+        order = np.arange(num_candidates) if rng is not None else NO_SCAN_ORDER
+        random_draws = NO_RANDOM_DRAWS
+
+        forbidden_cells = self.forbidden_cells[player_color]
+        position = 0
+        chunk_size = 1
+        while position < num_candidates:
+            if rng is not None:
+                random_draws = rng.random(chunk_size * 16)  # Most random candidates are illegal
+            valid_placements = np.empty((chunk_size, 3), dtype=np.int64)
+            num_valid, position = comp.scan_placements(self.board_contents, forbidden_cells, candidate_indexes, piece_mask,
+                                                       PIECE_PLACEMENT_RANGES, order, random_draws, position,
+                                                       PLACEMENT_OFFSETS, PLACEMENT_BOUNDS, valid_placements)
+            for placement_id, x, y in valid_placements[:num_valid].tolist():
+                yield PIECE_NAMES[PLACEMENT_PIECES[placement_id]], (x, y), PLACEMENT_ORIENTATION_NAMES[placement_id]
+            chunk_size = min(chunk_size * 4, 1024)
+
+    def random_valid_move(self, round_count, player_color, player_pieces, rng, max_attempts=64):
+        ''' Returns a uniformly random valid move as a (piece_type, index, orientation) tuple, or None if there is none.
+            Draws (index, placement) pairs that fit on the board out of the ANCHOR_STARTS tables and keeps the
+            first legal one, which takes a few attempts instead of checking every candidate. Only after
+            max_attempts rejections are all valid moves generated to pick from.
+        '''
+        candidate_indexes = self.candidate_index_array(round_count, player_color)
+        piece_ids = np.array(sorted(PIECE_IDS[piece_type] for piece_type in player_pieces), dtype=np.int64)
+        placement_id, x, y = comp.sample_placement(self.board_contents, self.forbidden_cells[player_color],
+                                                   candidate_indexes, piece_ids, ANCHOR_STARTS, ANCHOR_PLACEMENT_IDS,
+                                                   PLACEMENT_OFFSETS, PLACEMENT_BOUNDS, rng.random(max_attempts)).tolist()
+        if placement_id >= 0:
+            return PIECE_NAMES[PLACEMENT_PIECES[placement_id]], (x, y), PLACEMENT_ORIENTATION_NAMES[placement_id]
+
+        valid_moves = self.get_valid_move_array(round_count, player_color, player_pieces)
+        if len(valid_moves) == 0:
+            return None
+        piece_id, x, y, orientation_shift = valid_moves[rng.integers(len(valid_moves))].tolist()
+        return PIECE_NAMES[piece_id], (x, y), VALID_MOVE_ORIENTATION_NAMES[orientation_shift]
+
+    def any_valid_move(self, round_count, player_color, player_pieces):
+        ''' Returns True as soon as iter_valid_moves finds a single valid move instead of gathering all of them.
+        '''
+        return next(self.iter_valid_moves(round_count, player_color, player_pieces), None) is not None
+
+    def is_valid_move(self, round_count, player_color, player_pieces, piece_type, index, piece_orientation):
+        ''' Checks a single move against the same criteria as get_all_valid_moves by looking only at the cells
+            the piece would cover, so the cost does not grow with the number of moves the player has:
+            - The piece is still in player_pieces and the orientation (with its shift id) exists for it
+            - The index is the player's start corner in the first round, otherwise an empty corner cell of its color
+            - Every covered cell is on the board, empty and not edge-adjacent to the player's color
+        '''
+        if piece_type not in player_pieces or len(index) != 2 or len(piece_orientation) < 2:
+            return False
+        orientation_id = ORIENTATION_IDS.get(piece_orientation[:-1])
+        shifted_id = piece_orientation[-1]
+        if orientation_id is None or not shifted_id.isdigit() or int(shifted_id) >= MAX_PIECE_SIZE:
+            return False
+        if PLACEMENT_IDS[PIECE_IDS[piece_type], orientation_id, int(shifted_id)] < 0:
+            return False
+
+        x, y = index
+        if round_count == 0:
+            if (x, y) != tuple(self.start_corners[player_color - 1]):
+                return False
+        elif not (0 <= x < self.board_size and 0 <= y < self.board_size and self.corner_cells[player_color, y, x]):
+            return False
+
+        forbidden_cells = self.forbidden_cells[player_color]
+        for offset_x, offset_y in placement_offsets(piece_type, piece_orientation).tolist():
+            cell_x, cell_y = x + offset_x, y + offset_y
+            if not (0 <= cell_x < self.board_size and 0 <= cell_y < self.board_size):
+                return False
+            if self.board_contents[cell_y, cell_x] != 0 or forbidden_cells[cell_y, cell_x]:
+                return False
+
+        return True
+
+    def get_valid_action_ids(self, round_count, player_color, player_pieces):
+        ''' Gathers the same moves as get_all_valid_moves, in the same order, as an int64 array of action ids
+            (placement_id * NUM_CELLS + y * 20 + x) without building any dicts or strings.
+        '''
+        return valid_move_array_to_action_ids(self.get_valid_move_array(round_count, player_color, player_pieces))
 
-        all_valid_moves = {}
-        for piece_type in player_pieces:                # Loop through all pieces the player currently has
-            all_index_orientations = defaultdict(list)  # Valid indexes with their valid orientations dict created for every piece
-            for index in empty_corner_indexes:          # Loop through all indexes where a piece can be placed
-                for orientation in ORIENTATIONS:        # Loop through all possible orientations at an unshifted index
-                    for shifted_id in self.check_orientation_shifts(player_color, piece_type, index, orientation):  # NEW: Loop through all shifted offsets of a particular orientation, if none valid, nothing gets added
-                        all_index_orientations[index].append(orientation + str(shifted_id))                         # NEW: shifted_id is the cell(s) in piece where a shift is possible
-            if len(list(all_index_orientations.keys())) > 0:  # If there are valid indexes for the piece type..
-                all_valid_moves[piece_type] = all_index_orientations
+    def fill_valid_action_mask(self, valid_action_mask, round_count, player_color, player_pieces):
+        ''' Clears valid_action_mask (a boolean array of NUM_ACTIONS + 1) and sets every valid action id,
+            or only PASS_ACTION_ID if the player has no valid move. Returns the valid action ids.
+        '''
+        action_ids = self.get_valid_action_ids(round_count, player_color, player_pieces)
+        fill_action_mask(valid_action_mask, action_ids)
+
+        return action_ids
 
-        return all_valid_moves
+    def get_unique_valid_moves(self, round_count, player_color, player_pieces):
+        ''' Gathers the same moves as get_all_valid_moves, but keeps a single move per distinct placement.
+            Returns a dict keyed by the frozenset of (x, y) cells a placement occupies, with the first
+            (piece_type, index, orientation) of get_all_valid_moves order for those cells as its value.
+        '''
+        return valid_move_array_to_unique_dict(self.get_valid_move_array(round_count, player_color, player_pieces))
 
     def decode_color(self, player_color):
         ''' Converts int representatio of player color to string representation.
@@ -222,3 +607,19 @@ class Board:
                 winner = self.decode_color(player_color)
 
         return winner
+
+
+def warmup():
+    ''' Runs every move generation and placement path once on a scratch board, so the first real call
+        of a fresh process does not pay for loading the cached kernels. Returns the seconds it took.
+    '''
+    start = time.perf_counter()
+    board = Board()
+    board.get_all_valid_moves(0, 1, list(PIECE_TYPES))
+    board.update_board(1, "monomino1", PLAYER_DEFAULT_CORNERS[0], "north0", 0, True)
+    board.get_all_valid_moves(1, 1, list(PIECE_TYPES))
+    board.get_valid_action_ids(1, 1, list(PIECE_TYPES))
+    board.any_valid_move(1, 1, list(PIECE_TYPES))
+    board.rebuild_frontier()
+
+    return time.perf_counter() - start
@@ -7,10 +7,11 @@ Summary:
   manage valid move seeks and piece placement.
 - Methods use Numba with jit decorator that precompiles
   types and makes runtime faster than normal python.
+- Every kernel is compiled with cache=True, so the machine code is written to __pycache__ (or NUMBA_CACHE_DIR)
+  once and later processes load it from disk instead of compiling again at import.
 '''
 from numba import jit
 import numpy as np
-import math
 
 # def dummy_jit(*args, **kwargs):
 #     def dumdum(f):
@@ -20,189 +21,271 @@ import math
 # jit = dummy_jit
 
 
-#### METHODS FOR check_shifted() ####
-@jit("UniTuple(int64, 2)(UniTuple(int64, 2), UniTuple(int64, 2), double)", nopython=True)  # "int(int64, ...)"
-def rotate_by_deg(index, offset_point, angle):
-    ''' Rotates each point on piece around the index by the given angle
-    '''
-    ox, oy = index
-    px, py = offset_point
-
-    new_x = ox + math.cos(angle) * (px - ox) - math.sin(angle) * (py - oy)
-    new_y = oy + math.sin(angle) * (px - ox) + math.cos(angle) * (py - oy)
-
-    return int(round(new_x, 1)), int(round(new_y, 1))
-
-
-@jit("UniTuple(int64, 2)(UniTuple(int64, 2), int64, int64)", nopython=True)
-def flip_piece_x(index, x, y):
-    ''' Takes the difference between index x and point x, then applies reverse
-        difference to the index point. y stays the same
-    '''
-    return index[0] - (index[0] - x) * -1, y
-
-
-@jit("UniTuple(int64, 2)(UniTuple(int64, 2), int64, int64)", nopython=True)
-def flip_piece_y(index, x, y):
-    ''' Takes the difference between index y and point y, then applies reverse
-        difference to the index point. x stays the same
+#### METHODS FOR finding valid placements ####
+@jit("boolean(int64[:, ::1], boolean[:, ::1], int64, int64, int8[:, ::1], int64, int64)", nopython=True, cache=True,
+     inline="always")
+def is_valid_placement(board_contents, forbidden_cells, x, y, placement_offsets, start, stop):
+    ''' Description: Checks that every cell of one placement anchored at x, y is on the board, empty
+                     and not edge-adjacent to the player's color. Every kernel below checks placements with it;
+                     inline="always" inlines it into them at the numba IR level, so sharing it costs no calls.
+        Parameters:
+            board_contents: board_size by board_size numpy matrix representing the current state of the board
+            forbidden_cells: boolean [y][x] matrix of cells edge-adjacent to the player's color
+            x: int x coord of the index
+            y: int y coord of the index
+            placement_offsets: contiguous placement table of already rotated and shifted cell offsets
+            start: first row of the placement in placement_offsets
+            stop: row after the last row of the placement in placement_offsets
+        Returns:
+            bool indicating whether the placement is legal
     '''
-    return x, index[1] + (y - index[1]) * -1
-
-
-@jit("UniTuple(int64, 2)(UniTuple(int64, 2), int64, int64, unicode_type)", nopython=True)
-def rotate_piece(index, x_offset, y_offset, piece_orientation):
-    ''' Description: Orients piece around the index point
+    for offset_id in range(start, stop):
+        new_x = x + placement_offsets[offset_id, 0]
+        new_y = y + placement_offsets[offset_id, 1]
+        if (new_x < 0 or new_x >= board_contents.shape[1] or new_y < 0 or new_y >= board_contents.shape[0]
+                or board_contents[new_y, new_x] != 0 or forbidden_cells[new_y, new_x]):
+            return False
+
+    return True
+
+
+@jit("int64(int64[:, ::1], boolean[:, ::1], int64[:, ::1], int64, int8[:, ::1], int32[:, :, :, ::1], int64[:, ::1])",
+     nopython=True, cache=True)
+def generate_valid_moves(board_contents, forbidden_cells, candidate_indexes, inventory_mask,
+                         placement_offsets, placement_index, valid_moves):
+    ''' Description: Finds every legal placement of a player in one compiled loop over pieces, candidate indexes,
+                     orientations and shift ids, in that order, and writes them into valid_moves.
+                     Stops early once valid_moves is full, so a single row answers whether any move exists.
         Parameters:
-            index: int tuple that specifies the index coordinate on the board (the coord the piece will rotate around)
-            offset: int tuple that specifies the offset from the index coord for the current cell
-            piece_orientation: string specifying what new orientation you want the point at
+            board_contents: board_size by board_size numpy matrix representing the current state of the board
+            forbidden_cells: boolean [y][x] matrix of cells edge-adjacent to the player's color
+            candidate_indexes: (x, y) coords of every index a piece may be anchored at
+            inventory_mask: int with bit piece_id set for every piece the player still has
+            placement_offsets: contiguous placement table of already rotated and shifted cell offsets
+            placement_index: (start, stop) rows into placement_offsets per piece, orientation and shift id
+            valid_moves: (K, 4) output rows of (piece_id, x, y, orientation_id * 8 + shift_id)
         Returns:
-            2 ints x and y that are the new rotated piece coords
+            int number of rows written into valid_moves
     '''
-    piece_orientation = piece_orientation[:-1]  # Takes out last character specifying the shift id (not needed in this method)
-    x_offset += index[0]  # calculates the actual x coord on board
-    y_offset += index[1]  # calculates the actual y coord on board
-
-    if piece_orientation == "north":
-        return rotate_by_deg(index, (x_offset, y_offset), math.radians(270))
-    elif piece_orientation == "northwest":
-        new_x, new_y = rotate_by_deg(index, (x_offset, y_offset), math.radians(270))
-        return flip_piece_x(index, new_x, new_y)
-    elif piece_orientation == "south":
-        return rotate_by_deg(index, (x_offset, y_offset), math.radians(90))
-    elif piece_orientation == "southeast":
-        new_x, new_y = rotate_by_deg(index, (x_offset, y_offset), math.radians(90))
-        return flip_piece_x(index, new_x, new_y)
-    elif piece_orientation == "west":
-        return rotate_by_deg(index, (x_offset, y_offset), math.radians(180))
-    elif piece_orientation == "southwest":
-        new_x, new_y = rotate_by_deg(index, (x_offset, y_offset), math.radians(180))
-        return flip_piece_y(index, new_x, new_y)
-    elif piece_orientation == "northeast":
-        new_x, new_y = rotate_by_deg(index, (x_offset, y_offset), math.radians(0))
-        return flip_piece_y(index, new_x, new_y)
-    else:  # Default orientation (East)
-        return rotate_by_deg(index, (x_offset, y_offset), math.radians(0))
-
-
-@jit("boolean(int64[:, ::1], int64, int64, int64)", nopython=True)
-def is_valid_adjacents(board_contents, y, x, player_color):
-    ''' Description: Invalid coord if left, right, bottom, or top cell is the same color as the current player.
+    num_moves = 0
+    for piece_id in range(placement_index.shape[0]):
+        if not (inventory_mask >> piece_id) & 1:
+            continue
+        for candidate_id in range(candidate_indexes.shape[0]):
+            x = candidate_indexes[candidate_id, 0]
+            y = candidate_indexes[candidate_id, 1]
+            for orientation_id in range(placement_index.shape[1]):
+                for shifted_id in range(placement_index.shape[2]):
+                    start = placement_index[piece_id, orientation_id, shifted_id, 0]
+                    stop = placement_index[piece_id, orientation_id, shifted_id, 1]
+                    if start == stop:  # Piece has fewer cells than the max shift id
+                        break
+                    if is_valid_placement(board_contents, forbidden_cells, x, y, placement_offsets, start, stop):
+                        valid_moves[num_moves, 0] = piece_id
+                        valid_moves[num_moves, 1] = x
+                        valid_moves[num_moves, 2] = y
+                        valid_moves[num_moves, 3] = orientation_id * 8 + shifted_id
+                        num_moves += 1
+                        if num_moves == valid_moves.shape[0]:
+                            return num_moves
+
+    return num_moves
+
+
+@jit("UniTuple(int64, 3)(int64, int64, int64, int64[:, ::1])", nopython=True, cache=True, inline="always")
+def decode_candidate(candidate, num_indexes, inventory_mask, piece_ranges):
+    ''' Description: Finds the piece, index and placement id a scan_placements candidate number stands for.
         Parameters:
-            board_contents: 20 by 20 numpy matrix representing the current state of the board
-            x: int x coord of the cell
-            y: int y coord of the cell
-            player_color: int representing current player color
+            candidate: int candidate number
+            num_indexes: int number of candidate indexes
+            inventory_mask: int with bit piece_id set for every piece the player still has
+            piece_ranges: (first, last + 1) placement ids of every piece id
         Returns:
-            bool indicating whether the cell is a valid adjacent 
+            (piece_id, candidate_id, placement_id), piece_id is past the last piece for numbers past the last candidate
     '''
-    valid_adjacent = True
-
-    # Excludes top board edge from top cell check
-    if y != 0:
-        if board_contents[y - 1][x] == player_color:
-            valid_adjacent = False
-    # Excludes left board edge from left cell check
-    if x != 0:
-        if board_contents[y][x - 1] == player_color:
-            valid_adjacent = False
-    # Excludes bottom board edge from bottom cell check
-    if y != 19:
-        if board_contents[y + 1][x] == player_color:
-            valid_adjacent = False
-    # Excludes right board edge from right cell check
-    if x != 19:
-        if board_contents[y][x + 1] == player_color:
-            valid_adjacent = False
-
-    return valid_adjacent
-
-
-@jit("boolean(int64[:, ::1], int64, int64, int64)", nopython=True)
-def is_valid_cell(board_contents, x, y, player_color):
-    ''' Description: If the cell x, y is empty, has no adjacent cells that are the same color,
-                     and is not out of bounds of the 20x20 board, then the cell is valid 
-                     to put a part of a piece on it.
+    for piece_id in range(piece_ranges.shape[0]):
+        if not (inventory_mask >> piece_id) & 1:
+            continue
+        num_piece_placements = piece_ranges[piece_id, 1] - piece_ranges[piece_id, 0]
+        num_piece_candidates = num_indexes * num_piece_placements
+        if candidate < num_piece_candidates:
+            return piece_id, candidate // num_piece_placements, piece_ranges[piece_id, 0] + candidate % num_piece_placements
+        candidate -= num_piece_candidates
+
+    return piece_ranges.shape[0], 0, 0
+
+
+@jit("UniTuple(int64, 2)(int64[:, ::1], boolean[:, ::1], int64[:, ::1], int64, int64[:, ::1], int64[::1], float64[::1], "
+     "int64, int8[:, ::1], int32[:, ::1], int64[:, ::1])", nopython=True, cache=True)
+def scan_placements(board_contents, forbidden_cells, candidate_indexes, inventory_mask, piece_ranges, order, random_draws,
+                    position, placement_offsets, placement_bounds, valid_placements):
+    ''' Description: Walks the candidate placements of a player from position on and copies the legal ones into
+                     valid_placements, stopping as soon as it is full. Candidates are numbered by piece, then
+                     candidate index, then placement id of the piece, which is the get_all_valid_moves order.
+                     With a non-empty order array the walk is a lazy Fisher-Yates shuffle of those numbers instead,
+                     drawing one of random_draws per candidate, so callers can stream legal moves in chunks in a
+                     uniformly random order and stop once they have what they need.
         Parameters:
-            board_contents: 20 by 20 numpy matrix representing the current state of the board
-            x: int x coord of the cell
-            y: int y coord of the cell
-            player_color: int representing current player color
+            board_contents: board_size by board_size numpy matrix representing the current state of the board
+            forbidden_cells: boolean [y][x] matrix of cells edge-adjacent to the player's color
+            candidate_indexes: (x, y) coords of every index a piece may be anchored at
+            inventory_mask: int with bit piece_id set for every piece the player still has
+            piece_ranges: (first, last + 1) placement ids of every piece id
+            order: empty for the fixed order, otherwise every candidate number, shuffled in place across calls
+            random_draws: uniform [0, 1) floats used by the shuffle, it stops early once they run out
+            position: number of candidates already walked by earlier calls
+            placement_offsets: contiguous placement table of already rotated and shifted cell offsets
+            placement_bounds: (start, stop) rows into placement_offsets of every placement id
+            valid_placements: output (placement_id, x, y) rows
         Returns:
-            bool indicating whether the cell is a valid cell
+            (number of rows written, position to continue from)
     '''
-    # Out of bounds check
-    if x < 0 or x >= 20 or y < 0 or y >= 20:
-        return False
-    # Checks if cell is empty and a valid adjacent
-    if (board_contents[y][x] == 0 and is_valid_adjacents(board_contents, y, x, player_color)):
-        return True
-    else:
-        return False
-
-
-@jit("int64[:](int64[:, ::1], int64, UniTuple(int64, 2), unicode_type, int64[:, :, ::1])", nopython=True)
-def check_shifted(board_contents, player_color, index, orientation, shifted_offsets):
-    ''' Description: Shifts entire piece N times were N is how many cells the piece takes up. 
-                     All shifted offsets are checked for the current orientation to see whether
-                     the shifted set of offsets is a valid move. 
+    num_indexes = candidate_indexes.shape[0]
+    num_candidates = 0
+    for piece_id in range(piece_ranges.shape[0]):
+        if (inventory_mask >> piece_id) & 1:
+            num_candidates += num_indexes * (piece_ranges[piece_id, 1] - piece_ranges[piece_id, 0])
+
+    shuffled = order.shape[0] > 0
+    num_valid = 0
+    draw_id = 0
+    piece_id, candidate_id, placement_id = decode_candidate(position, num_indexes, inventory_mask, piece_ranges)
+    while position < num_candidates and num_valid < valid_placements.shape[0]:
+        if shuffled:
+            if draw_id == random_draws.shape[0]:
+                break
+            swap_position = position + int(random_draws[draw_id] * (num_candidates - position))
+            draw_id += 1
+            candidate = order[swap_position]
+            order[swap_position] = order[position]
+            order[position] = candidate
+            piece_id, candidate_id, placement_id = decode_candidate(candidate, num_indexes, inventory_mask, piece_ranges)
+        position += 1
+
+        x = candidate_indexes[candidate_id, 0]
+        y = candidate_indexes[candidate_id, 1]
+        if is_valid_placement(board_contents, forbidden_cells, x, y, placement_offsets,
+                              placement_bounds[placement_id, 0], placement_bounds[placement_id, 1]):
+            valid_placements[num_valid, 0] = placement_id
+            valid_placements[num_valid, 1] = x
+            valid_placements[num_valid, 2] = y
+            num_valid += 1
+
+        if not shuffled:  # Step to the next candidate number without decoding it again
+            placement_id += 1
+            if placement_id == piece_ranges[piece_id, 1]:
+                candidate_id += 1
+                if candidate_id == num_indexes:
+                    candidate_id = 0
+                    piece_id += 1
+                    while piece_id < piece_ranges.shape[0] and not (inventory_mask >> piece_id) & 1:
+                        piece_id += 1
+                    if piece_id == piece_ranges.shape[0]:
+                        break
+                placement_id = piece_ranges[piece_id, 0]
+
+    return num_valid, position
+
+
+@jit("int64[::1](int64[:, ::1], boolean[:, ::1], int64[:, ::1], int64[::1], int64[::1], int32[::1], "
+     "int8[:, ::1], int32[:, ::1], float64[::1])", nopython=True, cache=True)
+def sample_placement(board_contents, forbidden_cells, candidate_indexes, piece_ids, anchor_starts, anchor_placement_ids,
+                     placement_offsets, placement_bounds, random_draws):
+    ''' Description: Rejection sampling of one legal placement. Every (index, placement) pair of the player's
+                     pieces that stays on the board is drawn with the same probability, and the first legal one
+                     is returned, which makes it uniform over the legal placements. The anchor tables are built
+                     for the full 20 by 20 board, so on smaller boards draws that leave the board are rejected too.
         Parameters:
-            board_contents: 20 by 20 numpy matrix representing the current state of the board
-            played_color: int representing current player color
-            index: int tuple that specifies the index coordinate on the board (the coord the piece will rotate around)
-            orientation: string specifying which orientation is being checked
-            shifted_offsets: list of a list of tuples where each element in the main list represents a different set of coords
-                             for a shifted piece.
+            board_contents: board_size by board_size numpy matrix representing the current state of the board
+            forbidden_cells: boolean [y][x] matrix of cells edge-adjacent to the player's color
+            candidate_indexes: (x, y) coords of every index a piece may be anchored at
+            piece_ids: ids of the pieces the player still has
+            anchor_starts: start of the placement ids of every (cell, piece id) row, row = cell * pieces + piece id
+            anchor_placement_ids: placement ids that stay on the board, grouped by anchor_starts rows
+            placement_offsets: contiguous placement table of already rotated and shifted cell offsets
+            placement_bounds: (start, stop) rows into placement_offsets of every placement id
+            random_draws: uniform [0, 1) floats, one per attempt
         Returns:
-            Returns the list of ints representing the shifted offsets ids where the piece can be
-            placed at that set of shifted offsets
+            (placement_id, x, y) of the sampled placement, or -1s if every attempt was rejected
     '''
-    shifted_ids = np.zeros(shifted_offsets.shape[0], np.int64)
-    num_items = 0
-    for shifted_id in range(shifted_offsets.shape[0]):  # Shift piece N times where N is the number of cells in the piece
-        valid_placement = True
-        for offset_id in range(shifted_offsets.shape[1]):
-            offset = shifted_offsets[shifted_id, offset_id, :]
-            if offset[0] == 0 and offset[1] == 0:  # No need to rotate coord since its the index and there is no offset
-                if not is_valid_cell(board_contents, index[0], index[1], player_color):
-                    valid_placement = False
+    num_piece_types = (anchor_starts.shape[0] - 1) // 400  # Anchor rows cover every cell of the 20 by 20 grid
+    num_pieces = piece_ids.shape[0]
+    num_rows = candidate_indexes.shape[0] * num_pieces
+    row_ends = np.empty(num_rows, np.int64)
+    num_pairs = 0
+    for candidate_id in range(candidate_indexes.shape[0]):
+        cell = candidate_indexes[candidate_id, 1] * 20 + candidate_indexes[candidate_id, 0]
+        for piece_num in range(num_pieces):
+            row = cell * num_piece_types + piece_ids[piece_num]
+            num_pairs += anchor_starts[row + 1] - anchor_starts[row]
+            row_ends[candidate_id * num_pieces + piece_num] = num_pairs
+
+    sampled_placement = np.full(3, -1, np.int64)
+    if num_pairs == 0:
+        return sampled_placement
+
+    for draw_id in range(random_draws.shape[0]):
+        pair = int(random_draws[draw_id] * num_pairs)
+        low = 0
+        high = num_rows - 1
+        while low < high:  # First (index, piece) row whose end is past the pair
+            middle = (low + high) // 2
+            if row_ends[middle] > pair:
+                high = middle
             else:
-                new_piece = rotate_piece(index, offset[0], offset[1], orientation)
-                new_x = new_piece[0]
-                new_y = new_piece[1]
-                if not is_valid_cell(board_contents, new_x, new_y, player_color):
-                    valid_placement = False
-        if valid_placement:
-            shifted_ids[num_items] = shifted_id
-            num_items += 1
-
-    return shifted_ids[:num_items]
-
-
-#### METHODS FOR get_all_shifted_offsets() ####
-@jit("int64[:, ::1](int64[:, ::1], unicode_type)", nopython=True)
-def rotate_default_piece(offsets, orientation):
-    ''' Description: Rotates the initial default piece orientation for shifting.
+                low = middle + 1
+        candidate_id = low // num_pieces
+        x = candidate_indexes[candidate_id, 0]
+        y = candidate_indexes[candidate_id, 1]
+        row = (y * 20 + x) * num_piece_types + piece_ids[low % num_pieces]
+        placement_id = anchor_placement_ids[anchor_starts[row + 1] - (row_ends[low] - pair)]
+
+        if is_valid_placement(board_contents, forbidden_cells, x, y, placement_offsets,
+                              placement_bounds[placement_id, 0], placement_bounds[placement_id, 1]):
+            sampled_placement[0] = placement_id
+            sampled_placement[1] = x
+            sampled_placement[2] = y
+            return sampled_placement
+
+    return sampled_placement
+
+
+#### METHODS FOR update_board() ####
+@jit("void(int64[:, ::1], boolean[:, :, ::1], boolean[:, :, ::1], int64, int64[:, ::1])", nopython=True, cache=True)
+def update_frontier(board_contents, corner_cells, forbidden_cells, player_color, placed_cells):
+    ''' Description: Updates the tracked corner and forbidden cells around a piece that was just placed.
+                     Only the placed cells and their neighbours are touched.
         Parameters:
-            offsets: numpy array of tuples indicated all corresponding offsets to a specific piece type
-            orientation: string indicating the orientation to rotate the offset pieces
+            board_contents: board_size by board_size numpy matrix that already contains the placed piece
+            corner_cells: boolean [color][y][x] matrix of empty cells each color may anchor a piece at
+            forbidden_cells: boolean [color][y][x] matrix of cells edge-adjacent to each color
+            player_color: int representing the color of the placed piece
+            placed_cells: (x, y) coords of every cell of the placed piece
         Returns:
-            numpy list of all offsets for given orientation
+            Nothing, corner_cells and forbidden_cells are updated in place
     '''
-    orientation_offsets_to_shift = np.zeros((len(offsets), 2), np.int64)
-
-    for index in range(len(offsets)):
-        if offsets[index][0] == 0 and offsets[index][1] == 0:
-            orientation_offsets_to_shift[index, :] = (0, 0)
-        else:
-            new_coord = rotate_piece((0, 0), offsets[index][0], offsets[index][1], orientation + "!")  # adding dummy character to end since rotate ignores last character of orientation
-            orientation_offsets_to_shift[index, :] = (new_coord[0], new_coord[1])
-
-    return orientation_offsets_to_shift
-
-
-@jit("int64[:, ::1](int64[:, ::1], int64)", nopython=True)
+    # Occupied cells can not be anything's corner and cells touching the new piece's sides can not be its corners
+    for cell_id in range(placed_cells.shape[0]):
+        x = placed_cells[cell_id, 0]
+        y = placed_cells[cell_id, 1]
+        corner_cells[:, y, x] = False
+        for adjacent_x, adjacent_y in ((x, y - 1), (x - 1, y), (x, y + 1), (x + 1, y)):
+            if 0 <= adjacent_x < board_contents.shape[1] and 0 <= adjacent_y < board_contents.shape[0]:
+                forbidden_cells[player_color, adjacent_y, adjacent_x] = True
+                corner_cells[player_color, adjacent_y, adjacent_x] = False
+
+    # Empty diagonal cells that do not touch the player's sides become new corners
+    for cell_id in range(placed_cells.shape[0]):
+        x = placed_cells[cell_id, 0]
+        y = placed_cells[cell_id, 1]
+        for corner_x, corner_y in ((x + 1, y - 1), (x - 1, y - 1), (x + 1, y + 1), (x - 1, y + 1)):
+            if 0 <= corner_x < board_contents.shape[1] and 0 <= corner_y < board_contents.shape[0]:
+                if board_contents[corner_y, corner_x] == 0 and not forbidden_cells[player_color, corner_y, corner_x]:
+                    corner_cells[player_color, corner_y, corner_x] = True
+
+
+#### METHODS FOR building the placement table ####
+@jit("int64[:, ::1](int64[:, ::1], int64)", nopython=True, cache=True)
 def shift_offsets(offsets, offset_id):
     ''' Description: Shifts the offsets so that the offset that corresponds to the offset_id is the new index
         Parameters:
@@ -223,24 +306,3 @@ def shift_offsets(offsets, offset_id):
         shifted_offsets[index, :] = (offsets[index][0] - new_origin_y_diff, offsets[index][1] - new_origin_x_diff)
 
     return shifted_offsets
-
-
-@jit("int64[:, :, ::1](int64[:, ::1], unicode_type)", nopython=True)
-def get_all_shifted_offsets(offsets, orientation):
-    ''' Description: Compiles a list of all shifted offsets for a piece at a specific orientation.
-                     Returns a numpy array, which is a list of a list of tuples which each contain 
-                     a shifted offset. 
-        Parameters:  
-            offsets: numpy array of tuples containing the coords of offsets needing do be shifted
-            orientation: string specifying the orientation that the shifts should take place
-        Returns:
-            list of all shifted orientations a piece can make at a given orientation
-
-    '''
-    orientation_offsets_to_shift = rotate_default_piece(offsets, orientation)
-    shifted_offsets = np.zeros((len(offsets), len(orientation_offsets_to_shift), 2), np.int64)
-
-    for offset_id in range(len(orientation_offsets_to_shift)):
-        shifted_offsets[offset_id] = shift_offsets(orientation_offsets_to_shift, offset_id)
-
-    return shifted_offsets
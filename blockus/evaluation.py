@@ -0,0 +1,275 @@
+'''
+Summary:
+Heuristic board evaluation and the greedy and beam search baseline agents built on it.
+Features are computed for every color at once with whole-board array ops, and for all candidate moves of a
+position in one batch, so scoring a move takes microseconds and needs no apply/undo:
+- remaining_value: total GAME_PIECE_VALUES of the pieces a color has left (lower is better)
+- corners: empty cells diagonal to a color's pieces where it may anchor its next piece
+- blocked_corners: cells diagonal to an opponent's pieces (and not beside them) that the color has covered
+- territory: empty cells the color could still reach within TERRITORY_RADIUS steps of its corners
+Beam search replays its plans on one SearchState with apply/undo instead of copying boards.
+'''
+
+from typing import List, Tuple, Union
+
+import numpy as np
+from blockus.ai import GAME_PIECE_VALUES
+from blockus.board import (PIECE_NAMES, PASS_ACTION_ID, unique_valid_move_array, valid_move_array_to_action_ids,
+                           valid_move_array_to_cells)
+from blockus.game_state import GameState, SearchState, action_id_to_action, action_id_to_string
+
+FEATURE_NAMES = ["remaining_value", "corners", "blocked_corners", "territory"]
+DEFAULT_WEIGHTS = np.array([-1.0, 1.0, 1.0, 0.1])
+TERRITORY_RADIUS = 4
+
+PIECE_VALUES = np.array([GAME_PIECE_VALUES[piece_type] for piece_type in PIECE_NAMES], dtype=np.int64)
+
+
+def _side_cells(cells: np.ndarray) -> np.ndarray:
+    """Cells sharing a side with any of cells, for boolean arrays (..., 20, 20)."""
+    padded = np.pad(cells, [(0, 0)] * (cells.ndim - 2) + [(1, 1), (1, 1)])  # Padding keeps the edges of the board
+    return padded[..., :-2, 1:-1] | padded[..., 2:, 1:-1] | padded[..., 1:-1, :-2] | padded[..., 1:-1, 2:]
+
+
+def _diagonal_cells(cells: np.ndarray) -> np.ndarray:
+    """Cells sharing a corner with any of cells, for boolean arrays (..., 20, 20)."""
+    padded = np.pad(cells, [(0, 0)] * (cells.ndim - 2) + [(1, 1), (1, 1)])
+    return padded[..., :-2, :-2] | padded[..., :-2, 2:] | padded[..., 2:, :-2] | padded[..., 2:, 2:]
+
+
+def board_features(board_contents: np.ndarray, remaining_values: np.ndarray) -> np.ndarray:
+    """Compute the features of every color for one board or a batch of boards.
+
+    Parameters
+    ----------
+    board_contents : np.ndarray
+        Board cells of shape (S, S) or (N, S, S), holding 0 for empty cells and colors 1 to P.
+    remaining_values : np.ndarray
+        Value of the pieces every color has left, of shape (P,) or (N, P) for P players.
+
+    Returns
+    -------
+    features : np.ndarray
+        float64 array of shape (P, len(FEATURE_NAMES)) or (N, P, len(FEATURE_NAMES)), ordered like FEATURE_NAMES.
+    """
+    colors = np.arange(1, remaining_values.shape[-1] + 1)
+    own_cells = board_contents[..., None, :, :] == colors[:, None, None]  # (..., P, S, S)
+    empty_cells = board_contents[..., None, :, :] == 0
+    side_cells = _side_cells(own_cells)
+    anchor_cells = _diagonal_cells(own_cells) & ~side_cells
+    corner_cells = anchor_cells & empty_cells
+
+    # Own cells of each color (axis -4) that cover an anchor cell of each other color (axis -3)
+    covered_anchors = np.count_nonzero(own_cells[..., :, None, :, :] & anchor_cells[..., None, :, :, :], axis=(-2, -1))
+    blocked_corners = covered_anchors.sum(axis=-1) - np.diagonal(covered_anchors, axis1=-2, axis2=-1)
+
+    reachable_cells = empty_cells & ~side_cells
+    territory = corner_cells
+    for _ in range(TERRITORY_RADIUS - 1):
+        territory = territory | (_side_cells(territory) & reachable_cells)
+
+    return np.stack((remaining_values, np.count_nonzero(corner_cells, axis=(-2, -1)), blocked_corners,
+                     np.count_nonzero(territory, axis=(-2, -1))), axis=-1).astype(np.float64)
+
+
+def remaining_piece_values(players) -> np.ndarray:
+    """Value of the pieces every player has left, as an int64 array with one entry per player."""
+    return np.array([sum(GAME_PIECE_VALUES[piece_type] for piece_type in p.current_pieces) for p in players],
+                    dtype=np.int64)
+
+
+def evaluate_board(board, players, weights: np.ndarray = DEFAULT_WEIGHTS) -> np.ndarray:
+    """Heuristic value of a board for every player, the weighted sum of its features.
+
+    Parameters
+    ----------
+    board : Board
+        The board to evaluate.
+    players : List[AI]
+        All players of the game.
+    weights : np.ndarray (optional)
+        One weight per feature in FEATURE_NAMES.
+
+    Returns
+    -------
+    values : np.ndarray
+        float64 array with the value of every player.
+    """
+    return board_features(board.board_contents, remaining_piece_values(players)) @ weights
+
+
+def relative_values(values: np.ndarray, player: int) -> np.ndarray:
+    """Value of player minus the best value of its opponents, for values of shape (..., players)."""
+    opponent_values = np.delete(values, player, axis=-1)
+    return values[..., player] - opponent_values.max(axis=-1)
+
+
+def evaluate_moves(board, players, player: int, valid_moves: np.ndarray,
+                   weights: np.ndarray = DEFAULT_WEIGHTS) -> np.ndarray:
+    """Heuristic values of the boards reached by each valid move of player, for every player.
+    The boards are built and scored as one batch.
+
+    Parameters
+    ----------
+    board : Board
+        The current board.
+    players : List[AI]
+        All players of the game.
+    player : int
+        The player making the moves.
+    valid_moves : np.ndarray
+        Rows of Board.get_valid_move_array for player.
+    weights : np.ndarray (optional)
+        One weight per feature in FEATURE_NAMES.
+
+    Returns
+    -------
+    values : np.ndarray
+        float64 array of shape (len(valid_moves), len(players)).
+    """
+    cells = valid_move_array_to_cells(valid_moves)
+    next_contents = np.repeat(board.board_contents[None], len(valid_moves), axis=0)
+    next_contents[np.arange(len(valid_moves))[:, None], cells[..., 1], cells[..., 0]] = player + 1
+
+    next_remaining_values = np.repeat(remaining_piece_values(players)[None], len(valid_moves), axis=0)
+    next_remaining_values[:, player] -= PIECE_VALUES[valid_moves[:, 0]]
+
+    return board_features(next_contents, next_remaining_values) @ weights
+
+
+class GreedyAgent:
+    r"""
+    Plays the move whose resulting board has the best heuristic value relative to the best opponent.
+
+    Parameters
+    ----------
+    weights : np.ndarray (optional)
+        One weight per feature in FEATURE_NAMES.
+    seed : int (optional)
+        Seed of the random number generator that breaks ties.
+    """
+
+    def __init__(self, weights: np.ndarray = DEFAULT_WEIGHTS, seed: Union[int, None] = None):
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.rng = np.random.default_rng(seed)
+
+    def select_move(self, board, round_count: int, players, player: int,
+                    rng: Union[np.random.Generator, None] = None) -> Union[Tuple[str, Tuple[int, int], str], None]:
+        """Choose the move of player on a board.
+
+        Parameters
+        ----------
+        board : Board
+            The current board.
+        round_count : int
+            The current round.
+        players : List[AI]
+            All players of the game.
+        player : int
+            The player to move.
+        rng : np.random.Generator (optional)
+            Random number generator that breaks ties, the agent's own if not given.
+
+        Returns
+        -------
+        move : Union[Tuple[str, Tuple[int, int], str], None]
+            piece_type, index and orientation of the move, or None if player has to pass.
+        """
+        return action_id_to_action(self._select_action_id(board, round_count, players, player, rng))
+
+    def select_action(self, state: object, player: int, rng: Union[np.random.Generator, None] = None,
+                      as_action_id: bool = False) -> Union[str, int]:
+        """Choose the action of player in a BlockusEnv state, as an action string or action id."""
+        board, round_count, players = state
+        action_id = self._select_action_id(board, round_count, players, player, rng)
+        return action_id if as_action_id else action_id_to_string(action_id)
+
+    def _select_action_id(self, board, round_count, players, player, rng) -> int:
+        valid_moves = board.get_valid_move_array(round_count, player + 1, players[player].current_pieces)
+        if len(valid_moves) == 0:
+            return PASS_ACTION_ID
+
+        valid_moves = unique_valid_move_array(valid_moves)
+        scores = relative_values(evaluate_moves(board, players, player, valid_moves, self.weights), player)
+        best_rows = np.flatnonzero(scores == scores.max())
+        best_row = best_rows[(self.rng if rng is None else rng).integers(len(best_rows))]
+
+        return int(valid_move_array_to_action_ids(valid_moves[best_row:best_row + 1])[0])
+
+
+class BeamSearchAgent(GreedyAgent):
+    r"""
+    Searches sequences of the player's own next moves, keeping the beam_width best boards after every move.
+    Opponents are assumed to pass while the player plans, which keeps the search cheap.
+
+    Parameters
+    ----------
+    beam_width : int (optional)
+        Number of boards kept after every move.
+    depth : int (optional)
+        Number of own moves searched.
+    weights : np.ndarray (optional)
+        One weight per feature in FEATURE_NAMES.
+    seed : int (optional)
+        Seed of the random number generator that breaks ties.
+    """
+
+    def __init__(self, beam_width: int = 4, depth: int = 2, weights: np.ndarray = DEFAULT_WEIGHTS,
+                 seed: Union[int, None] = None):
+        super().__init__(weights, seed)
+        self.beam_width = beam_width
+        self.depth = depth
+
+    def _select_action_id(self, board, round_count, players, player, rng) -> int:
+        rng = self.rng if rng is None else rng
+        search_state = SearchState(GameState(board, round_count, players), player)
+        # Beam entries: (score, own action ids planned so far)
+        beam = [(0.0, [])]
+
+        for move_num in range(self.depth):
+            candidates = []
+            for beam_num, (score, plan) in enumerate(beam):
+                self._apply_plan(search_state, plan)
+                pieces = search_state.players[player].current_pieces
+                valid_moves = search_state.board.get_valid_move_array(search_state.round_count, player + 1, pieces)
+                if len(valid_moves) == 0:
+                    if move_num > 0:
+                        candidates.append((score, rng.random(), beam_num, None))  # The plan ends here
+                else:
+                    valid_moves = unique_valid_move_array(valid_moves)
+                    scores = relative_values(evaluate_moves(search_state.board, search_state.players, player, valid_moves,
+                                                            self.weights), player)
+                    best_rows = np.argsort(-scores, kind="stable")[:self.beam_width]
+                    candidates.extend((scores[row], rng.random(), beam_num, valid_moves[row])
+                                      for row in best_rows.tolist())
+
+                while search_state.depth > 0:
+                    search_state.undo()
+
+            if not candidates:
+                break
+
+            candidates.sort(key=lambda candidate: candidate[:2], reverse=True)
+            beam = [(score, beam[beam_num][1] if valid_move is None else
+                     beam[beam_num][1] + [int(valid_move_array_to_action_ids(valid_move[np.newaxis])[0])])
+                    for score, _, beam_num, valid_move in candidates[:self.beam_width]]
+
+        return beam[0][1][0] if beam[0][1] else PASS_ACTION_ID
+
+    @staticmethod
+    def _apply_plan(search_state: SearchState, plan: List[int]):
+        """Apply the planned own actions to search_state, with every opponent passing in between."""
+        for action_id in plan:
+            search_state.apply(action_id)
+            for _ in range(len(search_state.players) - 1):
+                search_state.apply(PASS_ACTION_ID)
+
+
+# key: agent name that can be passed to make_agent
+# val: agent class implementing it
+BASELINE_AGENTS = {"greedy": GreedyAgent, "beam": BeamSearchAgent}
+
+
+def make_agent(name: str, **kwargs) -> GreedyAgent:
+    """Create a baseline agent by its name in BASELINE_AGENTS."""
+    return BASELINE_AGENTS[name](**kwargs)
@@ -0,0 +1,502 @@
+'''
+Summary:
+Game state and action types shared by the environment and by search agents.
+- Actions are either strings ("piece_type;(x, y);orientation") or ints from a fixed global action space,
+  action_id = placement_id * NUM_CELLS + y * 20 + x, with PASS_ACTION_ID as the no-op.
+- GameState is the immutable (board, round_count, players) tuple that BlockusEnv passes around.
+  States share every player object that did not change between steps.
+- SearchState places and takes back pieces in place with apply/undo, so tree searches can walk
+  many nodes without copying the game for each one.
+'''
+
+from collections import namedtuple
+from typing import Tuple, Union
+
+import numpy as np
+from blockus.board import (Board, PIECE_IDS, PIECE_NAMES, ORIENTATION_IDS, ORIENTATION_MATRICES, NUM_CELLS, PASS_ACTION_ID, PLACEMENT_IDS,
+                           PLACEMENT_PIECES, PLACEMENT_ORIENTATIONS, PLACEMENT_SHIFTS, PLACEMENT_ORIENTATION_NAMES,
+                           BOARD_SIZE, BOARD_TO_PLAYER_OBSERVATION_ROTATION_MATRICES, ZOBRIST_PLAYER_TO_MOVE_KEYS,
+                           perspective_quarter_turns, unique_valid_move_array, valid_move_array_to_action_ids)
+
+
+def action_to_string(piece_type: str, index: Tuple[int, int], orientation: str) -> str:
+    """Convert a piece_type, index, and orientation into a formatted action string.
+
+    Parameters
+    ----------
+    piece_type : str
+        The type of blockus piece to be placed in the action.
+    index : Tuple[int, int]
+        The location where the piece will be placed in the action.
+    orientation : str
+        The orientation in which the piece will be placed in the action.
+
+    Returns
+    -------
+    action_string : str
+
+    See Also
+    --------
+    blockus.blockus_env.BlockusEnv.all_piece_types
+        Get list of all possible piece types
+    blockus.blockus_env.BlockusEnv.all_orientations
+         Get list of all possible orientations
+    blockus.blockus_env.BlockusEnv.is_valid_action
+        Check if action string is valid
+    """
+    return "{};{};{}".format(piece_type, index, orientation)
+
+
+def string_to_action(action_str: str) -> Union[Tuple[str, Tuple[int, int], str], None]:
+    """Convert a formatted action string into piece_type, index, and orientation.
+
+    Parameters
+    ----------
+    action_str : str
+        The action in string format
+
+    Returns
+    -------
+    piece_type : str
+        The type of blockus piece to be placed in the action.
+    index : Tuple[int, int]
+        The location where the piece will be placed in the action.
+    orientation : str
+        The orientation in which the piece will be placed in the action.
+    """
+
+    if action_str == '':
+        return None
+
+    piece_type, index, orientation = action_str.split(";")
+    index = tuple(map(int, index.replace('(', '').replace(')', '').split(',')))
+    return piece_type, index, orientation
+
+
+def encode_action_ids(piece_ids: np.ndarray, xs: np.ndarray, ys: np.ndarray,
+                      orientation_ids: np.ndarray, shift_ids: np.ndarray) -> np.ndarray:
+    """Convert arrays of piece ids, index coords, orientation ids and shift ids into action ids in one vectorized call.
+
+    Parameters
+    ----------
+    piece_ids : np.ndarray
+        Positions of the pieces in PIECE_TYPES.
+    xs : np.ndarray
+        x coords of the indexes.
+    ys : np.ndarray
+        y coords of the indexes.
+    orientation_ids : np.ndarray
+        Positions of the orientations in ORIENTATIONS.
+    shift_ids : np.ndarray
+        Shift ids of the placements.
+
+    Returns
+    -------
+    action_ids : np.ndarray
+    """
+    return PLACEMENT_IDS[piece_ids, orientation_ids, shift_ids] * NUM_CELLS + np.asarray(ys) * 20 + xs
+
+
+def decode_action_ids(action_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Convert an array of action ids into piece ids, index coords, orientation ids and shift ids in one vectorized call.
+
+    Parameters
+    ----------
+    action_ids : np.ndarray
+        Action ids, not including PASS_ACTION_ID.
+
+    Returns
+    -------
+    piece_ids : np.ndarray
+    xs : np.ndarray
+    ys : np.ndarray
+    orientation_ids : np.ndarray
+    shift_ids : np.ndarray
+    """
+    placement_ids, cells = np.divmod(action_ids, NUM_CELLS)
+    ys, xs = np.divmod(cells, 20)
+    return PLACEMENT_PIECES[placement_ids], xs, ys, PLACEMENT_ORIENTATIONS[placement_ids], PLACEMENT_SHIFTS[placement_ids]
+
+
+def orientation_permutation(matrix: np.ndarray) -> np.ndarray:
+    """Map every orientation id to the orientation id a piece ends up in when the board is transformed by matrix.
+
+    Parameters
+    ----------
+    matrix : np.ndarray
+        2 by 2 integer rotation or reflection matrix acting on (x, y) coords.
+
+    Returns
+    -------
+    orientation_ids : np.ndarray
+        int64 array of len(ORIENTATIONS), the orientation whose ORIENTATION_MATRICES entry is matrix @ the old one.
+    """
+    transformed_matrices = np.asarray(matrix) @ ORIENTATION_MATRICES  # (orientations, 2, 2)
+    matches = (transformed_matrices[:, np.newaxis] == ORIENTATION_MATRICES[np.newaxis]).all(axis=(2, 3))
+    return matches.argmax(axis=1)
+
+
+def transform_action_ids(action_ids: np.ndarray, matrix: np.ndarray, board_size: int = BOARD_SIZE) -> np.ndarray:
+    """Map action ids to the action ids that cover the transformed cells after rotating or reflecting the board.
+    The index is moved around the board center and the orientation follows matrix, with the same shift id,
+    since shifts are linear in the rotated piece offsets.
+
+    Parameters
+    ----------
+    action_ids : np.ndarray
+        Action ids, PASS_ACTION_ID stays PASS_ACTION_ID.
+    matrix : np.ndarray
+        2 by 2 integer rotation or reflection matrix acting on (x, y) coords around the board center.
+    board_size : int (optional)
+        Side length of the board. Action ids whose index is off a smaller board can never be valid and stay as they are.
+
+    Returns
+    -------
+    transformed_action_ids : np.ndarray
+    """
+    matrix = np.asarray(matrix, dtype=np.int64)
+    action_ids = np.asarray(action_ids, dtype=np.int64)
+    is_pass = action_ids == PASS_ACTION_ID
+    piece_ids, xs, ys, orientation_ids, shift_ids = decode_action_ids(np.where(is_pass, 0, action_ids))
+    is_off_board = (xs >= board_size) | (ys >= board_size)
+
+    # Transform indexes around the board center, in doubled coords to stay in integers
+    doubled_xs, doubled_ys = 2 * xs - (board_size - 1), 2 * ys - (board_size - 1)
+    new_xs = (matrix[0, 0] * doubled_xs + matrix[0, 1] * doubled_ys + board_size - 1) // 2
+    new_ys = (matrix[1, 0] * doubled_xs + matrix[1, 1] * doubled_ys + board_size - 1) // 2
+    orientation_ids = orientation_permutation(matrix)[orientation_ids]
+
+    return np.where(is_pass | is_off_board, action_ids,
+                    encode_action_ids(piece_ids, new_xs, new_ys, orientation_ids, shift_ids))
+
+
+def build_player_perspective_action_tables(board_size: int = BOARD_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+    """Build the (quarter turns, NUM_ACTIONS + 1) int32 tables of every action id seen from a rotated
+    observation of the board, and their inverse, so conversions are a single lookup.
+
+    Parameters
+    ----------
+    board_size : int (optional)
+        Side length of the board the actions are rotated on.
+
+    Returns
+    -------
+    real_to_player : np.ndarray
+        real_to_player[turns, action_id] is the action id seen from a view rotated by turns quarter turns,
+        see :py:func:`blockus.board.perspective_quarter_turns`.
+    player_to_real : np.ndarray
+        player_to_real[turns, player_action_id] is the real action id.
+    """
+    action_ids = np.arange(PASS_ACTION_ID + 1, dtype=np.int64)
+    real_to_player = np.stack([transform_action_ids(action_ids, matrix, board_size)
+                               for matrix in BOARD_TO_PLAYER_OBSERVATION_ROTATION_MATRICES]).astype(np.int32)
+    player_to_real = np.empty_like(real_to_player)
+    for turns, player_action_ids in enumerate(real_to_player):
+        player_to_real[turns, player_action_ids] = action_ids  # Every table row is a permutation
+
+    return real_to_player, player_to_real
+
+
+# Perspective action tables of every board size, built the first time a board size is viewed
+# key: board side length
+# val: (real_to_player, player_to_real) tables of build_player_perspective_action_tables
+PLAYER_PERSPECTIVE_ACTION_TABLES = {BOARD_SIZE: build_player_perspective_action_tables()}
+REAL_TO_PLAYER_PERSPECTIVE_ACTION_IDS, PLAYER_PERSPECTIVE_TO_REAL_ACTION_IDS = PLAYER_PERSPECTIVE_ACTION_TABLES[BOARD_SIZE]
+
+
+def player_perspective_action_tables(board_size: int = BOARD_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+    """The (real_to_player, player_to_real) tables of :py:func:`build_player_perspective_action_tables` for a board size."""
+    if board_size not in PLAYER_PERSPECTIVE_ACTION_TABLES:
+        PLAYER_PERSPECTIVE_ACTION_TABLES[board_size] = build_player_perspective_action_tables(board_size)
+
+    return PLAYER_PERSPECTIVE_ACTION_TABLES[board_size]
+
+
+def real_to_player_perspective_action_ids(action_ids: np.ndarray, player: int, num_players: int = 4,
+                                          board_size: int = BOARD_SIZE) -> np.ndarray:
+    """Convert real action ids to the matching action ids in a player's rotated observation of the board.
+
+    Parameters
+    ----------
+    action_ids : np.ndarray
+        Real action ids, PASS_ACTION_ID stays PASS_ACTION_ID.
+    player : int
+        The player to view these actions from.
+    num_players : int (optional)
+        Number of players in the game.
+    board_size : int (optional)
+        Side length of the board.
+
+    Returns
+    -------
+    player_action_ids : np.ndarray
+        int64 array of the same shape.
+    """
+    real_to_player, _ = player_perspective_action_tables(board_size)
+    return real_to_player[perspective_quarter_turns(player, num_players)][action_ids].astype(np.int64)
+
+
+def player_perspective_to_real_action_ids(player_action_ids: np.ndarray, player: int, num_players: int = 4,
+                                          board_size: int = BOARD_SIZE) -> np.ndarray:
+    """Convert action ids in a player's rotated observation of the board back to real action ids.
+
+    Parameters
+    ----------
+    player_action_ids : np.ndarray
+        Player-perspective action ids, PASS_ACTION_ID stays PASS_ACTION_ID.
+    player : int
+        The player these actions were viewed from.
+    num_players : int (optional)
+        Number of players in the game.
+    board_size : int (optional)
+        Side length of the board.
+
+    Returns
+    -------
+    action_ids : np.ndarray
+        int64 array of the same shape.
+    """
+    _, player_to_real = player_perspective_action_tables(board_size)
+    return player_to_real[perspective_quarter_turns(player, num_players)][player_action_ids].astype(np.int64)
+
+
+def action_id_to_action(action_id: int) -> Union[Tuple[str, Tuple[int, int], str], None]:
+    """Convert an action id into piece_type, index, and orientation, or None for PASS_ACTION_ID.
+
+    Parameters
+    ----------
+    action_id : int
+        The action id.
+
+    Returns
+    -------
+    piece_type : str
+    index : Tuple[int, int]
+    orientation : str
+
+    Raises
+    ------
+    ValueError
+        If action_id is outside of 0 to PASS_ACTION_ID.
+    """
+    action_id = int(action_id)
+    if not 0 <= action_id <= PASS_ACTION_ID:
+        raise ValueError("Action id {} is outside of the action space 0 to {}".format(action_id, PASS_ACTION_ID))
+    if action_id == PASS_ACTION_ID:
+        return None
+
+    placement_id, cell = divmod(action_id, NUM_CELLS)
+    return PIECE_NAMES[PLACEMENT_PIECES[placement_id]], (cell % 20, cell // 20), PLACEMENT_ORIENTATION_NAMES[placement_id]
+
+
+def action_to_action_id(piece_type: str, index: Tuple[int, int], orientation: str) -> int:
+    """Convert a piece_type, index, and orientation into an action id.
+
+    Parameters
+    ----------
+    piece_type : str
+        The type of blockus piece to be placed in the action.
+    index : Tuple[int, int]
+        The location where the piece will be placed in the action.
+    orientation : str
+        The orientation, ending with the shift id, in which the piece will be placed in the action.
+
+    Returns
+    -------
+    action_id : int
+    """
+    placement_id = PLACEMENT_IDS[PIECE_IDS[piece_type], ORIENTATION_IDS[orientation[:-1]], int(orientation[-1])]
+    return int(placement_id) * NUM_CELLS + index[1] * 20 + index[0]
+
+
+def action_id_to_string(action_id: int) -> str:
+    """Convert an action id into a formatted action string, or an empty string for PASS_ACTION_ID."""
+    action = action_id_to_action(action_id)
+    return "" if action is None else action_to_string(*action)
+
+
+def string_to_action_id(action_str: str) -> int:
+    """Convert a formatted action string into an action id, or PASS_ACTION_ID for an empty string."""
+    action = string_to_action(action_str)
+    return PASS_ACTION_ID if action is None else action_to_action_id(*action)
+
+
+def parse_action(action: Union[str, int]) -> Union[Tuple[str, Tuple[int, int], str], None]:
+    """Convert an action string or action id into piece_type, index, and orientation, or None for a no-op."""
+    if isinstance(action, str):
+        return string_to_action(action)
+    return action_id_to_action(action)
+
+
+def next_turn_round(round_count: int, player_to_move: int, player_num: int) -> int:
+    """Get the round in which a player takes its next turn.
+
+    Players before player_to_move already took their turn in round_count, so their next one is in the next round.
+
+    Parameters
+    ----------
+    round_count : int
+        The current round.
+    player_to_move : int
+        The player whose turn it is.
+    player_num : int
+        The player in question.
+
+    Returns
+    -------
+    round_count : int
+    """
+    return round_count + 1 if player_num < player_to_move else round_count
+
+
+def state_hash(board, players) -> int:
+    """Get the 64-bit Zobrist hash of a position from the hashes Board and AI keep up to date.
+
+    Positions with the same cells, the same pieces left and the same player to move have the same hash,
+    whatever order the moves were played in.
+
+    Parameters
+    ----------
+    board : Board
+        The board of the position. Its player_to_move is part of the hash.
+    players : List[AI]
+        All players of the position.
+
+    Returns
+    -------
+    state_hash : int
+    """
+    zobrist_hash = board.zobrist_hash ^ ZOBRIST_PLAYER_TO_MOVE_KEYS[board.player_to_move]
+    for p in players:
+        zobrist_hash ^= p.zobrist_hash
+
+    return zobrist_hash
+
+
+GameState = namedtuple("GameState", ["board", "round_count", "players"])
+GameState.__doc__ = """Immutable Blockus game state: the board, the round count and a tuple of the players.
+
+Unpacks like the (board, round_count, players) tuple used by :py:class:`blockus.blockus_env.BlockusEnv`.
+The board and player objects inside must not be modified; BlockusEnv.next_state copies what it changes.
+"""
+
+
+class SearchState:
+    r"""
+    Mutable game state for tree search that applies and undoes actions in place.
+
+    Only the cells and frontier touched by an action are saved for undo, so walking down and back up a
+    search tree never copies the whole game.
+
+    Parameters
+    ----------
+    state : GameState
+        The state to start from. It is copied once and never modified.
+    player_to_move : int (optional)
+        The player whose turn it is in state. Defaults to the player to move stored on the state's board.
+    """
+
+    def __init__(self, state: GameState, player_to_move: Union[int, None] = None):
+        board, round_count, players = state
+        self.board = Board(board)
+        self.round_count = round_count
+        self.players = [p.copy() for p in players]
+        if player_to_move is not None:
+            self.player_to_move = player_to_move
+        self._undo_records = []
+
+    @property
+    def player_to_move(self) -> int:
+        """The player whose turn it is, kept on the board so to_state snapshots carry it."""
+        return self.board.player_to_move
+
+    @player_to_move.setter
+    def player_to_move(self, player_num: int):
+        self.board.player_to_move = player_num
+
+    def apply(self, action: Union[str, int]):
+        """Perform the action of the player to move in place and pass the turn to the next player.
+
+        Parameters
+        ----------
+        action : Union[str, int]
+            A valid action string or action id for the player to move.
+            An empty string or PASS_ACTION_ID passes.
+        """
+        player_num = self.player_to_move
+        player = self.players[player_num]
+        stuck_flags = [p.is_stuck for p in self.players]
+
+        action = parse_action(action)
+        if action is not None:
+            piece_type, index, orientation = action
+            board_undo_record = self.board.apply_update(player.player_color, piece_type, index, orientation, self.round_count)
+            player_undo_record = (piece_type, player.current_pieces.index(piece_type), player.player_score)
+            player.update_player(piece_type)
+        else:
+            board_undo_record = player_undo_record = None
+
+        self._undo_records.append((player_num, self.round_count, stuck_flags, board_undo_record, player_undo_record))
+
+        if player_num == len(self.players) - 1:
+            self.round_count += 1
+        self.player_to_move = (player_num + 1) % len(self.players)
+
+    def undo(self):
+        """Take back the last applied action."""
+        player_num, round_count, stuck_flags, board_undo_record, player_undo_record = self._undo_records.pop()
+
+        if board_undo_record is not None:
+            self.board.undo_update(board_undo_record)
+            self.players[player_num].undo_update_player(*player_undo_record)
+
+        for p, is_stuck in zip(self.players, stuck_flags):
+            p.is_stuck = is_stuck
+
+        self.round_count = round_count
+        self.player_to_move = player_num
+
+    @property
+    def depth(self) -> int:
+        """Number of applied actions that can still be undone."""
+        return len(self._undo_records)
+
+    def valid_actions(self) -> list:
+        """Valid action strings for the player to move, or a list holding only the empty string if it has to pass."""
+        player = self.players[self.player_to_move]
+        all_valid_moves = self.board.get_all_valid_moves(self.round_count, player.player_color, player.current_pieces)
+
+        valid_moves = [action_to_string(piece_type, index, orientation)
+                       for piece_type, index_orientation_dict in all_valid_moves.items()
+                       for index, orientation_list in index_orientation_dict.items()
+                       for orientation in orientation_list]
+
+        return valid_moves or [""]
+
+    def valid_action_ids(self, unique: bool = False) -> np.ndarray:
+        """Valid action ids for the player to move, or an array holding only PASS_ACTION_ID if it has to pass.
+        With unique, only one action is kept for every distinct set of cells a piece can cover."""
+        player = self.players[self.player_to_move]
+        valid_moves = self.board.get_valid_move_array(self.round_count, player.player_color, player.current_pieces)
+        if unique:
+            valid_moves = unique_valid_move_array(valid_moves)
+        action_ids = valid_move_array_to_action_ids(valid_moves)
+
+        return action_ids if len(action_ids) > 0 else np.array([PASS_ACTION_ID], dtype=np.int64)
+
+    def state_hash(self) -> int:
+        """Zobrist hash of the current position, see :py:func:`state_hash`."""
+        return state_hash(self.board, self.players)
+
+    def is_terminal(self) -> bool:
+        """Whether no player can place another piece."""
+        return not any(p.has_moves(self.board, next_turn_round(self.round_count, self.player_to_move, p_num))
+                       for p_num, p in enumerate(self.players))
+
+    def scores(self) -> list:
+        """Current score of every player."""
+        return [p.player_score for p in self.players]
+
+    def to_state(self) -> GameState:
+        """Copy the current position into an immutable GameState."""
+        return GameState(Board(self.board), self.round_count, tuple(p.copy() for p in self.players))
@@ -3,11 +3,12 @@ Author: Caleb Pitts
 Date: 3/15/19
 '''
 
-import board
-import ai
-import gui
+from blockus import board
+from blockus import ai
+from blockus import gui
+from blockus.evaluation import BASELINE_AGENTS, make_agent
 import itertools
-import random
+import numpy as np
 import sys
 import time
 
@@ -28,6 +29,8 @@ def get_show_command():
         show_board = sys.argv[1]
         if show_board == "show":
             return True
+        elif show_board in BASELINE_AGENTS or show_board == "random":  # Only an agent was given
+            return False
         else:
             print("MSG: Bad show board input. Use 'show' arg to display board while a game cycle is running.")
             print("MSG: Running cycle without showing board...\n")
@@ -36,6 +39,16 @@ def get_show_command():
         return False
 
 
+def get_agent_command():
+    ''' Collects sys arg naming the agent all players use: random (default), greedy or beam.
+        Can follow the show arg, e.g. python main.py show greedy
+    '''
+    for arg in sys.argv[1:]:
+        if arg in BASELINE_AGENTS:
+            return make_agent(arg)
+    return None
+
+
 def initialize_players(current_board):
     red = ai.AI(current_board, 1)
     blue = ai.AI(current_board, 2)
@@ -46,9 +59,11 @@ def initialize_players(current_board):
     return all_players
 
 
-def run_game_cycle(current_board, show_board, all_players):
-    ''' Runs one complete game cycle where ai picks random move from list of available moves
+def run_game_cycle(current_board, show_board, all_players, agent=None):
+    ''' Runs one complete game cycle where ai picks a uniformly random move out of all available moves,
+        or the move chosen by agent if one is given
     '''
+    rng = np.random.default_rng()
     total_start = time.time()
     round_count = 0
     player_count = 0
@@ -60,22 +75,22 @@ def run_game_cycle(current_board, show_board, all_players):
         gui.start_gui()
 
     for current_player in itertools.cycle(all_players):
-        all_valid_moves = current_player.collect_moves(current_board, round_count)  # change: passed in current_board
+        if agent is None:
+            move = current_board.random_valid_move(round_count, current_player.player_color, current_player.current_pieces, rng)
+        else:
+            move = agent.select_move(current_board, round_count, all_players, current_player.player_color - 1, rng)
 
         if show_board:
             gui.display_board(current_board.board_contents, current_player, all_players, round_count)  # I don't know why i need to put this here
 
-        if len(list(all_valid_moves.keys())) > 0:  # If no valid moves available for this player.
+        if move is not None:  # If no valid moves available for this player.
             players_with_no_moves = 0  # Reset to zero if at least one player can make a move
 
             if show_board:
                 gui.display_board(current_board.board_contents, current_player, all_players, round_count)
 
-            # Get all valid moves and ai decides on which one to make
-            random_indexes = random.sample(all_valid_moves.items(), 1)
-            piece_type = random_indexes[0][0]
-            index = list(all_valid_moves[piece_type].keys())[0]
-            orientation = all_valid_moves[piece_type][index][0]
+            # ai picks a random valid move, every valid move being equally likely, unless an agent chose it
+            piece_type, index, orientation = move
 
             # ai chooses move
             current_board.update_board(current_player.player_color, piece_type, index, orientation, round_count, True)
@@ -108,12 +123,13 @@ def run_game_cycle(current_board, show_board, all_players):
 
 def main():
     show_board = get_show_command()
+    agent = get_agent_command()
     welcome()
 
     while True:
         current_board = board.Board()
         all_players = initialize_players(current_board)
-        run_game_cycle(current_board, show_board, all_players)
+        run_game_cycle(current_board, show_board, all_players, agent)
 
         quit = input("\nWould you like to run another game cycle? ([y]/n): ").upper().strip()
         if show_board:
@@ -0,0 +1,383 @@
+'''
+Summary:
+Monte Carlo Tree Search agent for BlockusEnv states.
+- Simulations walk the tree on a single SearchState, applying the actions of the selected nodes and of the rollout
+  in place and undoing them afterwards, so no game state is copied per node or per rollout turn.
+- Every node keeps one value sum per player, so games of 2 to 4 players are searched without assuming two sides:
+  a child is scored by the average reward of the player who chose it (max^n style backups).
+- UCT or PUCT selection; PUCT takes priors from an optional prior function and is uniform otherwise.
+- Leaves are evaluated with uniformly random rollouts (Board.random_valid_move).
+  The reward is 1 split between the players with the top score.
+- Search stops after a number of simulations and/or a time budget per move.
+- The tree is reused between turns: the new position is looked up among the descendants of the old root
+  by its Zobrist hash (BlockusEnv.state_hash).
+- Root parallel mode runs independent searches in worker processes and sums their root visit counts.
+  The worker pool is started on the first search and kept until MCTSAgent.close().
+- Search statistics, including nodes/sec, are kept in MCTSAgent.last_search_stats.
+'''
+
+import argparse
+import math
+import multiprocessing
+import time
+from typing import Callable, Dict, List, Union
+
+import numpy as np
+from blockus.blockus_env import BlockusEnv
+from blockus.board import PASS_ACTION_ID, warmup
+from blockus.game_state import SearchState, action_id_to_string, action_to_action_id
+
+_WORKER_ENV = None  # One environment per worker process, kept between searches
+
+
+def winner_rewards(players) -> List[float]:
+    """Reward of every player for a position: 1 split between the players with the top score."""
+    scores = [p.player_score for p in players]
+    winners = [player_num for player_num, score in enumerate(scores) if score == max(scores)]
+    return [1 / len(winners) if player_num in winners else 0.0 for player_num in range(len(scores))]
+
+
+class Node:
+    r"""
+    A position in the search tree. Its player, hash and terminal flag are only filled in once a simulation reaches it.
+
+    Parameters
+    ----------
+    parent : Node
+        The node this node's action was taken from, None for the root.
+    action : int
+        The action id that leads from parent to this node.
+    prior : float
+        Prior probability of action used by PUCT.
+    num_players : int
+        Number of players in the game.
+    """
+    __slots__ = ["parent", "action", "prior", "player", "state_hash", "round_count", "terminal", "rewards", "children",
+                 "visits", "value_sums"]
+
+    def __init__(self, parent, action: int, prior: float, num_players: int):
+        self.parent = parent
+        self.action = action
+        self.prior = prior
+        self.player = None  # Player to move in the node's position, None until it is reached
+        self.state_hash = None  # Zobrist hash of the position, used to find it again when the tree is reused
+        self.round_count = None
+        self.terminal = False
+        self.rewards = None  # Final rewards if terminal
+        self.children = None  # Created on the first expansion
+        self.visits = 0
+        self.value_sums = [0.0] * num_players
+
+
+class MCTSAgent:
+    r"""
+    Monte Carlo Tree Search agent for Blockus.
+
+    Parameters
+    ----------
+    env : BlockusEnv (optional)
+        Environment used to step states, a new one by default.
+    num_simulations : int (optional)
+        Simulations per move. None to only stop at the time limit.
+    time_limit : float (optional)
+        Seconds of search per move. None to only stop after num_simulations.
+    selection : str (optional)
+        "uct" or "puct".
+    exploration : float (optional)
+        Exploration constant, sqrt(2) for UCT and 1.5 for PUCT by default.
+    prior_fn : Callable (optional)
+        prior_fn(state, player, action_ids) -> probabilities of the actions, used by PUCT. Uniform if not given.
+    reuse_tree : bool (optional)
+        Keep the subtree of the new position between moves.
+    num_workers : int (optional)
+        With more than 1, run that many independent searches in worker processes (root parallelism).
+        prior_fn must then be picklable. The processes live until :py:meth:`close` is called,
+        or until the end of a ``with`` block using the agent.
+    max_rollout_turns : int (optional)
+        Stop rollouts after this many turns and score the position reached. None plays them out.
+    unique_actions : bool (optional)
+        Expand one action per distinct set of covered cells instead of every equivalent action string.
+    seed : int (optional)
+        Seed of the agent's random number generator.
+    """
+
+    def __init__(self, env: Union[BlockusEnv, None] = None, num_simulations: Union[int, None] = 200,
+                 time_limit: Union[float, None] = None, selection: str = "uct", exploration: Union[float, None] = None,
+                 prior_fn: Union[Callable, None] = None, reuse_tree: bool = True, num_workers: int = 1,
+                 max_rollout_turns: Union[int, None] = None, unique_actions: bool = True, seed: Union[int, None] = None):
+        if selection not in ("uct", "puct"):
+            raise ValueError("selection must be 'uct' or 'puct', got {!r}".format(selection))
+        if num_simulations is None and time_limit is None:
+            raise ValueError("num_simulations and time_limit can not both be None")
+
+        self.env = env if env is not None else BlockusEnv()
+        self.num_simulations = num_simulations
+        self.time_limit = time_limit
+        self.selection = selection
+        self.exploration = exploration if exploration is not None else (math.sqrt(2) if selection == "uct" else 1.5)
+        self.prior_fn = prior_fn
+        self.reuse_tree = reuse_tree
+        self.num_workers = num_workers
+        self.max_rollout_turns = max_rollout_turns
+        self.unique_actions = unique_actions
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+
+        self.root = None
+        self.last_search_stats = {}
+        self._num_nodes = 0
+        self._num_rollout_turns = 0
+        self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def select_action(self, state: object, player: int, as_action_id: bool = False) -> Union[str, int]:
+        """Search from state and return the most visited action of player.
+
+        Parameters
+        ----------
+        state : object
+            The current state, whose turn it is of player.
+        player : int
+            The player to choose an action for.
+        as_action_id : bool (optional)
+            If True, an action id is returned instead of an action string.
+
+        Returns
+        -------
+        action : Union[str, int]
+            A valid action, which is the no-op if player has to pass.
+        """
+        visit_counts = self.search(state, player)
+        action_id = max(visit_counts.items(), key=lambda item: item[1])[0]
+        return action_id if as_action_id else action_id_to_string(action_id)
+
+    def search(self, state: object, player: int) -> Dict[int, int]:
+        """Run the search from state and return the visit count of every root action.
+
+        Parameters
+        ----------
+        state : object
+            The current state, whose turn it is of player.
+        player : int
+            The player to move.
+
+        Returns
+        -------
+        visit_counts : Dict[int, int]
+            Visits of every root action id. Only PASS_ACTION_ID if player has to pass.
+        """
+        if self.num_workers > 1:
+            return self._root_parallel_search(state, player)
+
+        start = time.perf_counter()
+        self._num_nodes = 0
+        self._num_rollout_turns = 0
+        root = self._find_root(state, player)
+        reused_visits = root.visits
+        search_state = SearchState(state, player)  # The only copy of the game made by this search
+        if root.children is None and not root.terminal:
+            self._expand(root, search_state)
+
+        num_simulations = 0
+        while not self._budget_spent(num_simulations, start):
+            self._simulate(root, search_state)
+            num_simulations += 1
+
+        seconds = time.perf_counter() - start
+        self.root = root
+        self.last_search_stats = {"simulations": num_simulations, "seconds": seconds,
+                                  "nodes": self._num_nodes, "rollout_turns": self._num_rollout_turns,
+                                  "reused_visits": reused_visits,
+                                  "nodes_per_sec": (self._num_nodes + self._num_rollout_turns) / seconds if seconds > 0 else 0.0,
+                                  "simulations_per_sec": num_simulations / seconds if seconds > 0 else 0.0}
+
+        return {child.action: child.visits for child in (root.children or [])}
+
+    def reset(self):
+        """Forget the search tree, e.g. before a new game."""
+        self.root = None
+
+    def close(self):
+        """Shut down the root parallel worker processes, if any were started. A later search starts new ones."""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def _budget_spent(self, num_simulations: int, start: float) -> bool:
+        if self.num_simulations is not None and num_simulations >= self.num_simulations:
+            return True
+        return self.time_limit is not None and time.perf_counter() - start >= self.time_limit
+
+    def _find_root(self, state: object, player: int) -> Node:
+        """Return the node of state out of the previous tree if it is there, otherwise a new root."""
+        if self.reuse_tree and self.root is not None:
+            state_hash = self.env.state_hash(state)
+            round_count = state.round_count
+            frontier = [self.root]
+            for _ in range(len(state.players) + 1):  # Up to one move of every player since the last search
+                next_frontier = []
+                for node in frontier:
+                    if node.player == player and node.round_count == round_count and node.state_hash == state_hash:
+                        node.parent = None
+                        node.action = None
+                        return node
+                    next_frontier.extend(child for child in (node.children or []) if child.player is not None)
+                frontier = next_frontier
+
+        root = Node(None, None, 1.0, len(state.players))
+        root.player = player
+        root.state_hash = self.env.state_hash(state)
+        root.round_count = state.round_count
+        return root
+
+    def _simulate(self, root: Node, search_state: SearchState):
+        node = root
+        while not node.terminal:
+            if node.children is None:
+                self._expand(node, search_state)
+                break
+            node = self._select_child(node)
+            search_state.apply(node.action)
+            if node.player is None:
+                self._reach(node, search_state)
+                break
+
+        rewards = node.rewards if node.terminal else self._rollout(search_state)
+        while search_state.depth > 0:  # Back to the root position for the next simulation
+            search_state.undo()
+
+        while node is not None:
+            node.visits += 1
+            for player_num in range(len(rewards)):
+                node.value_sums[player_num] += rewards[player_num]
+            node = node.parent
+
+    def _expand(self, node: Node, search_state: SearchState):
+        actions = search_state.valid_action_ids(unique=self.unique_actions).tolist()
+        if self.selection == "puct" and self.prior_fn is not None:
+            priors = np.asarray(self.prior_fn(search_state.to_state(), node.player, actions), dtype=np.float64)
+            priors = priors / priors.sum()
+        else:
+            priors = np.full(len(actions), 1 / len(actions))
+
+        num_players = len(node.value_sums)
+        node.children = [Node(node, action, prior, num_players) for action, prior in zip(actions, priors.tolist())]
+
+    def _select_child(self, node: Node) -> Node:
+        player = node.player
+        if self.selection == "uct":
+            unvisited = [child for child in node.children if child.visits == 0]
+            if unvisited:
+                return unvisited[self.rng.integers(len(unvisited))]
+
+            log_visits = math.log(node.visits)
+            return max(node.children, key=lambda child: child.value_sums[player] / child.visits
+                       + self.exploration * math.sqrt(log_visits / child.visits))
+
+        sqrt_visits = math.sqrt(node.visits)
+        return max(node.children, key=lambda child: (child.value_sums[player] / child.visits if child.visits else 0.0)
+                   + self.exploration * child.prior * sqrt_visits / (1 + child.visits))
+
+    def _reach(self, node: Node, search_state: SearchState):
+        node.player = search_state.player_to_move
+        node.state_hash = search_state.state_hash()
+        node.round_count = search_state.round_count
+        node.terminal = search_state.is_terminal()
+        if node.terminal:
+            node.rewards = winner_rewards(search_state.players)
+        self._num_nodes += 1
+
+    def _rollout(self, search_state: SearchState) -> List[float]:
+        turns = 0
+        terminal = False
+        while not terminal and (self.max_rollout_turns is None or turns < self.max_rollout_turns):
+            player = search_state.players[search_state.player_to_move]
+            move = search_state.board.random_valid_move(search_state.round_count, player.player_color,
+                                                        player.current_pieces, self.rng)
+            search_state.apply(PASS_ACTION_ID if move is None else action_to_action_id(*move))
+            terminal = search_state.is_terminal()
+            turns += 1
+
+        self._num_rollout_turns += turns
+        return winner_rewards(search_state.players)
+
+    def _root_parallel_search(self, state: object, player: int) -> Dict[int, int]:
+        start = time.perf_counter()
+        seeds = self.rng.integers(0, 2 ** 31, size=self.num_workers).tolist()
+        worker_args = [(self.env.serialize_state(state), player, self._worker_config(seed)) for seed in seeds]
+        if self._pool is None:
+            # Started once per agent, so later moves do not pay for process startup and loading the kernels again
+            self._pool = multiprocessing.Pool(self.num_workers, initializer=warmup)
+        results = self._pool.map(_search_worker, worker_args)
+
+        visit_counts = {}
+        for worker_visit_counts, _ in results:
+            for action, visits in worker_visit_counts.items():
+                visit_counts[action] = visit_counts.get(action, 0) + visits
+
+        seconds = time.perf_counter() - start
+        worker_stats = [stats for _, stats in results]
+        num_nodes = sum(stats["nodes"] + stats["rollout_turns"] for stats in worker_stats)
+        self.last_search_stats = {"simulations": sum(stats["simulations"] for stats in worker_stats),
+                                  "seconds": seconds, "nodes": sum(stats["nodes"] for stats in worker_stats),
+                                  "rollout_turns": sum(stats["rollout_turns"] for stats in worker_stats),
+                                  "reused_visits": 0, "workers": self.num_workers,
+                                  "nodes_per_sec": num_nodes / seconds,
+                                  "simulations_per_sec": sum(stats["simulations"] for stats in worker_stats) / seconds}
+
+        return visit_counts
+
+    def _worker_config(self, seed: int) -> Dict:
+        return {"num_simulations": self.num_simulations, "time_limit": self.time_limit, "selection": self.selection,
+                "exploration": self.exploration, "prior_fn": self.prior_fn, "reuse_tree": False,
+                "max_rollout_turns": self.max_rollout_turns, "unique_actions": self.unique_actions, "seed": seed}
+
+
+def _search_worker(args):
+    global _WORKER_ENV
+    if _WORKER_ENV is None:
+        _WORKER_ENV = BlockusEnv()
+    serialized_state, player, config = args
+    agent = MCTSAgent(_WORKER_ENV, **config)
+    visit_counts = agent.search(agent.env.deserialize_state(serialized_state), player)
+    return visit_counts, agent.last_search_stats
+
+
+def main(argv: Union[List[str], None] = None):
+    parser = argparse.ArgumentParser(description="Play one game of an MCTS agent (player 0) against random players.")
+    parser.add_argument("--simulations", type=int, default=100, help="simulations per move")
+    parser.add_argument("--time-limit", type=float, default=None, help="seconds of search per move")
+    parser.add_argument("--selection", default="uct", choices=["uct", "puct"])
+    parser.add_argument("--workers", type=int, default=1, help="root parallel worker processes")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    env = BlockusEnv()
+    agent = MCTSAgent(env, num_simulations=args.simulations, time_limit=args.time_limit, selection=args.selection,
+                      num_workers=args.workers, seed=args.seed)
+    rng = np.random.default_rng(args.seed)
+
+    state, players = env.new_state()
+    terminal = False
+    nodes_per_sec = []
+    with agent:
+        while not terminal:
+            if players[0] == 0:
+                action = agent.select_action(state, 0)
+                nodes_per_sec.append(agent.last_search_stats.get("nodes_per_sec", 0.0))
+            else:
+                action = env.random_valid_action(state, players[0], rng)
+            state, players, _, terminal, winners = env.next_state(state, players, [action])
+
+    print("Scores:", [p.player_score for p in state.players], "winners:", winners)
+    print("Average nodes/sec: {:.0f}".format(np.mean(nodes_per_sec) if nodes_per_sec else 0.0))
+
+
+if __name__ == "__main__":
+    main()
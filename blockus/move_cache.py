@@ -0,0 +1,74 @@
+'''
+Summary:
+Bounded LRU cache of valid move generation results.
+Entries are keyed by Zobrist hashes (see BlockusEnv.state_hash), so the same position reached through
+a different move order or a copied state object hits the same entry.
+'''
+
+from collections import OrderedDict
+
+
+class MoveCache:
+    r"""
+    Least recently used cache with hit and miss counters.
+
+    Parameters
+    ----------
+    maxsize : int
+        Largest number of entries kept. The least recently used entry is dropped when it is exceeded.
+        0 disables caching.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        """Return the entry of key and mark it as recently used, or default if it is not cached."""
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def peek(self, key, default=None):
+        """Return the entry of key, or default if it is not cached, without touching the counters or the LRU order."""
+        return self._entries.get(key, default)
+
+    def put(self, key, value):
+        """Store value under key, dropping the least recently used entry if the cache is full."""
+        if self.maxsize <= 0:
+            return
+
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        """Return the entry of key, calling compute() and storing its result on a miss."""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+
+        return value
+
+    def clear(self):
+        """Drop all entries and reset the counters."""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        """Current size, capacity, hit and miss counts of the cache."""
+        return {"size": len(self._entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,203 @@
+'''
+Summary:
+Builds player observations from board contents with precomputed lookup tables.
+- RELATIVE_PLAYER_IDS maps a cell color to the player id relative to the viewing player (-1 for empty cells).
+- PLAYER_PERSPECTIVE_CELLS maps every cell of a player's rotated view to the board cell it shows.
+Both are kept per number of players and board size, so every variant of blockus.board.VARIANTS can be observed.
+Every function can write into caller-supplied arrays and has a batched variant for N games.
+'''
+
+from typing import Dict, Tuple, Union
+
+import numpy as np
+from blockus.board import PIECE_TYPES, PIECE_IDS, VARIANTS, perspective_quarter_turns
+
+
+def build_relative_player_ids(num_players: int):
+    ''' Returns a (viewing player, cell color) table of the relative player id shown in an observation.
+        Empty cells (color 0) stay -1 and the viewing player's own color becomes 0.
+    '''
+    relative_player_ids = np.full((num_players, num_players + 1), -1, dtype=np.int64)
+    for player in range(num_players):
+        for player_color in range(1, num_players + 1):
+            relative_player_ids[player, player_color] = (player_color - 1 - player) % num_players
+
+    return relative_player_ids
+
+
+def build_player_perspective_cells(board_size: int, num_players: int):
+    ''' Returns, for every player, the flat board cell shown at each flat cell of that player's rotated view.
+        Matches rotating the board by np.rot90(board, k=-perspective_quarter_turns(player, num_players)).
+    '''
+    cells = np.arange(board_size * board_size).reshape(board_size, board_size)
+    return np.stack([np.rot90(cells, k=-perspective_quarter_turns(player, num_players)).ravel()
+                     for player in range(num_players)])
+
+
+# key: number of players
+# val: build_relative_player_ids table
+RELATIVE_PLAYER_IDS = {variant["num_players"]: build_relative_player_ids(variant["num_players"])
+                       for variant in VARIANTS.values()}
+# key: (board side length, number of players)
+# val: build_player_perspective_cells table
+PLAYER_PERSPECTIVE_CELLS = {(variant["board_size"], variant["num_players"]):
+                            build_player_perspective_cells(variant["board_size"], variant["num_players"])
+                            for variant in VARIANTS.values()}
+
+
+def observation_tables(board_size: int, num_players: int) -> Tuple[np.ndarray, np.ndarray]:
+    """The RELATIVE_PLAYER_IDS and PLAYER_PERSPECTIVE_CELLS tables of a game, built on first use if no variant has them."""
+    if num_players not in RELATIVE_PLAYER_IDS:
+        RELATIVE_PLAYER_IDS[num_players] = build_relative_player_ids(num_players)
+    if (board_size, num_players) not in PLAYER_PERSPECTIVE_CELLS:
+        PLAYER_PERSPECTIVE_CELLS[board_size, num_players] = build_player_perspective_cells(board_size, num_players)
+
+    return RELATIVE_PLAYER_IDS[num_players], PLAYER_PERSPECTIVE_CELLS[board_size, num_players]
+
+
+def board_observation(board_contents: np.ndarray, player: int, num_players: int = 4,
+                      out: Union[np.ndarray, None] = None) -> np.ndarray:
+    """Rotate board contents to a player's perspective and replace colors by relative player ids.
+
+    Parameters
+    ----------
+    board_contents : np.ndarray
+        (board_size, board_size) board of cell colors.
+    player : int
+        The player who is intended to view the observation.
+    num_players : int (optional)
+        Number of players in the game.
+    out : np.ndarray (optional)
+        (board_size, board_size) int64 array to write the observation into.
+
+    Returns
+    -------
+    board_observation : np.ndarray
+    """
+    relative_player_ids, player_perspective_cells = observation_tables(board_contents.shape[0], num_players)
+    if out is None:
+        out = np.empty(board_contents.shape, dtype=np.int64)
+
+    visible_cells = np.take(board_contents.ravel(), player_perspective_cells[player])
+    np.take(relative_player_ids[player], visible_cells, out=out.reshape(-1))
+
+    return out
+
+
+def batch_board_observations(boards: np.ndarray, players: np.ndarray, num_players: int = 4,
+                             out: Union[np.ndarray, None] = None) -> np.ndarray:
+    """Batched :py:func:`board_observation` for N games of the same variant, each viewed by its own player.
+
+    Parameters
+    ----------
+    boards : np.ndarray
+        (N, board_size, board_size) boards of cell colors.
+    players : np.ndarray
+        (N,) viewing player of every game.
+    num_players : int (optional)
+        Number of players in every game.
+    out : np.ndarray (optional)
+        (N, board_size, board_size) int64 array to write the observations into.
+
+    Returns
+    -------
+    board_observations : np.ndarray
+    """
+    num_games = boards.shape[0]
+    players = np.asarray(players, dtype=np.int64)
+    relative_player_ids, player_perspective_cells = observation_tables(boards.shape[1], num_players)
+    if out is None:
+        out = np.empty(boards.shape, dtype=np.int64)
+
+    visible_cells = np.take_along_axis(boards.reshape(num_games, -1), player_perspective_cells[players], axis=1)
+    lookup_ids = visible_cells + (players * (num_players + 1))[:, np.newaxis]  # Row of relative_player_ids per game
+    np.take(relative_player_ids.ravel(), lookup_ids, out=out.reshape(num_games, -1))
+
+    return out
+
+
+def pieces_observation(players, player: int, out: Union[np.ndarray, None] = None) -> np.ndarray:
+    """Mark the pieces every player still has, with rows ordered relative to the viewing player.
+
+    Parameters
+    ----------
+    players : List[AI]
+        All players of the game, in absolute order.
+    player : int
+        The player who is intended to view the observation.
+    out : np.ndarray (optional)
+        (players, 21) uint8 array to write the observation into.
+
+    Returns
+    -------
+    pieces_observation : np.ndarray
+    """
+    num_players = len(players)
+    if out is None:
+        out = np.zeros((num_players, len(PIECE_TYPES)), dtype=np.uint8)
+    else:
+        out[:] = 0
+
+    for player_num, p in enumerate(players):
+        out[(player_num - player) % num_players, [PIECE_IDS[piece] for piece in p.current_pieces]] = 1
+
+    return out
+
+
+def batch_relative_rows(values: np.ndarray, players: np.ndarray, out: Union[np.ndarray, None] = None) -> np.ndarray:
+    """Reorder per-player rows of N games (e.g. (N, 4, 21) inventories or (N, 4) scores) relative to each game's player.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        (N, players, ...) array with one row per absolute player.
+    players : np.ndarray
+        (N,) viewing player of every game.
+    out : np.ndarray (optional)
+        Array of the same shape to write the reordered rows into.
+
+    Returns
+    -------
+    relative_values : np.ndarray
+    """
+    num_players = values.shape[1]
+    relative_players = (np.asarray(players)[:, np.newaxis] + np.arange(num_players)) % num_players
+    relative_players = relative_players.reshape(relative_players.shape + (1,) * (values.ndim - 2))
+    if out is None:
+        return np.take_along_axis(values, relative_players, axis=1)
+
+    out[...] = np.take_along_axis(values, relative_players, axis=1)
+    return out
+
+
+def state_observation(board_contents: np.ndarray, players, player: int,
+                      out: Union[Dict[str, np.ndarray], None] = None) -> Dict[str, np.ndarray]:
+    """Build the full observation dictionary of BlockusEnv.state_to_observation.
+
+    Parameters
+    ----------
+    board_contents : np.ndarray
+        (board_size, board_size) board of cell colors.
+    players : List[AI]
+        All players of the game, in absolute order.
+    player : int
+        The player who is intended to view the observation.
+    out : Dict[str, np.ndarray] (optional)
+        Preallocated "board", "pieces", "score" and "player" arrays to write the observation into.
+
+    Returns
+    -------
+    observation : Dict[str, np.ndarray]
+    """
+    num_players = len(players)
+    if out is None:
+        out = {"board": None, "pieces": None, "score": np.empty(num_players, dtype=np.int64),
+               "player": np.empty(1, dtype=np.int64)}
+
+    out["board"] = board_observation(board_contents, player, num_players, out=out["board"])
+    out["pieces"] = pieces_observation(players, player, out=out["pieces"])
+    for player_num, p in enumerate(players):
+        out["score"][(player_num - player) % num_players] = p.player_score
+    out["player"][0] = player
+
+    return out
@@ -0,0 +1,207 @@
+'''
+Summary:
+Headless self-play runner that plays many games across a multiprocessing worker pool.
+- Run it with: python -m blockus.selfplay --games 100 --workers 4 --seed 0 --output games.jsonl
+- Players pick uniformly random valid actions, or use a baseline agent of blockus.evaluation (--agent greedy or beam).
+- --variant duo or three_player plays the smaller variants of blockus.board.VARIANTS.
+- Every game gets its own seed (seed + game number), so results do not depend on the number of workers.
+- Results (winners, scores, rounds, moves, timing) are streamed to a JSONL file as games finish,
+  or collected into arrays of a numpy .npz file, and aggregate games/sec and moves/sec are reported.
+'''
+
+import argparse
+import json
+import multiprocessing
+import time
+from typing import Dict, Iterator, List, Union
+
+import numpy as np
+from blockus.blockus_env import BlockusEnv
+from blockus.board import PASS_ACTION_ID, VARIANTS
+from blockus.evaluation import BASELINE_AGENTS, make_agent
+
+AGENT_NAMES = ["random"] + list(BASELINE_AGENTS)
+
+_ENV = None  # One environment per worker process, created on first use
+_AGENTS = {}
+
+
+def _get_env() -> BlockusEnv:
+    global _ENV
+    if _ENV is None:
+        _ENV = BlockusEnv(move_cache_size=0)  # Random games never revisit a position
+    return _ENV
+
+
+def _get_agent(agent_name: str):
+    if agent_name not in _AGENTS:
+        _AGENTS[agent_name] = make_agent(agent_name)
+    return _AGENTS[agent_name]
+
+
+def play_game(game_num: int, seed: int, agent_name: str = "random", variant: str = "classic") -> Dict:
+    """Play one game where every player picks a uniformly random valid action, or the action of a baseline agent.
+
+    Parameters
+    ----------
+    game_num : int
+        Number of the game, reported back in the result.
+    seed : int
+        Seed of the game's random number generator.
+    agent_name : str (optional)
+        "random" or any key of :py:data:`blockus.evaluation.BASELINE_AGENTS`, used by every player.
+        Agents break ties with the game's random number generator.
+    variant : str (optional)
+        Rules of the game, any key of :py:data:`blockus.board.VARIANTS`.
+
+    Returns
+    -------
+    result : Dict
+        "game", "seed", "agent", "variant", "winners", "scores", "rounds", "moves" (pieces placed), "turns" and "seconds".
+    """
+    env = _get_env()
+    agent = None if agent_name == "random" else _get_agent(agent_name)
+    rng = np.random.default_rng(seed)
+    start = time.perf_counter()
+
+    state, players = env.new_state(variant=variant)
+    moves = turns = 0
+    terminal = False
+    while not terminal:
+        if agent is None:
+            action_id = env.random_valid_action(state, players[0], rng, as_action_id=True)
+        else:
+            action_id = agent.select_action(state, players[0], rng, as_action_id=True)
+        state, players, _, terminal, winners = env.next_state(state, players, [action_id])
+        moves += action_id != PASS_ACTION_ID
+        turns += 1
+
+    return {"game": game_num, "seed": seed, "agent": agent_name, "variant": variant, "winners": winners,
+            "scores": [p.player_score for p in state.players], "rounds": state.round_count,
+            "moves": moves, "turns": turns, "seconds": time.perf_counter() - start}
+
+
+def _play_game_star(args) -> Dict:
+    return play_game(*args)
+
+
+def iter_selfplay(num_games: int, num_workers: int = 1, seed: int = 0, agent_name: str = "random",
+                  variant: str = "classic") -> Iterator[Dict]:
+    """Play num_games games and yield their results in the order they finish.
+
+    Parameters
+    ----------
+    num_games : int
+        Number of games to play.
+    num_workers : int (optional)
+        Number of worker processes. With 1, games are played in the calling process.
+    seed : int (optional)
+        Game game_num is played with seed + game_num.
+    agent_name : str (optional)
+        Policy of every player, any of AGENT_NAMES.
+    variant : str (optional)
+        Rules of every game, any key of :py:data:`blockus.board.VARIANTS`.
+
+    Returns
+    -------
+    results : Iterator[Dict]
+        One :py:func:`play_game` result per game.
+    """
+    game_args = [(game_num, seed + game_num, agent_name, variant) for game_num in range(num_games)]
+
+    if num_workers <= 1:
+        for args in game_args:
+            yield play_game(*args)
+        return
+
+    with multiprocessing.Pool(num_workers) as pool:
+        for result in pool.imap_unordered(_play_game_star, game_args):
+            yield result
+
+
+def write_npz(path: str, results: List[Dict]):
+    """Save game results as arrays of a numpy .npz file, ordered by game number.
+    "winners" is a (num_games, players) boolean array marking every player with the top score.
+    """
+    results = sorted(results, key=lambda result: result["game"])
+    num_players = len(results[0]["scores"]) if results else 4
+    winners = np.zeros((len(results), num_players), dtype=np.bool_)
+    for row, result in enumerate(results):
+        winners[row, result["winners"]] = True
+
+    np.savez(path, game=np.array([r["game"] for r in results], dtype=np.int64),
+             seed=np.array([r["seed"] for r in results], dtype=np.int64), winners=winners,
+             scores=np.array([r["scores"] for r in results], dtype=np.int64).reshape(-1, num_players),
+             rounds=np.array([r["rounds"] for r in results], dtype=np.int64),
+             moves=np.array([r["moves"] for r in results], dtype=np.int64),
+             turns=np.array([r["turns"] for r in results], dtype=np.int64),
+             seconds=np.array([r["seconds"] for r in results], dtype=np.float64))
+
+
+def run_selfplay(num_games: int, num_workers: int = 1, seed: int = 0, output: Union[str, None] = None,
+                 agent_name: str = "random", variant: str = "classic") -> Dict:
+    """Play num_games games, write their results to output and return aggregate throughput.
+
+    Parameters
+    ----------
+    num_games : int
+        Number of games to play.
+    num_workers : int (optional)
+        Number of worker processes.
+    seed : int (optional)
+        Base seed, game game_num is played with seed + game_num.
+    output : str (optional)
+        Path of a .npz file, or of a JSONL file (any other extension) that gets one line per game as it finishes.
+    agent_name : str (optional)
+        Policy of every player, any of AGENT_NAMES.
+    variant : str (optional)
+        Rules of every game, any key of :py:data:`blockus.board.VARIANTS`.
+
+    Returns
+    -------
+    summary : Dict
+        "games", "moves", "turns", "seconds" (wall clock), "games_per_sec" and "moves_per_sec".
+    """
+    write_jsonl = output is not None and not output.endswith(".npz")
+    results = []
+    start = time.perf_counter()
+
+    output_file = open(output, "w") if write_jsonl else None
+    try:
+        for result in iter_selfplay(num_games, num_workers, seed, agent_name, variant):
+            results.append(result)
+            if output_file is not None:
+                output_file.write(json.dumps(result) + "\n")
+                output_file.flush()
+    finally:
+        if output_file is not None:
+            output_file.close()
+
+    seconds = time.perf_counter() - start
+    if output is not None and not write_jsonl:
+        write_npz(output, results)
+
+    moves = sum(result["moves"] for result in results)
+    return {"games": len(results), "moves": moves, "turns": sum(result["turns"] for result in results),
+            "seconds": seconds, "games_per_sec": len(results) / seconds, "moves_per_sec": moves / seconds}
+
+
+def main(argv: Union[List[str], None] = None):
+    parser = argparse.ArgumentParser(description="Play Blockus self-play games in parallel and report throughput.")
+    parser.add_argument("--games", type=int, default=100, help="number of games to play")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(), help="number of worker processes")
+    parser.add_argument("--seed", type=int, default=0, help="base seed, game n uses seed + n")
+    parser.add_argument("--agent", default="random", choices=AGENT_NAMES, help="policy of every player")
+    parser.add_argument("--variant", default="classic", choices=list(VARIANTS), help="rules of every game")
+    parser.add_argument("--output", default=None, help="results file, .npz for numpy arrays, otherwise JSONL")
+    args = parser.parse_args(argv)
+
+    summary = run_selfplay(args.games, args.workers, args.seed, args.output, args.agent, args.variant)
+    print("Played {games} games ({moves} moves) in {seconds:.2f} seconds: "
+          "{games_per_sec:.2f} games/sec, {moves_per_sec:.1f} moves/sec".format(**summary))
+
+    return summary
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+'''
+Summary:
+Compact binary codec for game states, used by BlockusEnv.serialize_state and deserialize_state.
+A classic game state takes 173 bytes (90 for Blokus Duo), laid out as:
+- header: magic b"BK", format version, variant, player to move, round count (uint16)
+  and stuck flags (one bit per player)
+- scores: one uint8 per player
+- inventories: one bit per player and piece in PIECE_TYPES order, bit-packed (84 bits for 4 players)
+- board: 3 bits per cell in row-major order, bit-packed (1200 bits on the 20 by 20 board)
+Only board_contents is stored; the corner/forbidden frontier and Zobrist hashes are rebuilt on decode.
+'''
+
+import struct
+from typing import Tuple, Union
+
+import numpy as np
+from blockus.ai import AI
+from blockus.board import Board, PIECE_TYPES, VARIANTS
+from blockus.game_state import GameState
+
+MAGIC = b"BK"
+FORMAT_VERSION = 3
+CELL_BITS = 3
+
+HEADER = struct.Struct("<2sBBBHB")
+
+VARIANT_NAMES = list(VARIANTS.keys())
+CELL_BIT_SHIFTS = np.arange(CELL_BITS - 1, -1, -1, dtype=np.uint8)  # Most significant bit first
+
+
+def section_sizes(variant: str) -> Tuple[int, int, int]:
+    """Bytes of the scores, inventories and board of an encoded state of a variant."""
+    num_players = VARIANTS[variant]["num_players"]
+    board_size = VARIANTS[variant]["board_size"]
+    return num_players, (num_players * len(PIECE_TYPES) + 7) // 8, (board_size * board_size * CELL_BITS + 7) // 8
+
+
+def state_size(variant: str = "classic") -> int:
+    """Number of bytes encode_state makes for a state of a variant."""
+    return HEADER.size + sum(section_sizes(variant))
+
+
+STATE_SIZE = state_size()  # Classic game
+
+
+def variant_of(board, players) -> str:
+    """Name of the VARIANTS entry a game is played with."""
+    for name, variant in VARIANTS.items():
+        if (variant["board_size"] == board.board_size and variant["num_players"] == len(players)
+                and [tuple(corner) for corner in variant["start_corners"]]
+                == [tuple(corner) for corner in board.start_corners[:len(players)]]):
+            return name
+    raise ValueError("Board of size {} with {} players is not one of VARIANTS".format(board.board_size, len(players)))
+
+
+def encode_state(state: GameState) -> bytes:
+    """Pack a game state into state_size(variant) bytes.
+
+    Parameters
+    ----------
+    state : GameState
+        The state to encode. Its rules must be one of the VARIANTS.
+
+    Returns
+    -------
+    encoded_state : bytes
+    """
+    board, round_count, players = state
+    variant_id = VARIANT_NAMES.index(variant_of(board, players))
+    stuck_flags = sum(1 << player_num for player_num, p in enumerate(players) if p.is_stuck)
+
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, variant_id, board.player_to_move, round_count, stuck_flags)
+    scores = bytes(p.player_score for p in players)
+    inventories = np.packbits([piece_type in p.current_pieces for p in players for piece_type in PIECE_TYPES])
+    cells = board.board_contents.astype(np.uint8).reshape(-1, 1)
+    board_bits = np.packbits((cells >> CELL_BIT_SHIFTS) & 1)
+
+    return b"".join((header, scores, inventories.tobytes(), board_bits.tobytes()))
+
+
+def decode_state(encoded_state: Union[bytes, bytearray, memoryview]) -> GameState:
+    """Rebuild a game state from the bytes made by :py:func:`encode_state`.
+    The fields are read straight out of the buffer without copying it first.
+
+    Parameters
+    ----------
+    encoded_state : Union[bytes, bytearray, memoryview]
+        Buffer of state_size(variant) bytes.
+
+    Returns
+    -------
+    state : GameState
+    """
+    buffer = memoryview(encoded_state)
+    if len(buffer) < HEADER.size:
+        raise ValueError("Encoded state has {} bytes, shorter than its header".format(len(buffer)))
+
+    magic, version, variant_id, player_to_move, round_count, stuck_flags = HEADER.unpack_from(buffer)
+    if magic != MAGIC or version != FORMAT_VERSION or variant_id >= len(VARIANT_NAMES):
+        raise ValueError("Not an encoded Blockus state of format version {}".format(FORMAT_VERSION))
+
+    variant = VARIANTS[VARIANT_NAMES[variant_id]]
+    num_players, inventory_size, board_bytes = section_sizes(VARIANT_NAMES[variant_id])
+    if len(buffer) != HEADER.size + num_players + inventory_size + board_bytes:
+        raise ValueError("Encoded state has {} bytes, expected {}".format(
+            len(buffer), HEADER.size + num_players + inventory_size + board_bytes))
+
+    board_size = variant["board_size"]
+    offset = HEADER.size
+    scores = buffer[offset:offset + num_players].tolist()
+    offset += num_players
+    inventories = np.unpackbits(np.frombuffer(buffer, dtype=np.uint8, count=inventory_size, offset=offset),
+                                count=num_players * len(PIECE_TYPES)).reshape(num_players, len(PIECE_TYPES))
+    offset += inventory_size
+    cell_bits = np.unpackbits(np.frombuffer(buffer, dtype=np.uint8, count=board_bytes, offset=offset),
+                              count=board_size * board_size * CELL_BITS).reshape(board_size, board_size, CELL_BITS)
+
+    board = Board(board_size=board_size, start_corners=variant["start_corners"])
+    board.board_contents[:] = (cell_bits << CELL_BIT_SHIFTS).sum(axis=2)
+    board.rebuild_frontier()
+    board.rebuild_zobrist_hash()
+    board.player_to_move = player_to_move
+
+    players = []
+    for player_num in range(num_players):
+        player = AI(board, player_num + 1)
+        player.player_score = scores[player_num]
+        player.current_pieces = [piece_type for piece_type, has_piece in zip(PIECE_TYPES, inventories[player_num].tolist())
+                                 if has_piece]
+        player.is_stuck = bool(stuck_flags >> player_num & 1)
+        player.rebuild_zobrist_hash()
+        players.append(player)
+
+    return GameState(board, round_count, tuple(players))
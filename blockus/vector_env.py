@@ -0,0 +1,214 @@
+'''
+Summary:
+Runs many Blockus games side by side for data collection.
+- VectorBlockusEnv keeps N games of one variant as stacked arrays: an (N, board_size, board_size) board tensor,
+  (N, players, 21) inventories and (N, players) scores. The board of every game is a view into the stacked tensor, so batched observations
+  and legal masks are built from whole arrays instead of one game at a time.
+- Only observations and legal masks are batched. Games still advance one at a time in a Python loop inside step,
+  each placing its piece on its own Board view and updating its frontier.
+- Observations, legal masks and actions are all from the perspective of each game's player to move,
+  the same rotated view BlockusEnv.state_to_observation gives.
+- Finished games are reset automatically; their final scores and winners are reported in the step infos.
+'''
+
+from typing import Dict, List, Tuple
+
+import numpy as np
+from blockus.ai import AI
+from blockus.board import Board, fill_action_mask, PIECE_TYPES, PIECE_IDS, NUM_ACTIONS, VARIANTS
+from blockus.observation import batch_board_observations, batch_relative_rows
+from blockus.game_state import (GameState, parse_action, next_turn_round, real_to_player_perspective_action_ids,
+                                player_perspective_to_real_action_ids)
+
+
+class VectorBlockusEnv:
+    r"""
+    Blockus environment holding num_envs games that are all stepped in one call.
+    Observations and legal masks are built as batches; step still advances the games one by one.
+
+    Parameters
+    ----------
+    num_envs : int
+        Number of games played side by side.
+    variant : str (optional)
+        Rules of every game, any key of :py:data:`blockus.board.VARIANTS`.
+    """
+
+    def __init__(self, num_envs: int, variant: str = "classic"):
+        self.num_envs = num_envs
+        self.variant = variant
+        rules = VARIANTS[variant]
+        self.board_size = rules["board_size"]
+        self.num_players = rules["num_players"]
+        self.start_corners = rules["start_corners"]
+
+        self.boards = np.zeros((num_envs, self.board_size, self.board_size), dtype=np.int64)
+        self.pieces = np.ones((num_envs, self.num_players, len(PIECE_TYPES)), dtype=np.bool_)
+        self.scores = np.zeros((num_envs, self.num_players), dtype=np.int64)
+        self.round_counts = np.zeros(num_envs, dtype=np.int64)
+        self.players_to_move = np.zeros(num_envs, dtype=np.int64)
+        self.valid_action_masks = np.zeros((num_envs, NUM_ACTIONS + 1), dtype=np.bool_)
+        self._observations = {"board": np.empty(self.boards.shape, dtype=np.int64),
+                              "pieces": np.empty(self.pieces.shape, dtype=np.uint8),
+                              "score": np.empty(self.scores.shape, dtype=np.int64),
+                              "player": np.empty((num_envs, 1), dtype=np.int64)}
+
+        self._boards = [None] * num_envs
+        self._players = [None] * num_envs
+
+    @property
+    def action_space_size(self) -> int:
+        """ Number of integer action ids, the length of every legal action mask."""
+        return NUM_ACTIONS + 1
+
+    def reset(self) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+        """ Start a new game in every slot.
+
+        Returns
+        -------
+        observations : Dict[str, np.ndarray]
+            Batched observations with the same keys as BlockusEnv.state_to_observation and a leading num_envs axis.
+        valid_action_masks : np.ndarray
+            (num_envs, action_space_size) boolean masks of player-perspective valid action ids.
+        """
+        for env_num in range(self.num_envs):
+            self._reset_game(env_num)
+            self._fill_valid_action_mask(env_num)
+
+        return self.observations(), self.valid_action_masks
+
+    def step(self, actions: np.ndarray) \
+            -> Tuple[Dict[str, np.ndarray], np.ndarray, np.ndarray, np.ndarray, List[Dict]]:
+        """ Perform one game step in every game.
+        The actions are converted to real action ids as one batch, then every game applies its action in turn.
+
+        Parameters
+        ----------
+        actions : np.ndarray
+            One player-perspective action id per game for its player to move,
+            taken from that game's legal action mask (PASS_ACTION_ID if it has to pass).
+
+        Returns
+        -------
+        observations : Dict[str, np.ndarray]
+            Batched observations for the player to move in every game after the step.
+        valid_action_masks : np.ndarray
+            (num_envs, action_space_size) boolean masks of player-perspective valid action ids.
+        rewards : np.ndarray
+            Reward of the player that just acted in every game, as in BlockusEnv.next_state.
+        dones : np.ndarray
+            Whether each game ended with this step. Those games have already been reset.
+        infos : List[Dict]
+            For every finished game, its final "scores" and "winners", otherwise an empty dict.
+        """
+        actions = np.asarray(actions, dtype=np.int64)
+        rewards = np.zeros(self.num_envs, dtype=np.int64)
+        dones = np.zeros(self.num_envs, dtype=np.bool_)
+        infos = [{} for _ in range(self.num_envs)]
+
+        # Actions of each game are in the rotated frame of its player to move
+        real_actions = actions.copy()
+        for player_num in range(self.num_players):
+            moving = self.players_to_move == player_num
+            real_actions[moving] = player_perspective_to_real_action_ids(actions[moving], player_num, self.num_players,
+                                                                         self.board_size)
+
+        for env_num in range(self.num_envs):
+            terminal, reward, winners = self._step_game(env_num, int(real_actions[env_num]))
+            rewards[env_num] = reward
+            if terminal:
+                dones[env_num] = True
+                infos[env_num] = {"scores": self.scores[env_num].copy(), "winners": winners}
+                self._reset_game(env_num)
+            self._fill_valid_action_mask(env_num)
+
+        return self.observations(), self.valid_action_masks, rewards, dones, infos
+
+    def observations(self) -> Dict[str, np.ndarray]:
+        """ Batched observations for the player to move in every game, as if each of them were player 0.
+        The arrays are preallocated buffers that are overwritten by the next call; copy them to keep them.
+
+        Returns
+        -------
+        observations : Dict[str, np.ndarray]
+            "board" (num_envs, board_size, board_size), "pieces" (num_envs, players, 21), "score" (num_envs, players)
+            and "player" (num_envs, 1).
+        """
+        players = self.players_to_move
+        observations = self._observations
+        batch_board_observations(self.boards, players, self.num_players, out=observations["board"])
+        batch_relative_rows(self.pieces, players, out=observations["pieces"])
+        batch_relative_rows(self.scores, players, out=observations["score"])
+        observations["player"][:, 0] = players
+
+        return observations
+
+    def state(self, env_num: int) -> GameState:
+        """ Snapshot of one game as a GameState usable with BlockusEnv. Its board is copied out of the batch.
+
+        Parameters
+        ----------
+        env_num : int
+            The game to snapshot.
+
+        Returns
+        -------
+        state : GameState
+        """
+        board = self._boards[env_num]
+        return GameState(Board(board), int(self.round_counts[env_num]),
+                         tuple(p.copy() for p in self._players[env_num]))
+
+    def _reset_game(self, env_num: int):
+        self.boards[env_num] = 0
+        self.pieces[env_num] = True
+        self.scores[env_num] = 0
+        self.round_counts[env_num] = 0
+        self.players_to_move[env_num] = 0
+
+        board = Board(board_size=self.board_size, start_corners=self.start_corners)
+        board.board_contents = self.boards[env_num]  # Share the game's slice of the stacked board tensor
+        self._boards[env_num] = board
+        self._players[env_num] = [AI(board, player_num + 1) for player_num in range(self.num_players)]
+
+    def _step_game(self, env_num: int, action_id: int) -> Tuple[bool, int, List[int]]:
+        board = self._boards[env_num]
+        players = self._players[env_num]
+        player_num = int(self.players_to_move[env_num])
+        round_count = int(self.round_counts[env_num])
+        current_player = players[player_num]
+
+        action = parse_action(action_id)
+        if action is not None:
+            piece_type, index, orientation = action
+            board.update_board(current_player.player_color, piece_type, index, orientation, round_count, True)
+            current_player.update_player(piece_type)
+            self.pieces[env_num, player_num, PIECE_IDS[piece_type]] = False
+            self.scores[env_num, player_num] = current_player.player_score
+
+        if player_num == self.num_players - 1:
+            round_count += 1
+        player_to_move = (player_num + 1) % self.num_players
+        self.round_counts[env_num] = round_count
+        self.players_to_move[env_num] = player_to_move
+        board.player_to_move = player_to_move
+
+        if any(p.has_moves(board, next_turn_round(round_count, player_to_move, p_num)) for p_num, p in enumerate(players)):
+            return False, 0, None
+
+        scores = [(p.player_color, p.player_score) for p in players]
+        max_score = max(score for _, score in scores)
+        winners = [player_color - 1 for player_color, score in scores if score == max_score]
+        reward = sorted(scores, key=lambda x: x[1]).index((current_player.player_color, current_player.player_score))
+
+        return True, reward, winners
+
+    def _fill_valid_action_mask(self, env_num: int):
+        board = self._boards[env_num]
+        player_num = int(self.players_to_move[env_num])
+        player = self._players[env_num][player_num]
+        round_count = int(self.round_counts[env_num])
+
+        action_ids = board.get_valid_action_ids(round_count, player.player_color, player.current_pieces)
+        fill_action_mask(self.valid_action_masks[env_num],
+                         real_to_player_perspective_action_ids(action_ids, player_num, self.num_players, self.board_size))
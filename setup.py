@@ -7,5 +7,6 @@ setup(
    author='Caleb Pitts',
    author_email='',
    packages=['blockus'],  #same as name
-   install_requires=['numpy', 'spacetime', 'spacetimerl', 'dill', 'pygame', 'numba'],
+   package_data={'blockus': ['benchmark_golden.json']},
+   install_requires=['numpy', 'spacetime', 'spacetimerl', 'pygame', 'numba'],
 )
\ No newline at end of file
@@ -0,0 +1,58 @@
+'''
+Summary:
+Helpers shared by the test modules.
+- reference_valid_moves finds valid moves with a plain python implementation of the placement rules.
+- play_random_turns plays random games to get positions from every phase of a game.
+'''
+
+import numpy as np
+from blockus.board import ORIENTATIONS, PIECE_TYPES, placement_offsets
+
+
+def reference_valid_moves(board, round_count, player_color, player_pieces):
+    ''' Every valid (piece_type, index, orientation) found by checking the placement rules cell by cell.
+    '''
+    contents = board.board_contents.tolist()
+    board_size = board.board_size
+
+    def color_at(x, y):
+        return contents[y][x] if 0 <= x < board_size and 0 <= y < board_size else 0
+
+    def touches_own_side(x, y):
+        return player_color in (color_at(x - 1, y), color_at(x + 1, y), color_at(x, y - 1), color_at(x, y + 1))
+
+    if round_count == 0:
+        indexes = [tuple(board.start_corners[player_color - 1])]
+    else:
+        indexes = [(x, y) for y in range(board_size) for x in range(board_size)
+                   if contents[y][x] == 0 and not touches_own_side(x, y) and
+                   player_color in (color_at(x - 1, y - 1), color_at(x + 1, y - 1), color_at(x - 1, y + 1), color_at(x + 1, y + 1))]
+
+    valid_moves = set()
+    for index in indexes:
+        for piece_type in player_pieces:
+            for orientation in ORIENTATIONS:
+                for shifted_id in range(len(PIECE_TYPES[piece_type])):
+                    cells = [(index[0] + offset_x, index[1] + offset_y) for offset_x, offset_y in
+                             placement_offsets(piece_type, orientation + str(shifted_id)).tolist()]
+                    if all(0 <= x < board_size and 0 <= y < board_size and contents[y][x] == 0 and not touches_own_side(x, y)
+                           for x, y in cells):
+                        valid_moves.add((piece_type, index, orientation + str(shifted_id)))
+
+    return valid_moves
+
+
+def play_random_turns(env, turns, seed, variant="classic"):
+    ''' Returns the states reached after every one of turns random turns, stopping at the end of the game.
+    '''
+    rng = np.random.default_rng(seed)
+    state, players = env.new_state(variant=variant)
+    states = [state]
+    for _ in range(turns):
+        action_id = env.random_valid_action(state, players[0], rng, as_action_id=True)
+        state, players, _, terminal, _ = env.next_state(state, players, [action_id])
+        states.append(state)
+        if terminal:
+            break
+
+    return states
@@ -0,0 +1,34 @@
+'''
+Summary:
+Tests of the conversions between action ids, actions and action strings.
+'''
+
+import pytest
+from blockus.blockus_env import BlockusEnv
+from blockus.board import NUM_ACTIONS, PASS_ACTION_ID
+from blockus.game_state import action_id_to_action, action_id_to_string, action_to_action_id, string_to_action_id
+
+
+def test_every_action_id_round_trips():
+    for action_id in range(NUM_ACTIONS):
+        action = action_id_to_action(action_id)
+        assert action_to_action_id(*action) == action_id
+
+    assert action_id_to_action(PASS_ACTION_ID) is None
+    assert action_id_to_string(PASS_ACTION_ID) == ""
+    assert string_to_action_id("") == PASS_ACTION_ID
+
+
+def test_action_strings_round_trip():
+    for action_id in range(0, NUM_ACTIONS, 97):
+        assert string_to_action_id(action_id_to_string(action_id)) == action_id
+
+
+@pytest.mark.parametrize("action_id", [-1, PASS_ACTION_ID + 1, 10 ** 9])
+def test_out_of_range_action_ids_are_rejected(action_id):
+    with pytest.raises(ValueError):
+        action_id_to_action(action_id)
+
+    env = BlockusEnv()
+    state, players = env.new_state()
+    assert not env.is_valid_action(state, players[0], action_id)
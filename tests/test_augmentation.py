@@ -0,0 +1,53 @@
+'''
+Summary:
+Tests of the dihedral board and action space transforms used for data augmentation.
+'''
+
+import numpy as np
+import pytest
+from blockus.augmentation import (ACTION_TRANSFORMS, INVERSE_TRANSFORMS, NUM_TRANSFORMS, transform_actions,
+                                  transform_boards, transform_policies)
+from blockus.board import BOARD_SIZE, NUM_ACTIONS, PASS_ACTION_ID, placement_offsets
+from blockus.game_state import action_id_to_action
+
+
+def action_board(action_id):
+    ''' A 20 by 20 board holding 1 on the cells action_id covers.
+    '''
+    piece_type, index, orientation = action_id_to_action(action_id)
+    board = np.zeros((BOARD_SIZE, BOARD_SIZE), dtype=np.int64)
+    for offset_x, offset_y in placement_offsets(piece_type, orientation).tolist():
+        board[index[1] + offset_y, index[0] + offset_x] = 1
+    return board
+
+
+def fits_on_board(action_id):
+    ''' Whether every cell action_id covers is on the 20 by 20 board.
+    '''
+    piece_type, index, orientation = action_id_to_action(action_id)
+    cells = placement_offsets(piece_type, orientation) + np.array(index)
+    return bool(((cells >= 0) & (cells < BOARD_SIZE)).all())
+
+
+@pytest.mark.parametrize("transform", range(NUM_TRANSFORMS))
+def test_augmentation_tables_are_inverse(transform):
+    action_ids = np.arange(NUM_ACTIONS + 1)
+
+    assert (ACTION_TRANSFORMS[INVERSE_TRANSFORMS[transform]][ACTION_TRANSFORMS[transform]] == action_ids).all()
+    assert ACTION_TRANSFORMS[transform][PASS_ACTION_ID] == PASS_ACTION_ID
+
+
+@pytest.mark.parametrize("transform", range(NUM_TRANSFORMS))
+def test_actions_and_boards_transform_alike(transform):
+    rng = np.random.default_rng(transform)
+    action_ids = [action_id for action_id in rng.choice(NUM_ACTIONS, 2000).tolist() if fits_on_board(action_id)][:50]
+    assert action_ids
+
+    for action_id in action_ids:
+        transformed_action_id = int(transform_actions(np.array([action_id]), transform)[0])
+        assert (transform_boards(action_board(action_id), transform) == action_board(transformed_action_id)).all()
+
+    policy = np.zeros(NUM_ACTIONS + 1)
+    policy[action_ids] = 1.0
+    transformed_policy = transform_policies(policy, transform)
+    assert (np.flatnonzero(transformed_policy) == np.unique(transform_actions(np.array(action_ids), transform))).all()
@@ -0,0 +1,34 @@
+'''
+Summary:
+Tests that the direct placement validator agrees with the full move generator.
+'''
+
+import numpy as np
+import pytest
+from blockus.blockus_env import BlockusEnv
+from blockus.board import NUM_ACTIONS, VARIANTS, valid_move_array_to_action_ids
+from blockus.game_state import action_id_to_action
+from helpers import play_random_turns
+
+
+@pytest.mark.parametrize("variant", sorted(VARIANTS))
+def test_is_valid_action_matches_generator(variant):
+    env = BlockusEnv(move_cache_size=0)
+    rng = np.random.default_rng(2)
+    for state in play_random_turns(env, 60, seed=9, variant=variant)[::5]:
+        board, round_count, players = state
+        for player_num, player in enumerate(players):
+            valid_action_ids = valid_move_array_to_action_ids(
+                board.get_valid_move_array(round_count, player.player_color, player.current_pieces))
+
+            # The same placements shifted by a cell are the hardest invalid candidates
+            neighbor_ids = (valid_action_ids[:, None] + np.array([-20, -1, 1, 20])).ravel()
+            candidate_ids = np.concatenate((valid_action_ids, neighbor_ids, rng.integers(NUM_ACTIONS, size=2000)))
+            candidate_ids = np.unique(candidate_ids[(candidate_ids >= 0) & (candidate_ids < NUM_ACTIONS)])
+            expected = np.isin(candidate_ids, valid_action_ids)
+
+            for action_id, is_valid in zip(candidate_ids.tolist(), expected.tolist()):
+                piece_type, index, orientation = action_id_to_action(action_id)
+                assert env.is_valid_action(state, player_num, action_id) == is_valid
+                assert board.is_valid_move(round_count, player.player_color, player.current_pieces,
+                                           piece_type, index, orientation) == is_valid
@@ -0,0 +1,69 @@
+'''
+Summary:
+Tests of MoveCache and of the BlockusEnv entry points that share its entries.
+'''
+
+import numpy as np
+from blockus.blockus_env import BlockusEnv
+from blockus.move_cache import MoveCache
+from helpers import play_random_turns
+
+
+def test_least_recently_used_entry_is_dropped():
+    cache = MoveCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" is now the least recently used entry
+    cache.put("c", 3)
+
+    assert cache.peek("b") is None
+    assert cache.peek("a") == 1 and cache.peek("c") == 3
+    assert len(cache) == 2
+
+
+def test_counters():
+    cache = MoveCache(4)
+    assert cache.get("a") is None
+    cache.put("a", 1)
+    assert cache.get("a") == 1
+    assert cache.get_or_compute("a", lambda: 2) == 1
+    assert cache.get_or_compute("b", lambda: 2) == 2
+    assert cache.peek("c") is None  # peek counts nothing
+
+    assert cache.stats() == {"size": 2, "maxsize": 4, "hits": 2, "misses": 2}
+    cache.clear()
+    assert cache.stats() == {"size": 0, "maxsize": 4, "hits": 0, "misses": 0}
+
+
+def test_zero_maxsize_disables_the_cache():
+    for maxsize in (0, -1):
+        cache = MoveCache(maxsize)
+        cache.put("a", 1)
+        assert cache.get_or_compute("b", lambda: 2) == 2
+
+        assert len(cache) == 0
+        assert cache.get("a") is None and cache.get("b") is None
+
+
+def test_entry_points_share_one_entry():
+    env = BlockusEnv()
+    state = play_random_turns(env, 10, seed=5)[-1]
+    player = state.board.player_to_move
+    env.move_cache.clear()
+
+    valid_actions = env.valid_actions(state, player, as_action_ids=True)
+    assert env.move_cache.stats()["misses"] == 1
+
+    valid_action_mask = env.valid_action_mask(state, player)
+    valid_actions_dict = env.valid_actions_dict(state, player)
+    env.player_perspective_valid_action_mask(state, player)
+    env.unique_valid_actions_dict(state, player)
+    assert env.move_cache.stats() == {"size": 1, "maxsize": 1024, "hits": 4, "misses": 1}
+
+    assert (np.flatnonzero(valid_action_mask) == np.sort(valid_actions)).all()
+    assert sum(len(orientations) for index_dict in valid_actions_dict.values()
+               for orientations in index_dict.values()) == len(valid_actions)
+
+    # is_valid_action only checks the cells of the placement and never generates moves
+    assert all(env.is_valid_action(state, player, int(action_id)) for action_id in valid_actions)
+    assert env.move_cache.stats()["hits"] == 4 and env.move_cache.stats()["misses"] == 1
@@ -0,0 +1,56 @@
+'''
+Summary:
+Regression tests for the move generation kernels.
+- Run them with: python -m pytest -q
+- Every kernel is checked against a plain python implementation of the placement rules.
+'''
+
+import pytest
+from blockus.benchmark import sample_position
+from blockus.blockus_env import BlockusEnv
+from blockus.board import VARIANTS, placement_offsets
+from helpers import play_random_turns, reference_valid_moves
+
+POSITION_TURNS = [0, 1, 4, 12, 24, 40, 60]
+
+
+@pytest.mark.parametrize("turns", POSITION_TURNS)
+def test_kernel_matches_reference_moves(turns):
+    board, round_count, players = sample_position(turns, turns)
+    for player in players:
+        all_valid_moves = board.get_all_valid_moves(round_count, player.player_color, player.current_pieces)
+        moves = {(piece_type, index, orientation) for piece_type, index_orientations in all_valid_moves.items()
+                 for index, orientations in index_orientations.items() for orientation in orientations}
+
+        assert moves == reference_valid_moves(board, round_count, player.player_color, player.current_pieces)
+        assert board.any_valid_move(round_count, player.player_color, player.current_pieces) == bool(moves)
+
+
+@pytest.mark.parametrize("variant", list(VARIANTS))
+def test_kernel_matches_reference_moves_on_variants(variant):
+    env = BlockusEnv(move_cache_size=0)
+    for board, round_count, players in play_random_turns(env, 30, seed=3, variant=variant)[::5]:
+        for player in players:
+            all_valid_moves = board.get_all_valid_moves(round_count, player.player_color, player.current_pieces)
+            moves = {(piece_type, index, orientation) for piece_type, index_orientations in all_valid_moves.items()
+                     for index, orientations in index_orientations.items() for orientation in orientations}
+
+            assert moves == reference_valid_moves(board, round_count, player.player_color, player.current_pieces)
+            # The streaming kernel shares the placement check of generate_valid_moves
+            assert set(board.iter_valid_moves(round_count, player.player_color, player.current_pieces)) == moves
+
+
+@pytest.mark.parametrize("turns", POSITION_TURNS)
+def test_unique_moves_cover_every_placement_once(turns):
+    env = BlockusEnv()
+    state = sample_position(turns, turns)
+    board, round_count, players = state
+    for player in players:
+        placements = {frozenset((index[0] + offset_x, index[1] + offset_y) for offset_x, offset_y in
+                                placement_offsets(piece_type, orientation).tolist())
+                      for piece_type, index, orientation in reference_valid_moves(board, round_count, player.player_color,
+                                                                                  player.current_pieces)}
+        unique_action_ids = env.valid_actions(state, player.player_color - 1, unique=True, as_action_ids=True)
+
+        assert set(board.get_unique_valid_moves(round_count, player.player_color, player.current_pieces)) == placements
+        assert len(unique_action_ids) == max(len(placements), 1)
@@ -0,0 +1,45 @@
+'''
+Summary:
+Tests of the precomputed tables that convert action ids between the real board and player perspectives.
+'''
+
+import numpy as np
+import pytest
+from blockus.benchmark import sample_position
+from blockus.blockus_env import BlockusEnv
+from blockus.board import NUM_ACTIONS, PASS_ACTION_ID
+from blockus.game_state import (PLAYER_PERSPECTIVE_TO_REAL_ACTION_IDS, REAL_TO_PLAYER_PERSPECTIVE_ACTION_IDS,
+                                action_id_to_string, player_perspective_to_real_action_ids,
+                                real_to_player_perspective_action_ids)
+
+
+@pytest.mark.parametrize("player", range(4))
+def test_perspective_tables_are_inverse(player):
+    action_ids = np.arange(NUM_ACTIONS + 1)
+
+    assert (PLAYER_PERSPECTIVE_TO_REAL_ACTION_IDS[player][REAL_TO_PLAYER_PERSPECTIVE_ACTION_IDS[player]] == action_ids).all()
+    assert (REAL_TO_PLAYER_PERSPECTIVE_ACTION_IDS[player][PLAYER_PERSPECTIVE_TO_REAL_ACTION_IDS[player]] == action_ids).all()
+    assert real_to_player_perspective_action_ids(np.array([PASS_ACTION_ID]), player)[0] == PASS_ACTION_ID
+    assert (player_perspective_to_real_action_ids(real_to_player_perspective_action_ids(action_ids, player), player)
+            == action_ids).all()
+
+
+def test_perspective_tables_match_string_conversion():
+    env = BlockusEnv()
+    state = sample_position(5, 20)
+    for player in range(4):
+        real_actions = env.valid_actions(state, player)
+        player_actions = env.player_perspective_valid_actions(state, player)
+
+        assert [env.convert_player_perspective_action_to_real_action(action, player) for action in player_actions] == real_actions
+
+
+@pytest.mark.parametrize("player", range(4))
+def test_vectorized_conversion_matches_string_conversion(player):
+    env = BlockusEnv()
+    action_ids = np.random.default_rng(player).choice(NUM_ACTIONS, 500)
+    player_action_ids = real_to_player_perspective_action_ids(action_ids, player)
+
+    for action_id, player_action_id in zip(action_ids.tolist(), player_action_ids.tolist()):
+        assert (env.convert_real_action_to_player_perspective_action(action_id_to_string(action_id), player)
+                == action_id_to_string(player_action_id))
@@ -0,0 +1,25 @@
+'''
+Summary:
+Tests of the precomputed placement table every move generation path reads its piece offsets from.
+'''
+
+from blockus.benchmark import check_golden, load_golden, sample_positions
+from blockus.board import ORIENTATIONS, PIECE_TYPES, placement_offsets
+
+
+def test_golden_move_counts():
+    assert check_golden(sample_positions(), load_golden()) == []
+
+
+def test_every_shift_anchors_a_different_cell():
+    for piece_type, offsets in PIECE_TYPES.items():
+        for orientation in ORIENTATIONS:
+            shifted_offsets = [placement_offsets(piece_type, orientation + str(shifted_id)) for shifted_id in range(len(offsets))]
+            default_cells = {tuple(cell) for cell in shifted_offsets[0].tolist()}
+
+            for shifted_id, cells in enumerate(shifted_offsets):
+                assert len(cells) == len(offsets)
+                assert [0, 0] in cells.tolist()  # The index is one of the piece's cells
+                # Every shift moves the same cells, so that the shift id-th default cell lands on the index
+                shift = shifted_offsets[0][shifted_id]
+                assert {tuple(cell) for cell in (cells + shift).tolist()} == default_cells
@@ -0,0 +1,41 @@
+'''
+Summary:
+Tests of the uniform random move sampler, Board.random_valid_move, and BlockusEnv.random_valid_action built on it.
+'''
+
+import numpy as np
+import pytest
+from blockus.benchmark import sample_position
+from blockus.blockus_env import BlockusEnv
+from blockus.board import VARIANTS
+from helpers import play_random_turns, reference_valid_moves
+
+
+def test_sampler_is_uniform():
+    board, round_count, players = sample_position(0, 52)
+    player = max(players, key=lambda p: len(p.current_pieces))
+    valid_moves = reference_valid_moves(board, round_count, player.player_color, player.current_pieces)
+    assert 0 < len(valid_moves) <= 200
+
+    rng = np.random.default_rng(0)
+    draws_per_move = 200
+    counts = dict.fromkeys(valid_moves, 0)
+    for _ in range(draws_per_move * len(valid_moves)):
+        piece_type, index, orientation = board.random_valid_move(round_count, player.player_color, player.current_pieces, rng)
+        counts[(piece_type, tuple(index), orientation)] += 1
+
+    assert len(counts) == len(valid_moves)  # Only valid moves are drawn
+    # Every count is binomial with mean draws_per_move, 6 standard deviations leave a negligible false failure rate
+    assert all(abs(count - draws_per_move) < 6 * np.sqrt(draws_per_move) for count in counts.values())
+
+
+@pytest.mark.parametrize("variant", sorted(VARIANTS))
+def test_random_valid_action_is_valid(variant):
+    env = BlockusEnv(move_cache_size=0)
+    rng = np.random.default_rng(4)
+    for state in play_random_turns(env, 200, seed=6, variant=variant):
+        for player in range(len(state.players)):
+            valid_action_ids = env.valid_actions(state, player, as_action_ids=True)
+            action_id = env.random_valid_action(state, player, rng, as_action_id=True)
+
+            assert action_id in valid_action_ids  # PASS_ACTION_ID only when it is the one valid action
@@ -0,0 +1,47 @@
+'''
+Summary:
+Tests that SearchState.undo restores every part of the game that SearchState.apply changes.
+'''
+
+import numpy as np
+import pytest
+from blockus.blockus_env import BlockusEnv
+from blockus.board import VARIANTS
+from blockus.game_state import SearchState
+
+
+def snapshot(search_state):
+    ''' Copies of everything an action can change, in a form that compares with ==.
+    '''
+    board = search_state.board
+    return (board.board_contents.tobytes(), board.corner_cells.tobytes(), board.forbidden_cells.tobytes(),
+            board.zobrist_hash, search_state.state_hash(), search_state.round_count, search_state.player_to_move,
+            [(list(p.current_pieces), p.player_score, p.is_stuck, p.zobrist_hash) for p in search_state.players])
+
+
+@pytest.mark.parametrize("variant", sorted(VARIANTS))
+@pytest.mark.parametrize("seed", [0, 1])
+def test_undo_restores_every_position_of_a_game(variant, seed):
+    rng = np.random.default_rng(seed)
+    state, _ = BlockusEnv().new_state(variant=variant)
+    search_state = SearchState(state)
+
+    snapshots = []
+    while True:
+        terminal = search_state.is_terminal()  # Caches stuck flags, which apply saves and undo restores
+        snapshots.append(snapshot(search_state))
+        if terminal:
+            break
+
+        action_id = int(rng.choice(search_state.valid_action_ids()))
+        search_state.apply(action_id)
+        search_state.undo()
+        assert snapshot(search_state) == snapshots[-1]
+        search_state.apply(action_id)
+
+    assert search_state.depth == len(snapshots) - 1
+    while search_state.depth > 0:
+        search_state.undo()
+        assert snapshot(search_state) == snapshots[search_state.depth]
+
+    assert snapshot(SearchState(state)) == snapshots[0]  # The starting state was never modified
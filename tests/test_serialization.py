@@ -0,0 +1,36 @@
+'''
+Summary:
+Tests of the binary state codec behind BlockusEnv.serialize_state and deserialize_state.
+'''
+
+import pytest
+from blockus.blockus_env import BlockusEnv
+from blockus.board import VARIANTS
+from blockus.serialization import state_size
+from helpers import play_random_turns
+
+
+@pytest.mark.parametrize("variant", list(VARIANTS))
+def test_serialization_round_trip(variant):
+    env = BlockusEnv(move_cache_size=0)
+    for state in play_random_turns(env, 200, seed=7, variant=variant):
+        data = env.serialize_state(state)
+        assert len(data) == state_size(variant)
+        decoded_state = env.deserialize_state(data)
+
+        assert (decoded_state.board.board_contents == state.board.board_contents).all()
+        assert (decoded_state.board.corner_cells == state.board.corner_cells).all()
+        assert (decoded_state.board.forbidden_cells == state.board.forbidden_cells).all()
+        assert decoded_state.board.zobrist_hash == state.board.zobrist_hash
+        assert decoded_state.board.player_to_move == state.board.player_to_move
+        assert decoded_state.round_count == state.round_count
+        assert env.state_hash(decoded_state) == env.state_hash(state)
+        for player, decoded_player in zip(state.players, decoded_state.players):
+            assert sorted(decoded_player.current_pieces) == sorted(player.current_pieces)
+            assert decoded_player.player_score == player.player_score
+            assert decoded_player.is_stuck == player.is_stuck
+
+
+def test_state_sizes():
+    assert state_size("classic") == 173
+    assert state_size("duo") == 90
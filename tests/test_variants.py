@@ -0,0 +1,101 @@
+'''
+Summary:
+Tests that observations, perspective actions and the vector env follow the board size and player count of every variant.
+'''
+
+import numpy as np
+import pytest
+from blockus.blockus_env import BlockusEnv
+from blockus.board import Board, NUM_ACTIONS, PASS_ACTION_ID, VARIANTS, placement_offsets
+from blockus.game_state import (action_id_to_action, player_perspective_to_real_action_ids,
+                                real_to_player_perspective_action_ids)
+from blockus.vector_env import VectorBlockusEnv
+from helpers import play_random_turns
+
+
+@pytest.mark.parametrize("variant", list(VARIANTS))
+def test_perspective_tables_are_inverse_on_variants(variant):
+    rules = VARIANTS[variant]
+    action_ids = np.arange(NUM_ACTIONS + 1)
+    for player in range(rules["num_players"]):
+        player_action_ids = real_to_player_perspective_action_ids(action_ids, player, rules["num_players"], rules["board_size"])
+
+        assert (player_perspective_to_real_action_ids(player_action_ids, player, rules["num_players"], rules["board_size"])
+                == action_ids).all()
+
+
+def action_cells(action_id):
+    piece_type, index, orientation = action_id_to_action(action_id)
+    return {(index[0] + offset_x, index[1] + offset_y) for offset_x, offset_y in placement_offsets(piece_type, orientation).tolist()}
+
+
+@pytest.mark.parametrize("variant", list(VARIANTS))
+def test_observations_match_perspective_actions_on_variants(variant):
+    env = BlockusEnv(variant=variant)
+    rules = VARIANTS[variant]
+    rng = np.random.default_rng(5)
+    for state in play_random_turns(env, 40, seed=11, variant=variant)[::8]:
+        for player in range(rules["num_players"]):
+            observation = env.state_to_observation(state, player)
+            assert {name: values.shape for name, values in observation.items()} == env.observation_shape
+
+            action_ids = env.valid_actions(state, player, as_action_ids=True)
+            player_action_ids = np.flatnonzero(env.player_perspective_valid_action_mask(state, player))
+            assert len(player_action_ids) == len(action_ids)
+            if action_ids[0] == PASS_ACTION_ID:
+                continue
+
+            # A player-perspective action covers exactly the cells its real action fills in the player's observation
+            for player_action_id in rng.choice(player_action_ids, 5):
+                action_id = player_perspective_to_real_action_ids(player_action_id, player, rules["num_players"],
+                                                                  rules["board_size"])
+                next_board = Board(state.board)
+                next_board.update_board(player + 1, *action_id_to_action(action_id), state.round_count, True)
+                next_observation = env.state_to_observation(state._replace(board=next_board), player)
+                filled_cells = np.argwhere(next_observation["board"] != observation["board"])
+
+                assert {(x, y) for y, x in filled_cells.tolist()} == action_cells(player_action_id)
+
+
+def test_duo_players_see_their_start_corner_at_the_same_cell():
+    env = BlockusEnv()
+    state, _ = env.new_state(variant="duo")
+    first_placements = [{frozenset(action_cells(action_id))
+                         for action_id in np.flatnonzero(env.player_perspective_valid_action_mask(state, player))}
+                        for player in range(2)]
+
+    assert first_placements[0] == first_placements[1]
+
+
+@pytest.mark.parametrize("variant", list(VARIANTS))
+def test_vector_env_matches_env_on_variants(variant):
+    env = BlockusEnv(move_cache_size=0)
+    vector_env = VectorBlockusEnv(3, variant=variant)
+    rng = np.random.default_rng(13)
+    observations, valid_action_masks = vector_env.reset()
+    assert {name: values.shape[1:] for name, values in observations.items()} == BlockusEnv(variant=variant).observation_shape
+    for _ in range(30):
+        for env_num in range(vector_env.num_envs):
+            state = vector_env.state(env_num)
+            player = int(vector_env.players_to_move[env_num])
+            observation = env.state_to_observation(state, player)
+
+            for name, values in observation.items():
+                assert (observations[name][env_num] == values).all()
+            assert (valid_action_masks[env_num] == env.player_perspective_valid_action_mask(state, player)).all()
+
+        actions = [rng.choice(np.flatnonzero(mask)) for mask in valid_action_masks]
+        observations, valid_action_masks, _, _, _ = vector_env.step(actions)
+
+
+def test_new_state_follows_the_env_variant():
+    for variant, rules in VARIANTS.items():
+        env = BlockusEnv(variant=variant)
+        state, _ = env.new_state()
+
+        assert state.board.board_size == rules["board_size"]
+        assert len(state.players) == rules["num_players"]
+        assert env.new_state(num_players=4)[0].board.board_size == 20  # An explicit player count still picks its variant
+
+    with pytest.raises(ValueError):
+        BlockusEnv(variant="hexagonal")
@@ -0,0 +1,75 @@
+'''
+Summary:
+Tests of the incremental Zobrist hashes kept by Board and AI.
+'''
+
+import numpy as np
+import pytest
+from blockus.blockus_env import BlockusEnv
+from blockus.board import PASS_ACTION_ID, VARIANTS
+from blockus.game_state import SearchState, action_id_to_action
+from helpers import play_random_turns
+
+
+def placed_cells(search_state, action_id):
+    ''' Cells an action covers, found by applying and undoing it.
+    '''
+    before = search_state.board.board_contents.copy()
+    search_state.apply(action_id)
+    cells = set(zip(*np.nonzero(search_state.board.board_contents != before)))
+    search_state.undo()
+    return cells
+
+
+def apart(cells, other_cells):
+    ''' Whether no cell of cells is on or beside a cell of other_cells.
+    '''
+    return all(abs(y - other_y) + abs(x - other_x) > 1 for y, x in cells for other_y, other_x in other_cells)
+
+
+def play_own_moves(search_state, action_ids):
+    ''' Plays action_ids for the player to move, with every opponent passing in between.
+    '''
+    for action_id in action_ids:
+        search_state.apply(action_id)
+        for _ in range(len(search_state.players) - 1):
+            search_state.apply(PASS_ACTION_ID)
+
+
+@pytest.mark.parametrize("variant", sorted(VARIANTS))
+def test_move_orders_reaching_one_position_hash_equally(variant):
+    env = BlockusEnv(move_cache_size=0)
+    state = play_random_turns(env, 3 * VARIANTS[variant]["num_players"], seed=3, variant=variant)[-1]
+    search_state = SearchState(state)
+
+    # Two moves of different pieces whose cells are apart stay valid whichever is played first
+    action_ids = search_state.valid_action_ids(unique=True).tolist()
+    first_action_id, second_action_id = next(
+        (first, second) for first in action_ids for second in action_ids
+        if action_id_to_action(first)[0] != action_id_to_action(second)[0] and
+        apart(placed_cells(search_state, first), placed_cells(search_state, second)))
+
+    play_own_moves(search_state, [first_action_id, second_action_id])
+    first_order = search_state.to_state()
+    while search_state.depth > 0:
+        search_state.undo()
+    play_own_moves(search_state, [second_action_id, first_action_id])
+    second_order = search_state.to_state()
+
+    assert (first_order.board.board_contents == second_order.board.board_contents).all()
+    assert env.state_hash(first_order) == env.state_hash(second_order)
+    assert env.state_hash(first_order) != env.state_hash(state)
+
+
+@pytest.mark.parametrize("variant", sorted(VARIANTS))
+def test_incremental_hashes_match_rebuilt_hashes(variant):
+    env = BlockusEnv(move_cache_size=0)
+    for state in play_random_turns(env, 200, seed=11, variant=variant):
+        board = state.board
+        incremental_hashes = [board.zobrist_hash] + [p.zobrist_hash for p in state.players]
+
+        board.rebuild_zobrist_hash()
+        for p in state.players:
+            p.rebuild_zobrist_hash()
+
+        assert [board.zobrist_hash] + [p.zobrist_hash for p in state.players] == incremental_hashes